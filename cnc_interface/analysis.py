@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from cnc_interface import machine
+
+if TYPE_CHECKING:
+    import numpy
+
+
+# Programs are parsed a block at a time so memory stays proportional to the
+# block, not the file; only the segment endpoints are kept.
+BLOCK_BYTES = 1 << 20
+
+MM_PER_INCH = 25.4
+
+_WORDS = b"GXYZF"
+_AXES = b"XYZ"
+# GRBL allows spaces anywhere in a line, "G1 X 30" is "G1X30".
+_BLANKS = b" \t\r\f\v"
+# Non-modal G codes whose axis words are not a move in work coordinates.
+_NON_MOTION_G = (4, 10, 28, 30, 53, 92)
+
+
+@dataclasses.dataclass(frozen=True)
+class Toolpath:
+    """Straight-line segments of a program in work coordinates (mm).
+
+    Arcs are kept as their chords, and the program is assumed to start at
+    work zero.
+    """
+    ends: numpy.ndarray
+    rapid: numpy.ndarray
+    feed_rates: numpy.ndarray
+
+    @property
+    def starts(self) -> numpy.ndarray:
+        import numpy
+
+        starts = numpy.empty_like(self.ends)
+        starts[:1] = 0
+        starts[1:] = self.ends[:-1]
+        return starts
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+
+class AxisLimits(NamedTuple):
+    """Per-axis motion limits of the controller."""
+    max_rates: Tuple[float, float, float]  # mm/min
+    accelerations: Tuple[float, float, float]  # mm/s^2
+
+    @classmethod
+    def from_grbl_settings(cls, settings: Dict[int, float]) -> Optional[AxisLimits]:
+        """From GRBL's $110-$112 max rates and $120-$122 accelerations, None if any is missing."""
+        try:
+            return cls(
+                (settings[110], settings[111], settings[112]),
+                (settings[120], settings[121], settings[122]),
+            )
+        except KeyError:
+            return None
+
+
+@dataclasses.dataclass
+class _ModalState:
+    motion: float = 0
+    absolute: float = 1
+    inch: float = 0
+    feed_rate: float = float("nan")
+    position: Tuple[float, float, float] = (0, 0, 0)
+
+
+def _read_blocks(path: str, block_bytes: int) -> Iterator[bytes]:
+    remainder = b""
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(block_bytes)
+            if not data:
+                break
+            data = remainder + data
+            end = data.rfind(b"\n") + 1
+            if end == 0:
+                remainder = data
+                continue
+            remainder = data[end:]
+            yield data[:end]
+    if remainder:
+        yield remainder + b"\n"
+
+
+def _forward_fill(values: numpy.ndarray, initial: float) -> numpy.ndarray:
+    import numpy
+
+    present = ~numpy.isnan(values)
+    index = numpy.where(present, numpy.arange(len(values)), -1)
+    numpy.maximum.accumulate(index, out=index)
+    return numpy.where(index >= 0, values[numpy.maximum(index, 0)], initial)
+
+
+def _tokenize(block: bytes) -> Tuple[int, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Find the G/X/Y/Z/F words of a block of lines.
+
+    Returns the number of lines and, per word, its line, letter and value.
+    Everything is done with array operations over the raw bytes: comments
+    are blanked, number runs are assigned to the letter in front of them,
+    and each digit contributes digit * 10**place to its word's value.
+    """
+    import numpy
+
+    a = numpy.frombuffer(block.upper(), dtype=numpy.uint8)
+    blank = numpy.zeros(256, dtype=bool)
+    blank[list(_BLANKS)] = True
+    # Indexing copies, so `a` can be written to below either way.
+    a = a[~blank[a]]
+    newline = a == ord("\n")
+    line_of_char = numpy.cumsum(newline, dtype=numpy.int32) - newline
+    lines = int(line_of_char[-1]) + 1 if len(a) else 0
+
+    # ';' comments run to the end of the line, '(' comments to the next ')'.
+    if b";" in block:
+        semicolons = numpy.cumsum(a == ord(";"), dtype=numpy.int32)
+        at_line_start = numpy.concatenate(([0], semicolons[newline]))[line_of_char]
+        a[semicolons > at_line_start] = ord(" ")
+    if b"(" in block:
+        close = a == ord(")")
+        depth = numpy.cumsum(a == ord("("), dtype=numpy.int32) - numpy.cumsum(close, dtype=numpy.int32) + close
+        a[depth > 0] = ord(" ")
+
+    digit = (a - ord("0")) < 10
+    numeric = digit | (a == ord(".")) | (a == ord("-")) | (a == ord("+"))
+    run = numpy.cumsum(~numeric, dtype=numpy.int32)
+    run_letter = numpy.zeros(int(run[-1]) + 1, dtype=numpy.uint8)
+    run_letter[run[~numeric]] = a[~numeric]
+    wanted = numpy.zeros(256, dtype=bool)
+    wanted[list(_WORDS)] = True
+    chars = numpy.flatnonzero(numeric & wanted[run_letter[run]])
+    if not len(chars):
+        return lines, numpy.empty(0, int), numpy.empty(0, numpy.uint8), numpy.empty(0)
+    char_runs = run[chars]
+
+    starts_word = numpy.empty(len(chars), dtype=bool)
+    starts_word[0] = True
+    numpy.not_equal(char_runs[1:], char_runs[:-1], out=starts_word[1:])
+    first = numpy.flatnonzero(starts_word)
+    word_of_char = numpy.cumsum(starts_word, dtype=numpy.int32) - 1
+    last = numpy.append(first[1:], len(chars)) - 1
+    char_values = a[chars]
+    point = chars[last] + 1
+    is_dot = char_values == ord(".")
+    point[word_of_char[is_dot]] = chars[is_dot]
+
+    is_digit = digit[chars]
+    digits = chars[is_digit]
+    digit_words = word_of_char[is_digit]
+    place = point[digit_words] - digits - (digits < point[digit_words])
+    values = numpy.bincount(
+        digit_words, weights=(char_values[is_digit] - ord("0")) * 10.0 ** place, minlength=len(first)
+    )
+    values[word_of_char[char_values == ord("-")]] *= -1
+
+    letter_positions = chars[first] - 1
+    return lines, line_of_char[letter_positions], a[letter_positions], values
+
+
+def _line_words(lines: int, line_of_word: numpy.ndarray, mask: numpy.ndarray, values: numpy.ndarray) -> numpy.ndarray:
+    import numpy
+
+    words = numpy.full(lines, numpy.nan)
+    words[line_of_word[mask]] = values[mask]
+    return words
+
+
+def _parse_block(block: bytes, state: _ModalState) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    import numpy
+
+    lines, line_of_word, letters, values = _tokenize(block)
+    is_g = letters == ord("G")
+    motion = _forward_fill(_line_words(lines, line_of_word, is_g & (values <= 3), values), state.motion)
+    absolute = _forward_fill(
+        _line_words(lines, line_of_word, is_g & ((values == 90) | (values == 91)), (values == 90).astype(float)),
+        state.absolute,
+    )
+    inch = _forward_fill(
+        _line_words(lines, line_of_word, is_g & ((values == 20) | (values == 21)), (values == 20).astype(float)),
+        state.inch,
+    )
+    scale = numpy.where(inch == 1, MM_PER_INCH, 1)
+    non_motion = numpy.zeros(lines, dtype=bool)
+    non_motion[line_of_word[is_g & numpy.isin(values, _NON_MOTION_G)]] = True
+    feed_rates = _forward_fill(
+        _line_words(lines, line_of_word, letters == ord("F"), values) * scale, state.feed_rate
+    )
+
+    indices = numpy.arange(lines)
+    positions = numpy.empty((lines, 3))
+    moved = numpy.zeros(lines, dtype=bool)
+    for axis, letter in enumerate(_AXES):
+        words = _line_words(lines, line_of_word, letters == letter, values) * scale
+        words[non_motion] = numpy.nan
+        present = ~numpy.isnan(words)
+        moved |= present
+        # Absolute words reset the axis; relative words add to it.
+        reset = present & (absolute == 1)
+        offsets = numpy.cumsum(numpy.where(present & (absolute == 0), words, 0))
+        last_reset = numpy.where(reset, indices, -1)
+        numpy.maximum.accumulate(last_reset, out=last_reset)
+        at = numpy.maximum(last_reset, 0)
+        base = numpy.where(last_reset >= 0, words[at] - offsets[at], state.position[axis])
+        positions[:, axis] = base + offsets
+
+    if lines:
+        state.motion = float(motion[-1])
+        state.absolute = float(absolute[-1])
+        state.inch = float(inch[-1])
+        state.feed_rate = float(feed_rates[-1])
+        state.position = tuple(positions[-1])
+    moves = moved & (motion <= 3)
+    return positions[moves], motion[moves] == 0, feed_rates[moves]
+
+
+def parse_program(path: str, block_bytes: int = BLOCK_BYTES) -> Toolpath:
+    import numpy
+
+    state = _ModalState()
+    ends: List[numpy.ndarray] = []
+    rapid: List[numpy.ndarray] = []
+    feed_rates: List[numpy.ndarray] = []
+    for block in _read_blocks(path, block_bytes):
+        block_ends, block_rapid, block_feed_rates = _parse_block(block, state)
+        ends.append(block_ends.astype(numpy.float32))
+        rapid.append(block_rapid)
+        feed_rates.append(block_feed_rates.astype(numpy.float32))
+    if not ends:
+        return Toolpath(numpy.empty((0, 3), numpy.float32), numpy.empty(0, bool), numpy.empty(0, numpy.float32))
+    return Toolpath(numpy.concatenate(ends), numpy.concatenate(rapid), numpy.concatenate(feed_rates))
+
+
+def segment_times(
+    lengths: numpy.ndarray, feed_rates: numpy.ndarray, acceleration: Union[float, numpy.ndarray]
+) -> numpy.ndarray:
+    """Time per segment with a trapezoidal velocity profile.
+
+    Every segment starts and ends at rest, so the total is an upper bound
+    for programs made of many short, nearly collinear moves.
+    """
+    import numpy
+
+    speed = feed_rates / 60
+    ramp_length = speed ** 2 / acceleration
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        cruising = lengths / speed + speed / acceleration
+    triangular = 2 * numpy.sqrt(lengths / acceleration)
+    return numpy.where(lengths >= ramp_length, cruising, triangular)
+
+
+def _segment_limits(moves: numpy.ndarray, lengths: numpy.ndarray, per_axis: Tuple[float, float, float]) -> numpy.ndarray:
+    """The largest rate along each move that keeps every axis within its own limit."""
+    import numpy
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        cosines = numpy.abs(moves) / lengths[:, None]
+        limits = (numpy.asarray(per_axis, dtype=numpy.float64) / cosines).min(axis=1)
+    # Zero-length moves take no time whatever their limit.
+    return numpy.where(numpy.isfinite(limits), limits, max(per_axis))
+
+
+def estimate(
+    toolpath: Toolpath,
+    machine_settings: machine.MachineSettings,
+    max_feed_rate: float,
+    rapid_rate: Optional[float] = None,
+    acceleration: float = 500,
+    axis_limits: Optional[AxisLimits] = None,
+) -> machine.JobEstimate:
+    """Estimate the envelope and cycle time of a program.
+
+    Feed moves run at the program's F word, capped at max_feed_rate (both
+    mm/min), and fall back to the jog feed rate before any F word. With
+    axis_limits, as read from GRBL, every move is also held to the rate and
+    acceleration its slowest axis allows, and rapids run at that rate.
+    Without, rapids run at rapid_rate, which defaults to the larger of the
+    two limits, and all moves accelerate at `acceleration` mm/s^2.
+    """
+    import numpy
+
+    if not len(toolpath):
+        return machine.JobEstimate()
+    fallback_rate = machine_settings.jog_feed_rate or max_feed_rate
+
+    starts = toolpath.starts.astype(numpy.float64)
+    ends = toolpath.ends.astype(numpy.float64)
+    moves = ends - starts
+    lengths = numpy.linalg.norm(moves, axis=1)
+    feed_rates = numpy.nan_to_num(toolpath.feed_rates.astype(numpy.float64), nan=fallback_rate)
+    feed_rates[feed_rates <= 0] = fallback_rate
+    feed_rates = numpy.minimum(feed_rates, max_feed_rate)
+    accelerations: Union[float, numpy.ndarray] = acceleration
+    rapid_rates: Union[float, numpy.ndarray]
+    if axis_limits is not None:
+        max_rates = _segment_limits(moves, lengths, axis_limits.max_rates)
+        feed_rates = numpy.minimum(feed_rates, max_rates)
+        rapid_rates = max_rates if rapid_rate is None else numpy.minimum(max_rates, rapid_rate)
+        accelerations = _segment_limits(moves, lengths, axis_limits.accelerations)
+    else:
+        rapid_rates = max(machine_settings.jog_feed_rate, max_feed_rate) if rapid_rate is None else rapid_rate
+    feed_rates = numpy.where(toolpath.rapid, rapid_rates, feed_rates)
+    times = segment_times(lengths, feed_rates, accelerations)
+
+    lower = numpy.minimum(ends.min(axis=0), 0)
+    upper = numpy.maximum(ends.max(axis=0), 0)
+    return machine.JobEstimate(
+        lower=machine.MachineCoords(x=float(lower[0]), y=float(lower[1]), z=float(lower[2])),
+        upper=machine.MachineCoords(x=float(upper[0]), y=float(upper[1]), z=float(upper[2])),
+        segments=len(toolpath),
+        path_length=float(lengths.sum()),
+        cut_length=float(lengths[~toolpath.rapid].sum()),
+        cycle_time_seconds=float(times.sum()),
+    )
@@ -0,0 +1,4 @@
+from cnc_interface.benchmarks import harness
+
+
+harness.main()
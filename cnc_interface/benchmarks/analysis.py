@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from cnc_interface import analysis, machine
+from cnc_interface.benchmarks import job
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time parsing and estimating a large G-code program.")
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.nc")
+        job.write_program(path, args.lines)
+        size_mb = os.path.getsize(path) / 1e6
+
+        start = time.perf_counter()
+        toolpath = analysis.parse_program(path)
+        parsed = time.perf_counter()
+        estimate = analysis.estimate(toolpath, machine.MachineSettings(jogFeedRate=1000), max_feed_rate=1000)
+        estimated = time.perf_counter()
+
+    print(f"parse:    {len(toolpath):>9,} segments from {size_mb:.1f} MB in {parsed - start:>6.2f} s")
+    print(f"estimate: {estimated - parsed:>6.2f} s")
+    print(
+        f"cycle time {estimate.cycle_time_seconds / 3600:.1f} h, path {estimate.path_length / 1000:.1f} m, "
+        f"box {estimate.upper.x - estimate.lower.x:.1f} x {estimate.upper.y - estimate.lower.y:.1f} x "
+        f"{estimate.upper.z - estimate.lower.z:.1f} mm"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from cnc_interface import decoding, machine
+
+
+# Responses as recorded from UGS 2.0 while idling and while jogging along X.
+RECORDED_STATUS = [
+    json.loads(payload) for payload in (
+        '{"machineCoord":{"x":-120.5,"y":-80.25,"z":-5.0,"a":0.0,"b":0.0,"c":0.0,"units":"MM"},'
+        '"workCoord":{"x":0.0,"y":0.0,"z":12.5,"a":0.0,"b":0.0,"c":0.0,"units":"MM"},'
+        '"rowCount":0,"completedRowCount":0,"remainingRowCount":0,"fileName":"","sendDuration":0,'
+        '"sendRemainingDuration":0,"state":"IDLE","feedSpeed":0.0,"spindleSpeed":0.0,'
+        '"pins":"","gcodeState":{}}',
+        '{"machineCoord":{"x":-120.5,"y":-80.25,"z":-5.0,"a":0.0,"b":0.0,"c":0.0,"units":"MM"},'
+        '"workCoord":{"x":0.0,"y":0.0,"z":12.5,"a":0.0,"b":0.0,"c":0.0,"units":"MM"},'
+        '"rowCount":0,"completedRowCount":0,"remainingRowCount":0,"fileName":"","sendDuration":0,'
+        '"sendRemainingDuration":0,"state":"IDLE","feedSpeed":0.0,"spindleSpeed":0.0,'
+        '"pins":"","gcodeState":{}}',
+        '{"machineCoord":{"x":-118.012,"y":-80.25,"z":-5.0,"a":0.0,"b":0.0,"c":0.0,"units":"MM"},'
+        '"workCoord":{"x":2.488,"y":0.0,"z":12.5,"a":0.0,"b":0.0,"c":0.0,"units":"MM"},'
+        '"rowCount":0,"completedRowCount":0,"remainingRowCount":0,"fileName":"","sendDuration":0,'
+        '"sendRemainingDuration":0,"state":"JOG","feedSpeed":1000.0,"spindleSpeed":0.0,'
+        '"pins":"","gcodeState":{}}',
+        '{"machineCoord":{"x":-115.5,"y":-80.25,"z":-5.0,"a":0.0,"b":0.0,"c":0.0,"units":"MM"},'
+        '"workCoord":{"x":5.0,"y":0.0,"z":12.5,"a":0.0,"b":0.0,"c":0.0,"units":"MM"},'
+        '"rowCount":0,"completedRowCount":0,"remainingRowCount":0,"fileName":"","sendDuration":0,'
+        '"sendRemainingDuration":0,"state":"IDLE","feedSpeed":0.0,"spindleSpeed":0.0,'
+        '"pins":"","gcodeState":{}}',
+    )
+]
+
+RECORDED_SETTINGS = [
+    json.loads(
+        '{"jogFeedRate":1000.0,"jogStepSizeXY":5.0,"jogStepSizeZ":5.0,"preferredUnits":"MM",'
+        '"useZStepSize":true,"showNightlyWarning":true,"showSerialPortWarning":true,'
+        '"autoStartPendant":false,"autoConnect":false,"autoReconnect":false,'
+        '"firmwareVersion":"GRBL","connectionDriver":"JSERIALCOMM","baudRate":"115200",'
+        '"port":"/dev/ttyUSB0","language":"en_US"}'
+    )
+]
+
+
+def _allocations(run: Callable[[], Any], payloads: List[Dict[str, Any]]) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    kept = [run(payload) for payload in payloads]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return end - start
+
+
+def compare(name: str, current: Callable[[Any], Any], lean: Callable[[Any], Any], payloads: List[Dict[str, Any]], number: int) -> None:
+    def loop(parse: Callable[[Any], Any]) -> Callable[[], None]:
+        def run() -> None:
+            for payload in payloads:
+                parse(payload)
+        return run
+
+    per_parse = len(payloads) * number
+    current_us = timeit.timeit(loop(current), number=number) / per_parse * 1e6
+    lean_us = timeit.timeit(loop(lean), number=number) / per_parse * 1e6
+    current_bytes = _allocations(current, payloads * 50) / (len(payloads) * 50)
+    lean_bytes = _allocations(lean, payloads * 50) / (len(payloads) * 50)
+    print(
+        f"{name:>8}: pydantic {current_us:>6.2f} us {current_bytes:>6.0f} B/parse | "
+        f"lean {lean_us:>6.2f} us {lean_bytes:>6.0f} B/parse | {current_us / lean_us:.1f}x"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare pydantic and lean UGS payload decoding.")
+    parser.add_argument("--number", type=int, default=5000)
+    args = parser.parse_args()
+
+    models = machine._ModelCache()
+    compare(
+        "status",
+        lambda payload: machine.MachineStatus(**payload),
+        lambda payload: models.status_model(decoding.decode_status(payload)),
+        RECORDED_STATUS,
+        args.number,
+    )
+    compare(
+        "settings",
+        lambda payload: machine.MachineSettings(**payload),
+        lambda payload: models.settings_model(decoding.decode_settings(payload)),
+        RECORDED_SETTINGS,
+        args.number,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from cnc_interface import encoder, machine
+
+
+DIALS = (machine.Dial(0, 5, 6), machine.Dial(13, 19, 26), machine.Dial(21, 20, 16))
+
+
+def accuracy(tick_rate: float, ticks: int, seed: int = 0) -> Dict[str, float]:
+    source = encoder.SimulatedEventSource(DIALS)
+    decoded: Dict[machine.Dial, int] = {dial: 0 for dial in DIALS}
+    expected: Dict[machine.Dial, int] = {dial: 0 for dial in DIALS}
+    presses: List[bool] = []
+
+    def on_ticks(batch: encoder.TickBatch) -> None:
+        decoded[batch.dial] += batch.delta
+
+    reader = encoder.EncoderReader(
+        source, DIALS, on_ticks, lambda dial, is_pressed, _: presses.append(is_pressed)
+    )
+    rng = random.Random(seed)
+    tick_interval_ns = int(1e9 / tick_rate)
+    remaining = ticks
+    while remaining > 0:
+        dial = rng.choice(DIALS)
+        burst = min(remaining, rng.randint(1, 20))
+        direction = rng.choice((-1, 1))
+        source.turn(dial, burst * direction, tick_interval_ns)
+        expected[dial] += burst * direction
+        remaining -= burst
+        if rng.random() < 0.1:
+            source.press(dial, bounces=3)
+    reader.process(source.read_events(0))
+    errors = sum(abs(decoded[dial] - expected[dial]) for dial in DIALS)
+    return {
+        "tick_rate": tick_rate,
+        "ticks": ticks,
+        "tick_errors": errors,
+        "invalid_transitions": reader.invalid_transitions,
+        "press_errors": abs(len(presses) - 2 * (presses.count(True))),
+    }
+
+
+def throughput(ticks: int) -> float:
+    source = encoder.SimulatedEventSource(DIALS)
+    source.turn(DIALS[0], ticks, 1000)
+    events = source.read_events(0)
+    reader = encoder.EncoderReader(source, DIALS, lambda batch: None, lambda *_: None)
+    start = time.perf_counter()
+    reader.process(events)
+    return len(events) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check quadrature decoding accuracy and speed.")
+    parser.add_argument("--ticks", type=int, default=10_000)
+    args = parser.parse_args()
+
+    for tick_rate in (10, 100, 1_000, 10_000):
+        print(accuracy(tick_rate, args.ticks))
+    events_per_second = throughput(args.ticks)
+    print(
+        f"decoder: {events_per_second:,.0f} edges/s, "
+        f"max {events_per_second / encoder.TRANSITIONS_PER_TICK:,.0f} ticks/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
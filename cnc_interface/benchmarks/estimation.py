@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import argparse
+import math
+import statistics
+from typing import List, Tuple
+
+from cnc_interface import estimation
+
+STEP_SECONDS = 0.001
+
+
+def simulate(jogs: int, jog_mm: float, feed_rate: float, acceleration: float) -> Tuple[List[float], List[float], List[float]]:
+    """X position of a machine running one jog after another, every STEP_SECONDS.
+
+    Returns the positions, the times each jog is issued and whether the
+    machine is moving at each step (1.0 or 0.0).
+    """
+    max_speed = feed_rate / 60
+    positions, moving, jog_times = [], [], []
+    position = speed = target = 0.0
+    t = 0.0
+    issued = 0
+    next_jog = 0.2
+    while issued < jogs or abs(target - position) > 1e-9 or t < next_jog + 0.5:
+        if issued < jogs and t >= next_jog:
+            target += jog_mm
+            jog_times.append(t)
+            issued += 1
+            # Hold a jog key for a few repeats, then pause.
+            next_jog = t + (0.25 if issued % 4 else 1.0)
+        remaining = target - position
+        speed = min(max_speed, speed + acceleration * STEP_SECONDS, math.sqrt(2 * acceleration * max(remaining, 0)))
+        position = min(position + speed * STEP_SECONDS, target)
+        positions.append(position)
+        moving.append(1.0 if remaining > 1e-9 else 0.0)
+        t += STEP_SECONDS
+    return positions, jog_times, moving
+
+
+def display_errors(
+    positions: List[float],
+    jog_times: List[float],
+    moving: List[float],
+    poll_seconds: float,
+    round_trip_seconds: float,
+    frame_rate: float,
+    jog_mm: float,
+    feed_rate: float,
+    interpolate: bool,
+) -> List[float]:
+    """How far the shown position is off, polled like SelfUpdatingValue does.
+
+    Each poll waits round_trip_seconds for its reply, which reports the
+    position from halfway through, and the next poll goes out poll_seconds
+    after the reply.
+    """
+    estimator = estimation.PositionEstimator()
+    estimator.set_poll_period(poll_seconds + round_trip_seconds, round_trip_seconds)
+    round_trip_steps = max(1, round(round_trip_seconds / STEP_SECONDS))
+    poll_steps = round(poll_seconds / STEP_SECONDS)
+    frame_steps = round(1 / frame_rate / STEP_SECONDS)
+    jog_steps = {round(t / STEP_SECONDS) for t in jog_times}
+    sampled = 0.0
+    reply_step = round_trip_steps
+    errors = []
+    for step, position in enumerate(positions):
+        now = step * STEP_SECONDS
+        if step in jog_steps:
+            estimator.on_move(jog_mm, 0, 0, feed_rate, at=now)
+        if step == reply_step:
+            reported = step - round_trip_steps // 2
+            sampled = positions[reported]
+            estimator.on_sample((sampled, 0, 0), bool(moving[reported]), at=now)
+            reply_step = step + poll_steps + round_trip_steps
+        if step % frame_steps == 0 and moving[step]:
+            shown = sampled + (estimator.offset(now)[0] if interpolate else 0)
+            errors.append(abs(shown - position))
+    return errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare DRO display error with and without dead reckoning.")
+    parser.add_argument("--jogs", type=int, default=200)
+    parser.add_argument("--jog-mm", type=float, default=1.0)
+    parser.add_argument("--feed-rate", type=float, default=1000, help="mm/min")
+    parser.add_argument("--acceleration", type=float, default=500, help="mm/s^2")
+    parser.add_argument("--frame-rate", type=float, default=30)
+    parser.add_argument("--round-trip-ms", type=float, default=20, help="poll request to reply")
+    args = parser.parse_args()
+
+    positions, jog_times, moving = simulate(args.jogs, args.jog_mm, args.feed_rate, args.acceleration)
+    print(
+        f"{args.jogs} jogs of {args.jog_mm} mm at {args.feed_rate:.0f} mm/min, display at {args.frame_rate:.0f} fps,"
+        f" {args.round_trip_ms:.0f} ms poll round trip"
+    )
+    print(f"{'poll':>6} {'mode':>12} {'mean mm':>8} {'p95 mm':>8} {'max mm':>8}")
+    for poll_seconds in (0.1, 0.2, 0.3):
+        for interpolate in (False, True):
+            errors = display_errors(
+                positions,
+                jog_times,
+                moving,
+                poll_seconds,
+                args.round_trip_ms / 1000,
+                args.frame_rate,
+                args.jog_mm,
+                args.feed_rate,
+                interpolate,
+            )
+            errors.sort()
+            print(
+                f"{poll_seconds:>5.1f}s {'interpolated' if interpolate else 'last sample':>12}"
+                f" {statistics.fmean(errors):>8.3f} {errors[int(len(errors) * 0.95)]:>8.3f} {errors[-1]:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable
+
+from cnc_interface import machine
+from cnc_interface.benchmarks import mock_ugs
+
+
+def _sequential(client: machine.UGSClient) -> None:
+    client.get_machine_status()
+    client.get_machine_settings()
+
+
+def refresh_rate(fetch: Callable[[], object], duration_seconds: float) -> float:
+    refreshes = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration_seconds:
+        fetch()
+        refreshes += 1
+    return refreshes / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare sequential and concurrent DRO refreshes.")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=3)
+    args = parser.parse_args()
+
+    state = mock_ugs.MockUGSState(latency_seconds=args.latency_ms / 1000)
+    with mock_ugs.running(state) as (host, port):
+        client = machine.UGSClient(host, port)
+        sequential = refresh_rate(lambda: _sequential(client), args.duration)
+        concurrent = refresh_rate(client.get_machine_status_and_settings, args.duration)
+        client.close()
+
+    print(f"sequential: {sequential:>7.1f} refreshes/s")
+    print(f"concurrent: {concurrent:>7.1f} refreshes/s ({concurrent / sequential:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+from contextlib import ExitStack
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from cnc_interface import fleet, machine
+from cnc_interface.benchmarks import mock_ugs
+
+
+def _client_threads() -> int:
+    # The mock server runs a thread per connection; only count our own.
+    return sum(
+        1 for thread in threading.enumerate()
+        if thread.name != "mock-ugs" and "process_request_thread" not in thread.name
+    )
+
+
+def _per_thread(configs: List[fleet.MachineConfig]) -> ExitStack:
+    stack = ExitStack()
+    for config in configs:
+        client = machine.UGSClient(config.host, config.port)
+        stack.callback(client.close)
+        stack.enter_context(fleet.MonitoredMachine(config, client).machine.enabled())
+    return stack
+
+
+def _scheduled(configs: List[fleet.MachineConfig], workers: int) -> ExitStack:
+    stack = ExitStack()
+    stack.enter_context(fleet.Fleet(fleet.FleetConfig(machines=configs, workers=workers)).running())
+    return stack
+
+
+def measure(
+    state: mock_ugs.MockUGSState, start_polling: Callable[[], ExitStack], duration_seconds: float
+) -> Tuple[float, int, float]:
+    baseline_threads = _client_threads()
+    with start_polling():
+        time.sleep(0.5)
+        threads = _client_threads() - baseline_threads
+        polls = state.endpoint_counts["status/getStatus"]
+        handler_cpu = state.handler_cpu_seconds
+        cpu = time.process_time()
+        start = time.perf_counter()
+        time.sleep(duration_seconds)
+        elapsed = time.perf_counter() - start
+        polls = state.endpoint_counts["status/getStatus"] - polls
+        client_cpu = time.process_time() - cpu - (state.handler_cpu_seconds - handler_cpu)
+    return polls / elapsed, threads, client_cpu / elapsed * 100
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare one poller thread per machine with the shared scheduler.")
+    parser.add_argument("--machines", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--duration", type=float, default=3)
+    args = parser.parse_args()
+
+    state = mock_ugs.MockUGSState(latency_seconds=args.latency_ms / 1000)
+    with mock_ugs.running(state) as (host, port):
+        for count in args.machines:
+            configs = [fleet.MachineConfig(name=f"router-{i}", host=host, port=port) for i in range(count)]
+            for name, start_polling in (
+                ("threads", lambda: _per_thread(configs)),
+                ("scheduler", lambda: _scheduled(configs, args.workers)),
+            ):
+                polls_per_second, threads, cpu_percent = measure(state, start_polling, args.duration)
+                print(
+                    f"{count:>3} machines {name:>9}: {polls_per_second:>7.1f} polls/s "
+                    f"{threads:>4} threads {cpu_percent:>5.1f}% cpu"
+                )
+
+
+if __name__ == "__main__":
+    main()
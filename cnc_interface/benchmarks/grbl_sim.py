@@ -0,0 +1,138 @@
+from __future__ import annotations
+from contextlib import contextmanager
+
+import os
+import pty
+import re
+import select
+import threading
+import time
+import tty
+from typing import Dict, Iterator, List
+
+from cnc_interface import grbl
+
+
+_WORD_PATTERN = re.compile(r"([A-Z])([-+]?[0-9]*\.?[0-9]+)")
+_BANNER = b"\r\nGrbl 1.1h ['$' for help]\r\n"
+_REALTIME_COMMANDS = frozenset(
+    grbl.STATUS_QUERY + grbl.CYCLE_START + grbl.FEED_HOLD + grbl.SOFT_RESET + grbl.JOG_CANCEL
+    + bytes(range(0x90, 0xA0))
+)
+
+
+class GrblSimulator:
+    def __init__(self, line_delay_seconds: float = 0.001, rx_buffer_size: int = grbl.RX_BUFFER_SIZE) -> None:
+        self.line_delay_seconds = line_delay_seconds
+        self.rx_buffer_size = rx_buffer_size
+        self.machine_position = [0.0, 0.0, 0.0]
+        self.work_offset = [0.0, 0.0, 0.0]
+        self.state = "Idle"
+        self.spindle_speed = 0.0
+        self.feed = 0.0
+        self.settings: Dict[int, float] = {20: 1, 110: 5000, 111: 5000, 112: 500, 130: 300, 131: 200, 132: 80}
+        self.lines: List[str] = []
+        # Lines answered with an error instead of run, and the error code.
+        self.errors: Dict[str, int] = {}
+        # The same, by the place of the line among all lines received.
+        self.errors_at: Dict[int, int] = {}
+        self.realtime_commands: List[bytes] = []
+        self.status_queries = 0
+        self.overflows = 0
+        self.lock = threading.Lock()
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.path = os.ttyname(self._slave)
+        self._rx_buffer = bytearray()
+        self._stop_flag = threading.Event()
+
+    def _status_report(self) -> bytes:
+        machine_position = ",".join(f"{v:.3f}" for v in self.machine_position)
+        work_offset = ",".join(f"{v:.3f}" for v in self.work_offset)
+        return (
+            f"<{self.state}|MPos:{machine_position}|FS:{self.feed:.0f},{self.spindle_speed:.0f}"
+            f"|WCO:{work_offset}>\r\n"
+        ).encode()
+
+    def _execute(self, line: str) -> bytes:
+        self.lines.append(line)
+        error = self.errors_at.get(len(self.lines) - 1, self.errors.get(line))
+        if error is not None:
+            return f"error:{error}\r\n".encode()
+        if line == "$$":
+            return b"".join(f"${key}={value:.3f}\r\n".encode() for key, value in sorted(self.settings.items())) + b"ok\r\n"
+        is_jog = line.startswith("$J=")
+        words = _WORD_PATTERN.findall(line[3:] if is_jog else line)
+        codes = {(letter, float(value)) for letter, value in words if letter in "GM"}
+        values = {letter: float(value) for letter, value in words if letter in "XYZSF"}
+        if ("G", 10) in codes:
+            for i, axis in enumerate("XYZ"):
+                if axis in values:
+                    self.work_offset[i] = self.machine_position[i] - values[axis]
+            return b"ok\r\n"
+        for i, axis in enumerate("XYZ"):
+            if axis not in values:
+                continue
+            if ("G", 91) in codes:
+                self.machine_position[i] += values[axis]
+            elif ("G", 53) in codes:
+                self.machine_position[i] = values[axis]
+            else:
+                self.machine_position[i] = values[axis] + self.work_offset[i]
+        if "S" in values:
+            self.spindle_speed = values["S"]
+        if ("M", 5) in codes:
+            self.spindle_speed = 0
+        return b"ok\r\n"
+
+    def _receive(self, data: bytes) -> None:
+        for byte in data:
+            command = bytes((byte,))
+            if byte in _REALTIME_COMMANDS:
+                self.realtime_commands.append(command)
+                if command == grbl.STATUS_QUERY:
+                    self.status_queries += 1
+                    os.write(self._master, self._status_report())
+                elif command == grbl.FEED_HOLD:
+                    self.state = "Hold"
+                elif command == grbl.CYCLE_START and self.state == "Hold":
+                    self.state = "Idle"
+                elif command == grbl.SOFT_RESET:
+                    # Unanswered lines are gone, and GRBL greets again.
+                    self._rx_buffer.clear()
+                    self.state = "Idle"
+                    os.write(self._master, _BANNER)
+                continue
+            self._rx_buffer.append(byte)
+            if len(self._rx_buffer) > self.rx_buffer_size:
+                self.overflows += 1
+
+    def _process_line(self) -> None:
+        line, _, rest = self._rx_buffer.partition(b"\n")
+        self._rx_buffer = bytearray(rest)
+        response = self._execute(line.decode().strip())
+        os.write(self._master, response)
+
+    def _run(self) -> None:
+        os.write(self._master, _BANNER)
+        next_line_at = time.monotonic()
+        while not self._stop_flag.is_set():
+            readable, _, _ = select.select([self._master], [], [], self.line_delay_seconds or 0.01)
+            with self.lock:
+                if readable:
+                    self._receive(os.read(self._master, 1024))
+                if b"\n" in self._rx_buffer and self.state != "Hold" and time.monotonic() >= next_line_at:
+                    self._process_line()
+                    next_line_at = time.monotonic() + self.line_delay_seconds
+
+    @contextmanager
+    def running(self) -> Iterator[str]:
+        thread = threading.Thread(target=self._run, name="grbl-simulator", daemon=True)
+        thread.start()
+        try:
+            yield self.path
+        finally:
+            self._stop_flag.set()
+            thread.join()
+            os.close(self._master)
+            os.close(self._slave)
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from cnc_interface import machine
+from cnc_interface.benchmarks import mock_ugs
+
+
+@dataclasses.dataclass
+class Scenario:
+    name: str
+    duration_seconds: float = 5
+    latency_ms: float = 5
+    jitter_ms: float = 0
+    failure_rate: float = 0
+    jog_tick_rate: float = 0
+    feedrate_tick_rate: float = 0
+    # Half-width of a soft-limit envelope around the start position, 0 for none.
+    soft_limit_mm: float = 0
+
+
+SCENARIOS = [
+    Scenario("idle-poll"),
+    Scenario("jog-slow", jog_tick_rate=5),
+    Scenario("jog-fast-spin", jog_tick_rate=200),
+    Scenario("feedrate-spin", feedrate_tick_rate=50),
+    Scenario("flaky-link", latency_ms=20, jitter_ms=15, failure_rate=0.1, jog_tick_rate=20),
+    Scenario("jog-storm-soft-limit", jog_tick_rate=200, soft_limit_mm=50),
+    Scenario(
+        "jog-storm-soft-limit-flaky",
+        latency_ms=20,
+        jitter_ms=15,
+        failure_rate=0.1,
+        jog_tick_rate=200,
+        soft_limit_mm=50,
+    ),
+]
+
+
+class SyntheticDial(threading.Thread):
+    def __init__(self, on_tick: Callable[[], None], tick_rate: float, stop_flag: threading.Event):
+        self._on_tick = on_tick
+        self._interval_seconds = 1 / tick_rate
+        self._stop_flag = stop_flag
+        self.tick_times: List[float] = []
+        super().__init__(name="synthetic-dial", daemon=True)
+
+    def run(self) -> None:
+        next_tick = time.perf_counter()
+        while not self._stop_flag.is_set():
+            self.tick_times.append(time.perf_counter())
+            self._on_tick()
+            next_tick += self._interval_seconds
+            self._stop_flag.wait(max(0, next_tick - time.perf_counter()))
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    if len(samples) < 2:
+        return {}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p90": cuts[89], "p99": cuts[98], "max": max(samples)}
+
+
+def jog_latencies(tick_times: List[float], jog_log: List[Any]) -> List[float]:
+    latencies: List[float] = []
+    tick_index = 0
+    for served_at, x, _, _ in jog_log:
+        for _ in range(int(x)):
+            if tick_index >= len(tick_times):
+                break
+            latencies.append(served_at - tick_times[tick_index])
+            tick_index += 1
+    return latencies
+
+
+def run_scenario(scenario: Scenario) -> Dict[str, Any]:
+    state = mock_ugs.MockUGSState(
+        latency_seconds=scenario.latency_ms / 1000,
+        jitter_seconds=scenario.jitter_ms / 1000,
+        failure_rate=scenario.failure_rate,
+        seed=0,
+    )
+    with mock_ugs.running(state) as (host, port):
+        ugs_client = machine.UGSClient(host, port)
+        controls = machine.Controls(
+            ugs_client,
+            x_dial=machine.Dial(0, 0, 0),
+            y_dial=machine.Dial(0, 0, 0),
+            z_dial=machine.Dial(0, 0, 0),
+        )
+        envelope = None
+        if scenario.soft_limit_mm:
+            limit = scenario.soft_limit_mm
+            envelope = machine.Envelope(
+                lower=machine.MachineCoords(x=-limit, y=-limit, z=-limit),
+                upper=machine.MachineCoords(x=limit, y=limit, z=limit),
+            )
+        readout = machine.DigitalReadout(ugs_client, controls, envelope=envelope)
+        stop_flag = threading.Event()
+        dials: List[SyntheticDial] = []
+        if scenario.jog_tick_rate:
+            dials.append(SyntheticDial(controls.on_x_cw, scenario.jog_tick_rate, stop_flag))
+        if scenario.feedrate_tick_rate:
+            controls.on_x_down()
+            dials.append(SyntheticDial(controls.on_x_cw, scenario.feedrate_tick_rate, stop_flag))
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        with controls.running(), readout.syncing():
+            for dial in dials:
+                dial.start()
+            time.sleep(scenario.duration_seconds)
+            stop_flag.set()
+            for dial in dials:
+                dial.join()
+            # Let queued commands drain before tearing down the dispatcher.
+            time.sleep(0.5)
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start - state.handler_cpu_seconds
+        ugs_client.close()
+        final_x = state.status["machineCoord"]["x"]
+
+    tick_times = dials[0].tick_times if scenario.jog_tick_rate else []
+    latencies = jog_latencies(tick_times, state.jog_log)
+    return {
+        "wall_seconds": wall_seconds,
+        "cpu_percent": cpu_seconds / wall_seconds * 100,
+        "polls_per_second": state.endpoint_counts["status/getStatus"] / wall_seconds,
+        "requests_per_second": state.requests_served / wall_seconds,
+        "requests_failed": state.requests_failed,
+        "endpoint_counts": dict(state.endpoint_counts),
+        "jog_ticks": len(tick_times),
+        "jog_ticks_delivered": len(latencies),
+        "jog_requests": len(state.jog_log),
+        "jog_latency_ms": {key: value * 1000 for key, value in percentiles(latencies).items()},
+        "dispatch": dataclasses.asdict(controls.dispatcher.stats),
+        "soft_limits": dataclasses.asdict(controls.soft_limits.stats),
+        # Dials only turn +x, so the final position is the furthest reached.
+        "overtravel_mm": max(0.0, final_x - scenario.soft_limit_mm) if scenario.soft_limit_mm else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    print(f"comparing {baseline.get('commit')} -> {current.get('commit')}")
+    for name, results in current["scenarios"].items():
+        before = _flatten(baseline["scenarios"].get(name, {}))
+        for key, value in _flatten(results).items():
+            if key not in before or key.startswith(("endpoint_counts.", "dispatch.")):
+                continue
+            old = before[key]
+            change = f"{(value - old) / old * 100:+7.1f}%" if old else "    n/a"
+            print(f"{name:>14} {key:<28} {old:>10.2f} -> {value:>10.2f} {change}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run end-to-end scenarios against a mock UGS server.")
+    parser.add_argument("--scenario", action="append", help="only run the named scenario(s)")
+    parser.add_argument("--duration", type=float, help="override the duration of every scenario")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="compare against a previous JSON result file")
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+    if args.duration is not None:
+        scenarios = [dataclasses.replace(s, duration_seconds=args.duration) for s in scenarios]
+
+    results = {
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "scenarios": {},
+    }
+    for scenario in scenarios:
+        print(f"running {scenario.name}...", file=sys.stderr)
+        results["scenarios"][scenario.name] = run_scenario(scenario)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from cnc_interface import grbl, job, machine
+from cnc_interface.benchmarks import grbl_sim, mock_ugs
+
+
+def write_program(path: str, lines: int) -> None:
+    with open(path, "w") as f:
+        f.write("%\n(generated benchmark program)\nG21 G90\n")
+        for i in range(lines):
+            f.write(f"G1 X{i % 100:.3f} Y{(i * 7) % 100:.3f} F1200 ; move {i}\n")
+        f.write("M2\n%\n")
+
+
+def stream(path: str, send_gcode, batch_bytes: int) -> tuple[float, int, int]:
+    sender = job.JobSender(path, send_gcode, batch_bytes=batch_bytes)
+    tracemalloc.start()
+    start = time.perf_counter()
+    sender.start()
+    sender.join()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    progress = sender.progress()
+    if sender.state() is not job.JobState.DONE:
+        raise RuntimeError(f"job ended in state {progress.state}: {progress.error}")
+    return progress.lines_sent / elapsed, peak, progress.lines_sent
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream a large G-code file and report throughput and memory.")
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--grbl-lines", type=int, default=5_000)
+    parser.add_argument("--latency-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.nc")
+        write_program(path, args.lines)
+        size_mb = os.path.getsize(path) / 1e6
+
+        # The mock server keeps a log of everything it receives, so the
+        # sender's own footprint is measured against a sink that drops it.
+        rate, peak, lines = stream(path, lambda commands: None, batch_bytes=4096)
+        print(f"sink: {lines} lines from {size_mb:.1f} MB at {rate:>9,.0f} lines/s, peak {peak / 1024:>6.1f} KiB")
+
+        state = mock_ugs.MockUGSState(latency_seconds=args.latency_ms / 1000)
+        with mock_ugs.running(state) as (host, port):
+            client = machine.UGSClient(host, port)
+            rate, peak, lines = stream(path, client.send_gcode, batch_bytes=4096)
+            client.close()
+        print(f"ugs:  {lines} lines from {size_mb:.1f} MB at {rate:>9,.0f} lines/s, peak {peak / 1024:>6.1f} KiB")
+
+        grbl_path = os.path.join(directory, "short.nc")
+        write_program(grbl_path, args.grbl_lines)
+        with grbl_sim.GrblSimulator().running() as serial_port:
+            client = grbl.GrblClient(serial_port)
+            rate, peak, lines = stream(grbl_path, client.send_gcode, batch_bytes=grbl.RX_BUFFER_SIZE)
+            client.close()
+        print(f"grbl: {lines} lines at {rate:>9,.0f} lines/s, peak {peak / 1024:>6.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
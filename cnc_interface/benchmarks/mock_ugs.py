@@ -0,0 +1,168 @@
+from __future__ import annotations
+from contextlib import contextmanager
+
+import collections
+import dataclasses
+from http import server
+import json
+import random
+import threading
+import time
+from typing import Any, Counter, Dict, Iterator, List, Optional, Tuple
+from urllib import parse
+
+
+API_PREFIX = "/api/v1/"
+
+
+@dataclasses.dataclass
+class MockUGSState:
+    latency_seconds: float = 0
+    jitter_seconds: float = 0
+    failure_rate: float = 0
+    seed: Optional[int] = None
+    status: Dict[str, Any] = dataclasses.field(default_factory=lambda: {
+        "state": "IDLE",
+        "machineCoord": {"units": "MM", "x": 0.0, "y": 0.0, "z": 0.0},
+        "workCoord": {"units": "MM", "x": 0.0, "y": 0.0, "z": 0.0},
+        "spindleSpeed": 0.0,
+    })
+    settings: Dict[str, Any] = dataclasses.field(default_factory=lambda: {
+        "jogFeedRate": 1000.0,
+        "jogStepSizeXY": 1.0,
+        "jogStepSizeZ": 1.0,
+        "preferredUnits": "MM",
+    })
+    requests_served: int = 0
+    requests_failed: int = 0
+    handler_cpu_seconds: float = 0
+    endpoint_counts: Counter[str] = dataclasses.field(default_factory=collections.Counter)
+    jog_log: List[Tuple[float, float, float, float]] = dataclasses.field(default_factory=list)
+    gcode_log: List[str] = dataclasses.field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self._random = random.Random(self.seed)
+
+    def delay_seconds(self) -> float:
+        with self.lock:
+            jitter = self._random.uniform(-self.jitter_seconds, self.jitter_seconds)
+        return max(0, self.latency_seconds + jitter)
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self._random.random() < self.failure_rate
+
+    def jog(self, x: float, y: float, z: float) -> None:
+        with self.lock:
+            self.jog_log.append((time.perf_counter(), x, y, z))
+            step_xy = self.settings["jogStepSizeXY"]
+            step_z = self.settings["jogStepSizeZ"]
+            for coord in (self.status["machineCoord"], self.status["workCoord"]):
+                coord["x"] += x * step_xy
+                coord["y"] += y * step_xy
+                coord["z"] += z * step_z
+
+
+class _Handler(server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: _MockUGSServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def handle_one_request(self) -> None:
+        # Tracked so benchmarks can subtract the stand-in's own CPU use from
+        # the process total.
+        start = time.thread_time()
+        try:
+            super().handle_one_request()
+        finally:
+            with self.server.state.lock:
+                self.server.state.handler_cpu_seconds += time.thread_time() - start
+
+    def _reply(self, status: int, body: Any = None) -> None:
+        payload = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length))
+
+    def _handle(self, method: str) -> None:
+        state = self.server.state
+        url = parse.urlsplit(self.path)
+        if not url.path.startswith(API_PREFIX):
+            self._reply(404)
+            return
+        endpoint = url.path[len(API_PREFIX):]
+        body = self._read_json() if method == "POST" else None
+        delay_seconds = state.delay_seconds()
+        if delay_seconds:
+            time.sleep(delay_seconds)
+        if state.should_fail():
+            with state.lock:
+                state.requests_failed += 1
+            self._reply(503)
+            return
+        with state.lock:
+            state.requests_served += 1
+            state.endpoint_counts[endpoint] += 1
+
+        if endpoint == "status/getStatus":
+            with state.lock:
+                self._reply(200, state.status)
+        elif endpoint == "settings/getSettings":
+            with state.lock:
+                self._reply(200, state.settings)
+        elif endpoint == "settings/setSettings" and method == "POST":
+            with state.lock:
+                state.settings.update(body or {})
+            self._reply(200)
+        elif endpoint == "machine/jog":
+            query = parse.parse_qs(url.query)
+            state.jog(*(float(query.get(axis, ["0"])[0]) for axis in "xyz"))
+            self._reply(200)
+        elif endpoint == "machine/sendGcode" and method == "POST":
+            with state.lock:
+                state.gcode_log.append((body or {}).get("commands", ""))
+            self._reply(200)
+        elif endpoint in ("machine/resetToZero", "machine/cancelJog", "files/pause", "files/cancel"):
+            self._reply(200)
+        else:
+            self._reply(404)
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+
+class _MockUGSServer(server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, state: MockUGSState, port: int):
+        self.state = state
+        super().__init__(("127.0.0.1", port), _Handler)
+
+
+@contextmanager
+def running(state: MockUGSState, port: int = 0) -> Iterator[Tuple[str, int]]:
+    mock_server = _MockUGSServer(state, port)
+    thread = threading.Thread(target=mock_server.serve_forever, name="mock-ugs", daemon=True)
+    thread.start()
+    host, port = mock_server.server_address[:2]
+    try:
+        yield host, port
+    finally:
+        mock_server.shutdown()
+        mock_server.server_close()
+        thread.join()
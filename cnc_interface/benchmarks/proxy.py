@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import threading
+import time
+from typing import List
+from urllib import request
+
+from cnc_interface import machine, proxy
+
+
+async def _long_poll(port: int, etag: str, wait_seconds: float, latencies: List[float], published_at: List[float]) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET /machine?wait={wait_seconds} HTTP/1.1\r\nHost: x\r\nIf-None-Match: {etag}\r\n\r\n".encode()
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = int(next(
+        line.split(b":")[1] for line in head.split(b"\r\n") if line.lower().startswith(b"content-length")
+    ))
+    await reader.readexactly(length)
+    if head.startswith(b"HTTP/1.1 200") and published_at:
+        latencies.append(time.perf_counter() - published_at[0])
+    writer.close()
+
+
+async def _run_clients(port: int, etag: str, clients: int, idle_seconds: float, value: machine.SelfUpdatingValue) -> List[float]:
+    latencies: List[float] = []
+    published_at: List[float] = []
+    tasks = [
+        asyncio.ensure_future(_long_poll(port, etag, idle_seconds * 4, latencies, published_at))
+        for _ in range(clients)
+    ]
+    await asyncio.sleep(idle_seconds)
+    published_at.append(time.perf_counter())
+    await asyncio.get_running_loop().run_in_executor(None, value.update)
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Park many long-poll clients on the status proxy and publish one update.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--idle", type=float, default=2)
+    args = parser.parse_args()
+
+    x = 0.0
+
+    def fetch() -> machine.Machine:
+        nonlocal x
+        x += 1
+        return machine.Machine(machine_status=machine.MachineStatus(workCoord=machine.MachineCoords(x=x)))
+
+    value = machine.SelfUpdatingValue(machine.Machine(), fetch)
+    status_proxy = proxy.StatusProxy(value)
+    with status_proxy.serving() as port:
+        for clients in args.clients:
+            with request.urlopen(f"http://127.0.0.1:{port}/machine") as response:
+                etag = response.headers["ETag"]
+            threads = threading.active_count()
+            cpu = time.process_time()
+            latencies = asyncio.run(_run_clients(port, etag, clients, args.idle, value))
+            cpu_seconds = time.process_time() - cpu
+            latencies.sort()
+            print(
+                f"{clients:>4} clients: {len(latencies):>4} notified, "
+                f"p50 {latencies[len(latencies) // 2] * 1000:>6.1f} ms  max {latencies[-1] * 1000:>6.1f} ms  "
+                f"{cpu_seconds * 1000:>6.0f} ms cpu (clients included)  threads {threads}"
+            )
+
+
+if __name__ == "__main__":
+    main()
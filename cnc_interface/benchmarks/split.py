@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import threading
+import time
+from multiprocessing import connection
+from typing import Callable, List, Optional
+
+from cnc_interface import estimation, machine, split
+from cnc_interface.benchmarks import harness, mock_ugs
+
+
+def render_load(
+    read: Callable[[], None], stop_flag: threading.Event, frame_rate: float, busy_seconds: float
+) -> int:
+    """Stands in for the Tk loop: read the state, then hold the GIL for busy_seconds each frame."""
+    frames = 0
+    next_frame = time.perf_counter()
+    while not stop_flag.is_set():
+        read()
+        busy_until = time.perf_counter() + busy_seconds
+        while time.perf_counter() < busy_until:
+            f"{frames: > 9.3f}"
+        frames += 1
+        next_frame += 1 / frame_rate
+        stop_flag.wait(max(0, next_frame - time.perf_counter()))
+    return frames
+
+
+def measure_jogs(
+    results: connection.Connection,
+    block_name: Optional[str],
+    duration_seconds: float,
+    tick_rate: float,
+    frame_rate: float,
+    busy_seconds: float,
+) -> None:
+    """Runs the control side and reports jog latencies through `results`.
+
+    With a block name, state is published to it for a GUI in another
+    process; without, the GUI load runs on a thread in this process.
+    """
+    state = mock_ugs.MockUGSState(latency_seconds=0.002, seed=0)
+    with mock_ugs.running(state) as (host, port):
+        ugs_client = machine.UGSClient(host, port)
+        controls = machine.Controls(
+            ugs_client,
+            x_dial=machine.Dial(0, 0, 0),
+            y_dial=machine.Dial(0, 0, 0),
+            z_dial=machine.Dial(0, 0, 0),
+            input_backend="none",
+        )
+        readout = machine.DigitalReadout(ugs_client, controls)
+        stop_flag = threading.Event()
+        dial = harness.SyntheticDial(controls.on_x_cw, tick_rate, stop_flag)
+        with controls.running(), readout.syncing():
+            if block_name is None:
+                gui = threading.Thread(
+                    target=render_load,
+                    args=(lambda: readout.machine.snapshot(), stop_flag, frame_rate, busy_seconds),
+                    daemon=True,
+                )
+                gui.start()
+                dial.start()
+                time.sleep(duration_seconds)
+            else:
+                block = split.SnapshotBlock(block_name)
+                with split.SnapshotPublisher(readout, block).publishing():
+                    dial.start()
+                    time.sleep(duration_seconds)
+                block.close()
+            stop_flag.set()
+            dial.join()
+            time.sleep(0.5)
+        ugs_client.close()
+    results.send(harness.jog_latencies(dial.tick_times, state.jog_log))
+
+
+def run(split_processes: bool, args: argparse.Namespace) -> List[float]:
+    context = multiprocessing.get_context("spawn")
+    receive, send = context.Pipe(duplex=False)
+    block = split.SnapshotBlock() if split_processes else None
+    process = context.Process(
+        target=measure_jogs,
+        args=(send, block.name if block else None, args.duration, args.tick_rate, args.frame_rate, args.busy_ms / 1000),
+    )
+    process.start()
+    send.close()
+    if block is not None:
+        shared_machine = split.SharedMachine(block, estimation.PositionEstimator())
+        stop_flag = threading.Event()
+        gui = threading.Thread(
+            target=render_load, args=(shared_machine.snapshot, stop_flag, args.frame_rate, args.busy_ms / 1000)
+        )
+        gui.start()
+        latencies = receive.recv()
+        stop_flag.set()
+        gui.join()
+    else:
+        latencies = receive.recv()
+    process.join()
+    if block is not None:
+        block.close()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare jog latency jitter under GUI load, one process vs split.")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--tick-rate", type=float, default=20, help="dial ticks per second")
+    parser.add_argument("--frame-rate", type=float, default=30)
+    parser.add_argument("--busy-ms", type=float, default=20, help="GIL-holding work per simulated GUI frame")
+    args = parser.parse_args()
+
+    print(f"GUI load: {args.busy_ms:.0f} ms of Python per frame at {args.frame_rate:.0f} fps")
+    print(f"{'mode':>8} {'ticks':>6} {'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>7} {'p99-p50':>8}")
+    for split_processes in (False, True):
+        latencies = run(split_processes, args)
+        cuts = {key: value * 1000 for key, value in harness.percentiles(latencies).items()}
+        print(
+            f"{'split' if split_processes else 'single':>8} {len(latencies):>6} {cuts['p50']:>7.1f} {cuts['p90']:>7.1f}"
+            f" {cuts['p99']:>7.1f} {cuts['max']:>7.1f} {cuts['p99'] - cuts['p50']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
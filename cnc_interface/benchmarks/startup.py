@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from cnc_interface.benchmarks import mock_ugs
+
+
+IMPORTS = (
+    "tkinter",
+    "cnc_interface.gui",
+    "cnc_interface.main",
+    "pydantic",
+    "requests",
+    "cnc_interface.machine",
+)
+
+# Runs in a fresh interpreter and prints the monotonic time of each startup
+# stage, so the parent can include interpreter start-up in the figures.
+_WINDOW_SCRIPT = """
+import os, sys, time
+from cnc_interface import main
+
+def report(stage):
+    print(stage, time.monotonic(), flush=True)
+    if stage == "dro":
+        os._exit(0)
+
+print("imported", time.monotonic(), flush=True)
+main.run(main.parse_args(sys.argv[1:]), startup_listener=report)
+"""
+
+
+def import_seconds(module: str, repeat: int) -> float:
+    script = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    samples = [
+        float(subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout)
+        for _ in range(repeat)
+    ]
+    return statistics.median(samples)
+
+
+def window_stages(host: str, port: int) -> Dict[str, float]:
+    start = time.monotonic()
+    output = subprocess.run(
+        [sys.executable, "-c", _WINDOW_SCRIPT, "--host", host, "--port", str(port), "--input", "none"],
+        check=True, capture_output=True, text=True, timeout=60,
+    ).stdout
+    stages = {}
+    for line in output.splitlines():
+        stage, at = line.split()
+        stages[stage] = float(at) - start
+    return stages
+
+
+def _unused_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report import cost and time to the first frame.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for module in IMPORTS:
+        print(f"import {module:<22} {import_seconds(module, args.repeat) * 1000:>7.1f} ms")
+
+    if not os.environ.get("DISPLAY"):
+        print("no DISPLAY, skipping time to first frame")
+        return
+    runs: List[Dict[str, float]] = []
+    with mock_ugs.running(mock_ugs.MockUGSState()) as (host, port):
+        runs.append(window_stages(host, port))
+    # Nothing listens here, like a controller that is still booting.
+    runs.append(window_stages("127.0.0.1", _unused_port()))
+    for name, stages in zip(("controller up", "controller down"), runs):
+        print(
+            f"{name:>15}: imports {stages['imported'] * 1000:>6.0f} ms  "
+            f"window {stages['window'] * 1000:>6.0f} ms  first DRO frame {stages['dro'] * 1000:>6.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from cnc_interface import machine, telemetry
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure telemetry recording cost and replay lookups.")
+    parser.add_argument("--samples", type=int, default=200_000)
+    parser.add_argument("--capacity", type=int, default=50_000)
+    args = parser.parse_args()
+
+    samples = [
+        machine.Machine(
+            is_connected=i % 1000 != 0,
+            machine_status=machine.MachineStatus(
+                state="RUN",
+                machineCoord=machine.MachineCoords(x=i * 0.01, y=-i * 0.02, z=-5),
+                workCoord=machine.MachineCoords(x=i * 0.01, y=i * 0.02, z=1),
+                spindleSpeed=12_000,
+                feedSpeed=800,
+            ),
+        )
+        for i in range(1000)
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "telemetry.bin")
+        recorder = telemetry.Recorder(path, capacity=args.capacity)
+        start = time.perf_counter()
+        for i in range(args.samples):
+            recorder.record(samples[i % len(samples)], at=1_000_000 + i * 0.1)
+        elapsed = time.perf_counter() - start
+        recorder.close()
+        size = os.path.getsize(path)
+
+        recording = telemetry.Recording(path)
+        start = time.perf_counter()
+        lookups = 10_000
+        for i in range(lookups):
+            recording[recording.index_at(1_000_000 + (args.samples - args.capacity + i) * 0.1)]
+        lookup_seconds = (time.perf_counter() - start) / lookups
+        first, last = recording[0], recording[len(recording) - 1]
+        recording.close()
+
+    print(f"record: {elapsed / args.samples * 1e6:>6.2f} us/sample ({args.samples} samples)")
+    print(f"file:   {size / 1e6:>6.2f} MB for {args.capacity} records, {telemetry.RECORD.size} bytes each")
+    print(f"replay: {lookup_seconds * 1e6:>6.2f} us per seek, keeps {last.time - first.time:.0f} s of history")
+
+
+if __name__ == "__main__":
+    main()
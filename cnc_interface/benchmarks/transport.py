@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import statistics
+import threading
+import time
+from typing import List
+
+import requests
+
+from cnc_interface import machine
+from cnc_interface.benchmarks import mock_ugs
+
+
+class PerCallTransport(machine.HTTPTransport):
+    def send(self, request: requests.Request) -> requests.Response:
+        with requests.Session() as session:
+            return session.send(request.prepare(), timeout=self.timeout)
+
+
+@dataclasses.dataclass
+class Result:
+    name: str
+    requests: int
+    seconds: float
+    latencies: List[float]
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.seconds
+
+    @property
+    def p99_ms(self) -> float:
+        return statistics.quantiles(self.latencies, n=100)[98] * 1000
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:>10}: {self.requests_per_second:>8.1f} req/s  "
+            f"p99 {self.p99_ms:>7.2f} ms"
+        )
+
+
+def run(name: str, client: machine.UGSClient, requests_per_thread: int, threads: int) -> Result:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def worker() -> None:
+        local: List[float] = []
+        for i in range(requests_per_thread):
+            start = time.perf_counter()
+            if i % 2:
+                client.jog(1, 0, 0)
+            else:
+                client.get_machine_status()
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return Result(name, len(latencies), time.perf_counter() - start, latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare pooled and per-call HTTP transports.")
+    parser.add_argument("--requests", type=int, default=500, help="requests per thread")
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    state = mock_ugs.MockUGSState(latency_seconds=args.latency_ms / 1000)
+    with mock_ugs.running(state) as (host, port):
+        for name, transport in (
+            ("per-call", PerCallTransport()),
+            ("pooled", machine.HTTPTransport(pool_size=args.threads)),
+        ):
+            client = machine.UGSClient(host, port, transport=transport)
+            print(run(name, client, args.requests, args.threads))
+            transport.close()
+
+
+if __name__ == "__main__":
+    main()
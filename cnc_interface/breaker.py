@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import enum
+import threading
+from typing import Callable, List, Optional
+
+
+class BreakerState(enum.Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        probe: Callable[[], bool],
+        failure_threshold: int = 2,
+        probe_interval_seconds: float = 1,
+        call_later: Optional[Callable[[float, Callable[[], None]], None]] = None,
+    ) -> None:
+        self._probe = probe
+        # Without call_later the breaker probes from a thread of its own while
+        # it is open; with it, probes run on a shared scheduler.
+        self._call_later = call_later
+        self.failure_threshold = failure_threshold
+        self.probe_interval_seconds = probe_interval_seconds
+        self._lock = threading.Lock()
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._listeners: List[Callable[[BreakerState], None]] = []
+        self._probe_thread: Optional[threading.Thread] = None
+        self._is_probing = False
+        self._stop_flag = threading.Event()
+
+    @property
+    def state(self) -> BreakerState:
+        with self._lock:
+            return self._state
+
+    def add_listener(self, listener: Callable[[BreakerState], None]) -> None:
+        self._listeners.append(listener)
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            return self._state is BreakerState.CLOSED
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state is not BreakerState.CLOSED:
+                return
+            self._failures += 1
+            if self._failures < self.failure_threshold:
+                return
+        self._transition(BreakerState.OPEN)
+
+    def _transition(self, state: BreakerState, notify: bool = True) -> None:
+        with self._lock:
+            if self._state is state:
+                return
+            self._state = state
+            if state is BreakerState.CLOSED:
+                self._failures = 0
+            start_probe = state is BreakerState.OPEN and self._probe_thread is None and not self._is_probing
+            if start_probe and self._call_later is None:
+                self._probe_thread = threading.Thread(
+                    target=self._run_probe, name="circuit-breaker-probe", daemon=True
+                )
+            elif start_probe:
+                self._is_probing = True
+        if start_probe and self._probe_thread is not None:
+            self._probe_thread.start()
+        elif start_probe:
+            assert self._call_later is not None
+            self._call_later(self.probe_interval_seconds, self._probe_once)
+        if not notify:
+            return
+        for listener in self._listeners:
+            listener(state)
+
+    def _run_probe(self) -> None:
+        # Listeners only hear about the link going down and coming back, not
+        # about every failed probe in between.
+        while not self._stop_flag.wait(self.probe_interval_seconds):
+            self._transition(BreakerState.HALF_OPEN, notify=False)
+            if self._probe():
+                with self._lock:
+                    self._probe_thread = None
+                self._transition(BreakerState.CLOSED)
+                return
+            self._transition(BreakerState.OPEN, notify=False)
+        with self._lock:
+            self._probe_thread = None
+
+    def _probe_once(self) -> None:
+        if self._stop_flag.is_set():
+            return
+        self._transition(BreakerState.HALF_OPEN, notify=False)
+        if self._probe():
+            with self._lock:
+                self._is_probing = False
+            self._transition(BreakerState.CLOSED)
+            return
+        self._transition(BreakerState.OPEN, notify=False)
+        assert self._call_later is not None
+        self._call_later(self.probe_interval_seconds, self._probe_once)
+
+    def close(self) -> None:
+        self._stop_flag.set()
+        with self._lock:
+            thread = self._probe_thread
+        if thread is not None:
+            thread.join()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Any, Dict, NamedTuple, Optional
+
+
+class CoordsRecord(NamedTuple):
+    units: str
+    x: float
+    y: float
+    z: float
+
+
+class StatusRecord(NamedTuple):
+    state: str
+    machine_coord: CoordsRecord
+    work_coord: CoordsRecord
+    spindle_speed: float
+    feed_speed: float
+
+
+class SettingsRecord(NamedTuple):
+    jog_feed_rate: float
+    jog_step_size_xy: float
+    jog_step_size_z: float
+    preferred_units: str
+
+
+DEFAULT_COORDS = CoordsRecord("MM", 0.0, 0.0, 0.0)
+
+
+def decode_coords(payload: Optional[Dict[str, Any]]) -> CoordsRecord:
+    if payload is None:
+        return DEFAULT_COORDS
+    get = payload.get
+    return CoordsRecord(
+        str(get("units", "MM")),
+        float(get("x", 0)),
+        float(get("y", 0)),
+        float(get("z", 0)),
+    )
+
+
+def decode_status(payload: Dict[str, Any]) -> StatusRecord:
+    get = payload.get
+    return StatusRecord(
+        str(get("state", "UNKNOWN")),
+        decode_coords(get("machineCoord")),
+        decode_coords(get("workCoord")),
+        float(get("spindleSpeed", 0)),
+        float(get("feedSpeed", 0)),
+    )
+
+
+def decode_settings(payload: Dict[str, Any]) -> SettingsRecord:
+    get = payload.get
+    return SettingsRecord(
+        float(get("jogFeedRate", 0)),
+        float(get("jogStepSizeXY", 0)),
+        float(get("jogStepSizeZ", 0)),
+        str(get("preferredUnits", "MM")),
+    )
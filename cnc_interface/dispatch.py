@@ -0,0 +1,173 @@
+from __future__ import annotations
+from concurrent import futures
+from contextlib import contextmanager
+
+import dataclasses
+import enum
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from cnc_interface import metrics
+
+
+class Priority(enum.IntEnum):
+    SAFETY = 0
+    JOG = 1
+    SETTINGS = 2
+
+
+@dataclasses.dataclass
+class DispatchStats:
+    submitted: int = 0
+    executed: int = 0
+    collapsed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    total_wait_seconds: float = 0
+    max_wait_seconds: float = 0
+
+    @property
+    def mean_wait_seconds(self) -> float:
+        if not self.executed:
+            return 0
+        return self.total_wait_seconds / self.executed
+
+    def __str__(self) -> str:
+        return (
+            f"depth={self.queue_depth} max_depth={self.max_queue_depth} "
+            f"executed={self.executed} collapsed={self.collapsed} dropped={self.dropped} failed={self.failed} "
+            f"wait_mean={self.mean_wait_seconds * 1000:.1f}ms "
+            f"wait_max={self.max_wait_seconds * 1000:.1f}ms"
+        )
+
+
+@dataclasses.dataclass(order=True)
+class _Command:
+    priority: Priority
+    sequence: int
+    action: Callable[[], None] = dataclasses.field(compare=False)
+    key: Optional[str] = dataclasses.field(compare=False)
+    enqueued_at: float = dataclasses.field(compare=False)
+    future: futures.Future = dataclasses.field(compare=False, default_factory=futures.Future)
+
+
+class CommandDispatcher:
+    def __init__(self) -> None:
+        self.stats = DispatchStats()
+        self._queue: List[_Command] = []
+        self._pending_by_key: Dict[str, _Command] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stop_flag = False
+        self._thread: Optional[threading.Thread] = None
+        self._executed_listeners: List[Callable[[Priority], None]] = []
+
+    def add_executed_listener(self, listener: Callable[[Priority], None]) -> None:
+        self._executed_listeners.append(listener)
+
+    def submit(
+        self,
+        priority: Priority,
+        action: Callable[[], None],
+        key: Optional[str] = None,
+    ) -> futures.Future:
+        with self._condition:
+            self.stats.submitted += 1
+            if key is not None and key in self._pending_by_key:
+                # Only the latest value matters for keyed commands, replace
+                # the queued action but keep its place in the queue.
+                command = self._pending_by_key[key]
+                command.action = action
+                self.stats.collapsed += 1
+                return command.future
+            command = _Command(priority, next(self._sequence), action, key, time.monotonic())
+            heapq.heappush(self._queue, command)
+            if key is not None:
+                self._pending_by_key[key] = command
+            self.stats.queue_depth = len(self._queue)
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.stats.queue_depth)
+            self._condition.notify()
+            return command.future
+
+    def drop_pending(self, priority: Priority) -> int:
+        """Cancels the queued commands of one priority, returning how many there were."""
+        with self._condition:
+            dropped = [command for command in self._queue if command.priority == priority]
+            if not dropped:
+                return 0
+            self._queue = [command for command in self._queue if command.priority != priority]
+            heapq.heapify(self._queue)
+            for command in dropped:
+                if command.key is not None:
+                    del self._pending_by_key[command.key]
+            self.stats.dropped += len(dropped)
+            self.stats.queue_depth = len(self._queue)
+        for command in dropped:
+            command.future.cancel()
+        return len(dropped)
+
+    def _next_command(self) -> Optional[_Command]:
+        with self._condition:
+            while not self._queue and not self._stop_flag:
+                self._condition.wait()
+            # Safety commands still go out on the way down: a stop queued as
+            # the panel closes would otherwise leave the machine running.
+            if self._stop_flag and (not self._queue or self._queue[0].priority != Priority.SAFETY):
+                return None
+            command = heapq.heappop(self._queue)
+            if command.key is not None:
+                del self._pending_by_key[command.key]
+            wait_seconds = time.monotonic() - command.enqueued_at
+            metrics.histogram("dispatch_wait_seconds", priority=command.priority.name).observe(wait_seconds)
+            self.stats.queue_depth = len(self._queue)
+            self.stats.total_wait_seconds += wait_seconds
+            self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, wait_seconds)
+            return command
+
+    def _run(self) -> None:
+        while True:
+            command = self._next_command()
+            if command is None:
+                return
+            if not command.future.set_running_or_notify_cancel():
+                continue
+            try:
+                command.action()
+            except Exception as e:
+                with self._condition:
+                    self.stats.failed += 1
+                command.future.set_exception(e)
+            else:
+                command.future.set_result(None)
+            with self._condition:
+                self.stats.executed += 1
+            for listener in self._executed_listeners:
+                listener(command.priority)
+
+    def _cancel_pending(self) -> None:
+        with self._condition:
+            pending, self._queue = self._queue, []
+            self._pending_by_key.clear()
+            self.stats.queue_depth = 0
+        for command in pending:
+            command.future.cancel()
+
+    @contextmanager
+    def running(self) -> Iterator[None]:
+        with self._condition:
+            self._stop_flag = False
+        self._thread = threading.Thread(target=self._run, name="command-dispatcher", daemon=True)
+        self._thread.start()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._stop_flag = True
+                self._condition.notify_all()
+            self._thread.join()
+            self._cancel_pending()
@@ -0,0 +1,300 @@
+from __future__ import annotations
+from contextlib import contextmanager
+
+import collections
+import dataclasses
+import threading
+import time
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Protocol, Sequence, Tuple
+
+from cnc_interface import machine
+
+
+# Indexed by (previous AB << 2) | current AB. Transitions where both pins
+# change at once cannot be decoded and count as zero.
+QUADRATURE_TABLE = (0, -1, 1, 0, 1, 0, 0, -1, -1, 0, 0, 1, 0, 1, -1, 0)
+
+# Most detented dials go through a full quadrature cycle per click.
+TRANSITIONS_PER_TICK = 4
+
+# Pin levels (clk, dt) for one click, starting from and returning to the
+# pulled-up rest position.
+CLOCKWISE_SEQUENCE = ((0, 1), (0, 0), (1, 0), (1, 1))
+COUNTER_CLOCKWISE_SEQUENCE = ((1, 0), (0, 0), (0, 1), (1, 1))
+
+
+@dataclasses.dataclass(frozen=True)
+class EdgeEvent:
+    pin: int
+    level: int
+    timestamp_ns: int
+
+
+@dataclasses.dataclass(frozen=True)
+class TickBatch:
+    dial: machine.Dial
+    delta: int
+    first_ns: int
+    last_ns: int
+
+
+class EventSource(Protocol):
+    """Where EncoderReader gets pin edges from."""
+
+    def initial_levels(self) -> Dict[int, int]:
+        ...
+
+    def read_events(self, timeout_seconds: float) -> List[EdgeEvent]:
+        ...
+
+    def now_ns(self) -> int:
+        """The current time on the clock the event timestamps are taken on."""
+        return time.monotonic_ns()
+
+    def close(self) -> None:
+        pass
+
+
+class GpiodEventSource(EventSource):
+    """Pin edges from the GPIO character device, through libgpiod 2's bindings."""
+
+    def __init__(self, pins: Sequence[int], chip: str = "gpiochip0", consumer: str = "cnc_interface") -> None:
+        import gpiod
+        from gpiod.line import Bias, Edge
+
+        self._gpiod = gpiod
+        self._pins = list(pins)
+        self._request = gpiod.request_lines(
+            chip if chip.startswith("/") else f"/dev/{chip}",
+            consumer=consumer,
+            config={tuple(self._pins): gpiod.LineSettings(edge_detection=Edge.BOTH, bias=Bias.PULL_UP)},
+        )
+
+    def initial_levels(self) -> Dict[int, int]:
+        values = self._request.get_values(self._pins)
+        return {pin: 1 if value == self._gpiod.line.Value.ACTIVE else 0 for pin, value in zip(self._pins, values)}
+
+    def read_events(self, timeout_seconds: float) -> List[EdgeEvent]:
+        if not self._request.wait_edge_events(timeout_seconds):
+            return []
+        # Events come in kernel order, across all the requested lines.
+        return [
+            EdgeEvent(
+                pin=event.line_offset,
+                level=1 if event.event_type == self._gpiod.EdgeEvent.Type.RISING_EDGE else 0,
+                timestamp_ns=event.timestamp_ns,
+            )
+            for event in self._request.read_edge_events()
+        ]
+
+    def close(self) -> None:
+        self._request.release()
+
+
+class SimulatedEventSource(EventSource):
+    def __init__(self, dials: Iterable[machine.Dial]) -> None:
+        self._levels = {pin: 1 for dial in dials for pin in (dial.clk_pin, dial.dt_pin, dial.sw_pin)}
+        self._condition = threading.Condition()
+        self._events: Deque[EdgeEvent] = collections.deque()
+        self._clock_ns = time.monotonic_ns()
+
+    def initial_levels(self) -> Dict[int, int]:
+        with self._condition:
+            return dict(self._levels)
+
+    def now_ns(self) -> int:
+        # Events are stamped ahead of real time when a turn is queued
+        # faster than it would happen.
+        with self._condition:
+            return max(self._clock_ns, time.monotonic_ns())
+
+    def _emit(self, pin: int, level: int, interval_ns: int) -> None:
+        self._clock_ns += interval_ns
+        self._levels[pin] = level
+        self._events.append(EdgeEvent(pin, level, self._clock_ns))
+
+    def turn(self, dial: machine.Dial, ticks: int, tick_interval_ns: int = 1_000_000) -> None:
+        sequence = CLOCKWISE_SEQUENCE if ticks > 0 else COUNTER_CLOCKWISE_SEQUENCE
+        edge_interval_ns = max(1, tick_interval_ns // len(sequence))
+        with self._condition:
+            for _ in range(abs(ticks)):
+                for clk, dt in sequence:
+                    if self._levels[dial.clk_pin] != clk:
+                        self._emit(dial.clk_pin, clk, edge_interval_ns)
+                    if self._levels[dial.dt_pin] != dt:
+                        self._emit(dial.dt_pin, dt, edge_interval_ns)
+            self._condition.notify_all()
+
+    def press(self, dial: machine.Dial, duration_ns: int = 100_000_000, bounces: int = 0) -> None:
+        with self._condition:
+            for level, interval_ns in ((0, 1_000_000), (1, duration_ns)):
+                for _ in range(bounces):
+                    self._emit(dial.sw_pin, level, 100_000)
+                    self._emit(dial.sw_pin, 1 - level, 100_000)
+                self._emit(dial.sw_pin, level, interval_ns)
+            self._condition.notify_all()
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._events)
+
+    def read_events(self, timeout_seconds: float) -> List[EdgeEvent]:
+        with self._condition:
+            self._condition.wait_for(lambda: bool(self._events), timeout_seconds)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+
+class QuadratureDecoder:
+    def __init__(self, clk_level: int, dt_level: int, transitions_per_tick: int = TRANSITIONS_PER_TICK) -> None:
+        self._state = (clk_level << 1) | dt_level
+        self._transitions = 0
+        self._transitions_per_tick = transitions_per_tick
+        self.invalid_transitions = 0
+
+    def update(self, clk_level: int, dt_level: int) -> int:
+        state = (clk_level << 1) | dt_level
+        if state == self._state:
+            return 0
+        step = QUADRATURE_TABLE[(self._state << 2) | state]
+        if step == 0:
+            self.invalid_transitions += 1
+        self._state = state
+        self._transitions += step
+        ticks = int(self._transitions / self._transitions_per_tick)
+        self._transitions -= ticks * self._transitions_per_tick
+        return ticks
+
+
+class SwitchDebouncer:
+    """Reports switch level changes, ignoring contact bounce.
+
+    A change is reported right away, then the switch is left alone for
+    debounce_ns. The last level seen in that window is kept and reported
+    by settle() once the window is over, so a quick tap that is released
+    inside it still comes out as a press and a release.
+    """
+
+    def __init__(self, level: int, debounce_ns: int) -> None:
+        self.level = level
+        self._pending = level
+        self._debounce_ns = debounce_ns
+        self._last_change_ns: Optional[int] = None
+
+    def update(self, level: int, timestamp_ns: int) -> Optional[int]:
+        self._pending = level
+        return self.settle(timestamp_ns)
+
+    def settles_at(self) -> Optional[int]:
+        """When a level held back by the window can be reported, None if there is none."""
+        if self._pending == self.level:
+            return None
+        if self._last_change_ns is None:
+            return -1
+        return self._last_change_ns + self._debounce_ns
+
+    def settle(self, timestamp_ns: int) -> Optional[int]:
+        settles_at = self.settles_at()
+        if settles_at is None or timestamp_ns < settles_at:
+            return None
+        self.level = self._pending
+        self._last_change_ns = timestamp_ns
+        return self.level
+
+
+class _DialState:
+    def __init__(self, dial: machine.Dial, levels: Dict[int, int], debounce_ns: int) -> None:
+        self.dial = dial
+        self.clk_level = levels.get(dial.clk_pin, 1)
+        self.dt_level = levels.get(dial.dt_pin, 1)
+        self.decoder = QuadratureDecoder(self.clk_level, self.dt_level)
+        self.switch = SwitchDebouncer(levels.get(dial.sw_pin, 1), debounce_ns)
+
+
+@dataclasses.dataclass
+class EncoderReader:
+    source: EventSource
+    dials: Sequence[machine.Dial]
+    on_ticks: Callable[[TickBatch], None]
+    on_button: Callable[[machine.Dial, bool, int], None]
+    debounce_seconds: float = 0.01
+    poll_timeout_seconds: float = 0.05
+
+    def __post_init__(self) -> None:
+        levels = self.source.initial_levels()
+        debounce_ns = int(self.debounce_seconds * 1e9)
+        self._states = [_DialState(dial, levels, debounce_ns) for dial in self.dials]
+        self._by_pin: Dict[int, Tuple[_DialState, str]] = {}
+        for state in self._states:
+            self._by_pin[state.dial.clk_pin] = (state, "clk")
+            self._by_pin[state.dial.dt_pin] = (state, "dt")
+            self._by_pin[state.dial.sw_pin] = (state, "sw")
+        self._stop_flag = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.events_read = 0
+
+    @property
+    def invalid_transitions(self) -> int:
+        return sum(state.decoder.invalid_transitions for state in self._states)
+
+    def process(self, events: Sequence[EdgeEvent]) -> None:
+        batches: Dict[machine.Dial, List[int]] = {}
+        for event in events:
+            entry = self._by_pin.get(event.pin)
+            if entry is None:
+                continue
+            state, role = entry
+            if role == "sw":
+                self._report_switch(state, state.switch.update(event.level, event.timestamp_ns), event.timestamp_ns)
+                continue
+            if role == "clk":
+                state.clk_level = event.level
+            else:
+                state.dt_level = event.level
+            ticks = state.decoder.update(state.clk_level, state.dt_level)
+            if not ticks:
+                continue
+            batch = batches.get(state.dial)
+            if batch is None:
+                batches[state.dial] = [ticks, event.timestamp_ns, event.timestamp_ns]
+            else:
+                batch[0] += ticks
+                batch[2] = event.timestamp_ns
+        self.events_read += len(events)
+        for dial, (delta, first_ns, last_ns) in batches.items():
+            if delta:
+                self.on_ticks(TickBatch(dial, delta, first_ns, last_ns))
+
+    def _report_switch(self, state: _DialState, level: Optional[int], timestamp_ns: int) -> None:
+        if level is not None:
+            # Pulled up, so a low switch pin means the dial is pressed.
+            self.on_button(state.dial, level == 0, timestamp_ns)
+
+    def settle(self, now_ns: int) -> None:
+        """Reports switch levels that were held back until their debounce window ended."""
+        for state in self._states:
+            self._report_switch(state, state.switch.settle(now_ns), now_ns)
+
+    def _read_timeout_seconds(self) -> float:
+        pending = [at for at in (state.switch.settles_at() for state in self._states) if at is not None]
+        if not pending:
+            return self.poll_timeout_seconds
+        return min(self.poll_timeout_seconds, max(0, (min(pending) - self.source.now_ns()) / 1e9))
+
+    def _run(self) -> None:
+        while not self._stop_flag.is_set():
+            self.process(self.source.read_events(self._read_timeout_seconds()))
+            self.settle(self.source.now_ns())
+
+    @contextmanager
+    def running(self) -> Iterator[None]:
+        self._stop_flag.clear()
+        self._thread = threading.Thread(target=self._run, name="encoder-reader", daemon=True)
+        self._thread.start()
+        try:
+            yield
+        finally:
+            self._stop_flag.set()
+            self._thread.join()
+            self.source.close()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import dataclasses
+import math
+import threading
+import time
+from typing import NamedTuple, Optional, Tuple
+
+Vector = Tuple[float, float, float]
+
+ZERO: Vector = (0.0, 0.0, 0.0)
+
+
+class EstimatorState(NamedTuple):
+    """Everything offset() depends on, for handing an estimate to another process.
+
+    Times are time.monotonic(), which is system-wide on Linux, so a copy in
+    another process extrapolates exactly like the original.
+    """
+    position: Optional[Vector]
+    sampled_at: float
+    is_moving: bool
+    velocity: Vector
+    target: Optional[Vector]
+    extrapolation_seconds: float
+
+
+@dataclasses.dataclass
+class PositionEstimator:
+    """Dead-reckons the tool position between status polls.
+
+    Velocity per axis comes from the last two samples while the machine is
+    moving. Before there are two, it comes from the jog command that
+    started the motion, counted from when the command was sent. Estimates
+    snap back to each new sample and stop at the target of the commands in
+    flight. They fall back to the last sample once the next one is overdue,
+    poll_slack times the poll period set with set_poll_period() and never
+    sooner than min_extrapolation_seconds, so a jog the controller never
+    ran is not shown for good. A stopped sample that arrives within one
+    fetch of a command does not end the motion, as the poll may well have
+    been sent before the command.
+    """
+    min_extrapolation_seconds: float = 0.3
+    poll_slack: float = 1.5
+    arrival_tolerance: float = 0.001
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._position: Optional[Vector] = None
+        self._sampled_at = 0.0
+        self._is_moving = False
+        self._velocity: Vector = ZERO
+        self._target: Optional[Vector] = None
+        self._feed_rate = 0.0
+        self._extrapolation_seconds = self.min_extrapolation_seconds
+        self._fetch_seconds = 0.0
+        self._commanded_at = -math.inf
+
+    def set_poll_period(self, seconds: float, fetch_seconds: float = 0) -> None:
+        """The time from one sample to the next, and the part of it spent fetching."""
+        with self._lock:
+            self._extrapolation_seconds = max(self.min_extrapolation_seconds, self.poll_slack * seconds)
+            self._fetch_seconds = fetch_seconds
+
+    def on_sample(self, position: Vector, is_moving: bool, at: Optional[float] = None) -> None:
+        at = time.monotonic() if at is None else at
+        with self._lock:
+            if not is_moving and at - self._commanded_at < self._fetch_seconds:
+                # Polled before the command went out, most likely: the
+                # machine was at rest here when it did.
+                self._position = position
+                self._sampled_at = self._commanded_at
+                self._velocity = self._commanded_velocity(position)
+                self._is_moving = True
+                return
+            previous, previous_at = self._position, self._sampled_at
+            self._position = position
+            self._sampled_at = at
+            if not is_moving:
+                self._is_moving = False
+                self._velocity = ZERO
+                self._target = None
+                return
+            if self._is_moving and previous is not None and at > previous_at:
+                self._velocity = tuple(  # type: ignore
+                    (p - q) / (at - previous_at) for p, q in zip(position, previous)
+                )
+            else:
+                self._velocity = self._commanded_velocity(position)
+            self._is_moving = True
+            if self._target is not None and _distance(position, self._target) <= self.arrival_tolerance:
+                self._target = None
+
+    def on_move(self, x: float, y: float, z: float, feed_rate: float, at: Optional[float] = None) -> None:
+        """A relative move of (x, y, z) mm at feed_rate mm/min was commanded."""
+        at = time.monotonic() if at is None else at
+        with self._lock:
+            start = self._target or self._position
+            if start is None or self._position is None:
+                return
+            self._target = (start[0] + x, start[1] + y, start[2] + z)
+            self._feed_rate = feed_rate
+            self._commanded_at = at
+            if not self._is_moving:
+                # The last sample found the machine at rest, so it is still
+                # there now; short jogs can finish before the next poll sees
+                # them moving at all.
+                self._is_moving = True
+                self._sampled_at = at
+                self._velocity = self._commanded_velocity(self._position)
+
+    def _commanded_velocity(self, position: Vector) -> Vector:
+        if self._target is None:
+            return ZERO
+        distance = _distance(position, self._target)
+        if distance <= self.arrival_tolerance:
+            return ZERO
+        speed = self._feed_rate / 60
+        return tuple((t - p) / distance * speed for p, t in zip(position, self._target))  # type: ignore
+
+    def state(self) -> EstimatorState:
+        with self._lock:
+            return EstimatorState(
+                self._position, self._sampled_at, self._is_moving, self._velocity, self._target, self._extrapolation_seconds
+            )
+
+    def restore(self, state: EstimatorState) -> None:
+        with self._lock:
+            (
+                self._position, self._sampled_at, self._is_moving, self._velocity, self._target, self._extrapolation_seconds
+            ) = state
+
+    def offset(self, now: Optional[float] = None) -> Vector:
+        """Estimated travel since the last sample, to add to its coordinates."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if not self._is_moving or self._position is None:
+                return ZERO
+            elapsed = max(now - self._sampled_at, 0)
+            if elapsed > self._extrapolation_seconds:
+                return ZERO
+            offset = []
+            for axis in range(3):
+                travel = self._velocity[axis] * elapsed
+                if self._target is not None:
+                    remaining = self._target[axis] - self._position[axis]
+                    # Never past the target, and not at all on an axis that
+                    # is heading away from it.
+                    travel = min(max(travel, min(remaining, 0)), max(remaining, 0))
+                offset.append(travel)
+            return (offset[0], offset[1], offset[2])
+
+
+def _distance(a: Vector, b: Vector) -> float:
+    return math.sqrt(sum((p - q) ** 2 for p, q in zip(a, b)))
@@ -0,0 +1,120 @@
+from __future__ import annotations
+from concurrent import futures
+from contextlib import ExitStack, contextmanager
+
+import dataclasses
+import math
+import time
+from typing import Iterator, List, Optional
+
+import pydantic
+
+from cnc_interface import machine, scheduler
+
+
+class MachineConfig(pydantic.BaseModel):
+    class Config:
+        frozen = True
+
+    name: str
+    host: str
+    port: int = 8080
+
+
+class FleetConfig(pydantic.BaseModel):
+    """Machines to monitor, read from a JSON file such as
+
+        {"workers": 4, "machines": [{"name": "router-1", "host": "192.168.2.223"}]}
+    """
+    class Config:
+        frozen = True
+
+    machines: List[MachineConfig]
+    workers: int = 4
+
+
+def load_config(path: str) -> FleetConfig:
+    return FleetConfig.parse_file(path)
+
+
+@dataclasses.dataclass
+class MonitoredMachine:
+    config: MachineConfig
+    ugs_client: machine.UGSClient
+    poll_scheduler: Optional[scheduler.PollScheduler] = None
+    poll_policy: machine.PollPolicy = dataclasses.field(default_factory=machine.AdaptivePollPolicy)
+
+    def __post_init__(self) -> None:
+        self.machine = machine.SelfUpdatingValue(
+            machine.Machine(), self._fetch_machine, _poll_policy=self.poll_policy, _scheduler=self.poll_scheduler
+        )
+        self.ugs_client.add_connection_listener(lambda _: self.machine.wake())
+        self._connected_at: Optional[float] = None
+
+    def data_age(self) -> float:
+        """Seconds since a poll last reached the machine.
+
+        Unlike SelfUpdatingValue.poll_age(), polls that failed and came back
+        with the placeholder Machine do not count.
+        """
+        connected_at = self._connected_at
+        if connected_at is None:
+            return math.inf
+        return time.monotonic() - connected_at
+
+    def _fetch_machine(self) -> machine.Machine:
+        machine_status, machine_settings = self.ugs_client.get_machine_status_and_settings()
+        if self.ugs_client.has_connection:
+            self._connected_at = time.monotonic()
+        return machine.Machine(
+            is_connected=self.ugs_client.has_connection,
+            machine_status=machine_status,
+            machine_settings=machine_settings,
+        )
+
+
+class Fleet:
+    """Several machines polled from one process.
+
+    All machines share one HTTP transport, one executor for settings
+    fetches and one PollScheduler, which also runs the circuit breaker
+    probes. The number of threads stays at the worker count however many
+    machines are configured.
+    """
+
+    def __init__(self, config: FleetConfig) -> None:
+        self.config = config
+        self.poll_scheduler = scheduler.PollScheduler(config.workers)
+        self.transport = machine.HTTPTransport(
+            pool_size=max(2, config.workers), host_pools=max(1, len(config.machines))
+        )
+        self._fetch_executor = futures.ThreadPoolExecutor(config.workers, thread_name_prefix="fleet-fetch")
+        self.machines = [
+            MonitoredMachine(
+                machine_config,
+                machine.UGSClient(
+                    machine_config.host,
+                    machine_config.port,
+                    transport=self.transport,
+                    fetch_executor=self._fetch_executor,
+                    call_later=self.poll_scheduler.call_later,
+                ),
+                self.poll_scheduler,
+            )
+            for machine_config in config.machines
+        ]
+
+    def close(self) -> None:
+        for monitored in self.machines:
+            monitored.ugs_client.close()
+        self._fetch_executor.shutdown(wait=True)
+        self.transport.close()
+
+    @contextmanager
+    def running(self) -> Iterator[Fleet]:
+        with ExitStack() as stack:
+            stack.callback(self.close)
+            stack.enter_context(self.poll_scheduler.running())
+            for monitored in self.machines:
+                stack.enter_context(monitored.machine.enabled())
+            yield self
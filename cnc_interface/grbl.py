@@ -0,0 +1,441 @@
+from __future__ import annotations
+
+import collections
+import dataclasses
+import math
+import os
+import re
+import select
+import termios
+import threading
+import time
+import tty
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Tuple
+
+from cnc_interface import machine
+
+if TYPE_CHECKING:
+    from cnc_interface import analysis
+
+
+STATUS_QUERY = b"?"
+CYCLE_START = b"~"
+FEED_HOLD = b"!"
+SOFT_RESET = b"\x18"
+JOG_CANCEL = b"\x85"
+FEED_OVERRIDE_RESET = b"\x90"
+FEED_OVERRIDE_PLUS_10 = b"\x91"
+FEED_OVERRIDE_MINUS_10 = b"\x92"
+SPINDLE_OVERRIDE_RESET = b"\x99"
+SPINDLE_OVERRIDE_PLUS_10 = b"\x9a"
+SPINDLE_OVERRIDE_MINUS_10 = b"\x9b"
+
+RX_BUFFER_SIZE = 128
+
+_BAUD_RATES = {
+    9600: termios.B9600,
+    19200: termios.B19200,
+    38400: termios.B38400,
+    57600: termios.B57600,
+    115200: termios.B115200,
+    230400: termios.B230400,
+}
+
+_SETTING_PATTERN = re.compile(r"^\$(\d+)=([-+]?[0-9.]+)")
+
+Vector = Tuple[float, float, float]
+
+
+class SerialPort:
+    def __init__(self, path: str, baud_rate: int) -> None:
+        self._fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        try:
+            tty.setraw(self._fd)
+            attributes = termios.tcgetattr(self._fd)
+            attributes[4] = attributes[5] = _BAUD_RATES[baud_rate]
+            termios.tcsetattr(self._fd, termios.TCSANOW, attributes)
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._read_buffer = bytearray()
+
+    def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+
+    def readline(self, timeout_seconds: float) -> Optional[bytes]:
+        while b"\n" not in self._read_buffer:
+            readable, _, _ = select.select([self._fd], [], [], timeout_seconds)
+            if not readable:
+                return None
+            chunk = os.read(self._fd, 1024)
+            if not chunk:
+                raise OSError("serial port closed")
+            self._read_buffer.extend(chunk)
+        line, _, rest = self._read_buffer.partition(b"\n")
+        self._read_buffer = bytearray(rest)
+        return bytes(line.rstrip(b"\r"))
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def _parse_vector(text: str) -> Vector:
+    x, y, z = (float(value) for value in text.split(",")[:3])
+    return x, y, z
+
+
+@dataclasses.dataclass(frozen=True)
+class StatusReport:
+    state: str
+    machine_position: Optional[Vector] = None
+    work_position: Optional[Vector] = None
+    work_offset: Optional[Vector] = None
+    feed: float = 0
+    spindle_speed: float = 0
+
+
+def parse_status_report(line: str) -> StatusReport:
+    fields = line.strip("<>").split("|")
+    # Sub-states like "Hold:0" are dropped, the rest matches the state
+    # names UGS reports.
+    state = fields[0].split(":")[0].upper()
+    values: Dict[str, str] = {}
+    for field in fields[1:]:
+        key, _, value = field.partition(":")
+        values[key] = value
+    feed, spindle_speed = 0.0, 0.0
+    if "FS" in values:
+        feed, spindle_speed = (float(value) for value in values["FS"].split(",")[:2])
+    elif "F" in values:
+        feed = float(values["F"])
+    return StatusReport(
+        state=state,
+        machine_position=_parse_vector(values["MPos"]) if "MPos" in values else None,
+        work_position=_parse_vector(values["WPos"]) if "WPos" in values else None,
+        work_offset=_parse_vector(values["WCO"]) if "WCO" in values else None,
+        feed=feed,
+        spindle_speed=spindle_speed,
+    )
+
+
+@dataclasses.dataclass
+class GrblClient:
+    serial_port: str
+    baud_rate: int = 115200
+    status_interval_seconds: float = 0.1
+    rx_buffer_size: int = RX_BUFFER_SIZE
+    connection_timeout_seconds: float = 1
+    reopen_delay_seconds: float = 1
+    has_connection: bool = False
+
+    def __post_init__(self) -> None:
+        self._stop_flag = threading.Event()
+        self._write_lock = threading.Lock()
+        self._stream = threading.Condition()
+        self._port: Optional[SerialPort] = None
+        # Size of each unanswered line, and for lines from send_gcode the
+        # line itself and its place among all of them, for reporting a
+        # rejection back to the sender.
+        self._in_flight: Deque[Tuple[int, Optional[Tuple[str, int]]]] = collections.deque()
+        self._in_flight_bytes = 0
+        # Moves on whenever GRBL's receive buffer is emptied under the
+        # senders: on a reset, a stop or a lost port.
+        self._stream_generation = 0
+        self._gcode_count = 0
+        # The rejected command, GRBL's answer and the command's place.
+        self._rejected: Optional[Tuple[str, str, int]] = None
+        self._connection_listeners: List[Callable[[bool], None]] = []
+        self._status_lock = threading.Lock()
+        self._machine_position: Vector = (0, 0, 0)
+        self._work_offset: Vector = (0, 0, 0)
+        self._status = machine.MachineStatus()
+        self._last_report_at = -math.inf
+        self._machine_settings = machine.MachineSettings(
+            jogFeedRate=1000, jogStepSizeXY=1, jogStepSizeZ=1
+        )
+        self._settings_lines: Optional[Dict[int, float]] = None
+        self.grbl_settings: Dict[int, float] = {}
+        self._threads = [
+            threading.Thread(target=self._run_reader, name="grbl-reader", daemon=True),
+            threading.Thread(target=self._run_status_query, name="grbl-status", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self) -> None:
+        self._stop_flag.set()
+        for thread in self._threads:
+            thread.join()
+
+    def add_connection_listener(self, listener: Callable[[bool], None]) -> None:
+        self._connection_listeners.append(listener)
+
+    def _set_connected(self, is_connected: bool) -> None:
+        if self.has_connection == is_connected:
+            return
+        self.has_connection = is_connected
+        for listener in self._connection_listeners:
+            listener(is_connected)
+
+    def _run_reader(self) -> None:
+        while not self._stop_flag.is_set():
+            try:
+                port = SerialPort(self.serial_port, self.baud_rate)
+            except OSError:
+                self._stop_flag.wait(self.reopen_delay_seconds)
+                continue
+            with self._stream:
+                self._port = port
+            try:
+                self._read_lines(port)
+            except OSError:
+                pass
+            finally:
+                with self._stream:
+                    self._port = None
+                    self._reset_stream()
+                port.close()
+                self._set_connected(False)
+
+    def _read_lines(self, port: SerialPort) -> None:
+        while not self._stop_flag.is_set():
+            line = port.readline(self.status_interval_seconds)
+            if line is not None:
+                self._handle_line(line.decode("ascii", errors="replace").strip())
+            if time.monotonic() - self._last_report_at > self.connection_timeout_seconds:
+                self._set_connected(False)
+
+    def _run_status_query(self) -> None:
+        while not self._stop_flag.wait(self.status_interval_seconds):
+            self.send_realtime(STATUS_QUERY)
+
+    def _reset_stream(self) -> None:
+        self._in_flight.clear()
+        self._in_flight_bytes = 0
+        self._stream_generation += 1
+        self._rejected = None
+        self._stream.notify_all()
+
+    def _handle_line(self, line: str) -> None:
+        if not line:
+            return
+        if line.startswith("<"):
+            self._handle_status_report(parse_status_report(line))
+        elif line == "ok" or line.startswith("error"):
+            with self._stream:
+                if self._in_flight:
+                    size, reported = self._in_flight.popleft()
+                    self._in_flight_bytes -= size
+                    if reported is not None and line != "ok" and self._rejected is None:
+                        command, index = reported
+                        self._rejected = (command, line, index)
+                if self._settings_lines is not None and not self._in_flight:
+                    self.grbl_settings.update(self._settings_lines)
+                    self._settings_lines = None
+                self._stream.notify_all()
+        elif line.startswith("Grbl "):
+            # GRBL was reset and its receive buffer is empty again.
+            with self._stream:
+                self._reset_stream()
+        else:
+            match = _SETTING_PATTERN.match(line)
+            if match is not None:
+                with self._stream:
+                    if self._settings_lines is None:
+                        self._settings_lines = {}
+                    self._settings_lines[int(match.group(1))] = float(match.group(2))
+
+    def _handle_status_report(self, report: StatusReport) -> None:
+        with self._status_lock:
+            if report.work_offset is not None:
+                self._work_offset = report.work_offset
+            offset = self._work_offset
+            if report.machine_position is not None:
+                machine_position = report.machine_position
+            elif report.work_position is not None:
+                machine_position = tuple(w + o for w, o in zip(report.work_position, offset))  # type: ignore
+            else:
+                machine_position = self._machine_position
+            self._machine_position = machine_position
+            work_position = tuple(m - o for m, o in zip(machine_position, offset))
+            self._status = machine.MachineStatus.construct(
+                state=report.state,
+                machine_coord=machine.MachineCoords.construct(
+                    units="MM", x=machine_position[0], y=machine_position[1], z=machine_position[2]
+                ),
+                work_coord=machine.MachineCoords.construct(
+                    units="MM", x=work_position[0], y=work_position[1], z=work_position[2]
+                ),
+                spindle_speed=report.spindle_speed,
+                feed_speed=report.feed,
+            )
+            self._last_report_at = time.monotonic()
+        self._set_connected(True)
+
+    def send_realtime(self, command: bytes) -> None:
+        # Real-time commands are picked off the serial stream by GRBL
+        # directly, they neither wait for nor take up receive buffer space.
+        port = self._port
+        if port is None:
+            return
+        with self._write_lock:
+            try:
+                port.write(command)
+            except OSError:
+                pass
+
+    def send_line(self, line: str) -> None:
+        self._send(line)
+
+    def _send(self, line: str, generation: Optional[int] = None, index: Optional[int] = None) -> None:
+        command = line.strip()
+        data = (command + "\n").encode("ascii")
+        if len(data) > self.rx_buffer_size:
+            raise ValueError(f"line longer than GRBL's receive buffer: {line!r}")
+        deadline = time.monotonic() + self.connection_timeout_seconds
+        with self._stream:
+            # GRBL holds back its answers while the planner is full or in a
+            # feed hold, for as long as that lasts; only a controller that
+            # stopped reporting status is given up on.
+            while self._port is not None and self._in_flight_bytes + len(data) > self.rx_buffer_size:
+                if generation is not None and generation != self._stream_generation:
+                    break
+                if not self.has_connection and time.monotonic() > deadline:
+                    raise machine.ConnectionError()
+                self._stream.wait(self.status_interval_seconds)
+            port = self._port
+            if port is None or (generation is not None and generation != self._stream_generation):
+                raise machine.ConnectionError()
+            self._in_flight.append((len(data), None if index is None else (command, index)))
+            self._in_flight_bytes += len(data)
+            with self._write_lock:
+                try:
+                    port.write(data)
+                except OSError as e:
+                    raise machine.ConnectionError() from e
+
+    def _send_lines(self, *lines: str) -> None:
+        try:
+            for line in lines:
+                self.send_line(line)
+        except machine.ConnectionError:
+            return
+
+    def _wait_until_answered(self, timeout_seconds: float) -> bool:
+        with self._stream:
+            return self._stream.wait_for(lambda: not self._in_flight, timeout_seconds)
+
+    def _raise_rejection(self) -> None:
+        with self._stream:
+            rejected, self._rejected = self._rejected, None
+            gcode_count = self._gcode_count
+        if rejected is not None:
+            command, reason, index = rejected
+            raise machine.CommandError(command, reason, lines_after=gcode_count - 1 - index)
+
+    def wait_until_idle(self, timeout_seconds: float) -> bool:
+        """Waits for GRBL to answer every line sent so far.
+
+        Raises CommandError if it rejected a line sent with send_gcode.
+        """
+        is_idle = self._wait_until_answered(timeout_seconds)
+        self._raise_rejection()
+        return is_idle
+
+    def read_grbl_settings(self, timeout_seconds: float = 2) -> Dict[int, float]:
+        self._send_lines("$$")
+        self._wait_until_answered(timeout_seconds)
+        return dict(self.grbl_settings)
+
+    def read_axis_limits(self, timeout_seconds: float = 2) -> Optional[analysis.AxisLimits]:
+        from cnc_interface import analysis
+
+        return analysis.AxisLimits.from_grbl_settings(self.read_grbl_settings(timeout_seconds))
+
+    def read_envelope(self, timeout_seconds: float = 2) -> Optional[machine.Envelope]:
+        """The soft-limit envelope from $130-$132 max travel.
+
+        None unless GRBL's own soft limits ($20) are on: only then is the
+        machine homed, so that machine coordinates match the travel.
+        """
+        settings = self.read_grbl_settings(timeout_seconds)
+        if settings.get(20) != 1 or not all(axis in settings for axis in (130, 131, 132)):
+            return None
+        return machine.Envelope.from_travel(settings[130], settings[131], settings[132])
+
+    def get_machine_status(self) -> machine.MachineStatus:
+        if not self.has_connection:
+            return machine.MachineStatus()
+        with self._status_lock:
+            return self._status
+
+    def get_machine_settings(self) -> machine.MachineSettings:
+        return self._machine_settings
+
+    def get_machine_status_and_settings(self) -> Tuple[machine.MachineStatus, machine.MachineSettings]:
+        return self.get_machine_status(), self.get_machine_settings()
+
+    def post_machine_settings(self, machine_settings: machine.MachineSettings) -> None:
+        # GRBL has no notion of jog settings, UGS kept them for us so now we do.
+        self._machine_settings = machine_settings
+
+    def post_spindle_settings(self, spindle_settings: machine.SpindleSettings) -> None:
+        self._send_lines(f"S{spindle_settings.speed:.0f} {'M03' if spindle_settings.is_on else 'M05'}")
+
+    def jog(self, x: int, y: int, z: int) -> None:
+        settings = self._machine_settings
+        if (x, y, z) == (0, 0, 0):
+            return
+        self.jog_move(
+            x * settings.jog_step_size_xy,
+            y * settings.jog_step_size_xy,
+            z * settings.jog_step_size_z,
+            settings.jog_feed_rate,
+        )
+
+    def jog_move(self, x: float, y: float, z: float, feed_rate: float) -> None:
+        self.send_line(f"$J=G91 G21 {machine.format_axes(x, y, z)} F{feed_rate:.0f}")
+
+    def send_gcode(self, commands: List[str]) -> None:
+        """Streams commands; raises CommandError for one GRBL rejected or one too long to send.
+
+        Commands still unsent when GRBL is reset or stopped are dropped and
+        raise machine.ConnectionError, as they would run out of context.
+        """
+        with self._stream:
+            generation = self._stream_generation
+            first_index = self._gcode_count
+            self._gcode_count += len(commands)
+        for index, command in enumerate(commands, first_index):
+            self._raise_rejection()
+            try:
+                self._send(command, generation, index)
+            except ValueError as e:
+                raise machine.CommandError(
+                    command, "longer than GRBL's receive buffer", lines_after=first_index + len(commands) - 1 - index
+                ) from e
+
+    def cancel_jog(self) -> None:
+        self.send_realtime(JOG_CANCEL)
+
+    def feed_hold(self) -> None:
+        self.send_realtime(FEED_HOLD)
+
+    def resume(self) -> None:
+        self.send_realtime(CYCLE_START)
+
+    def stop(self) -> None:
+        # The reset empties GRBL's receive buffer without answering the
+        # lines in it.
+        with self._stream:
+            self._reset_stream()
+        self.send_realtime(SOFT_RESET)
+
+    def reset_zero(self) -> None:
+        self._send_lines("G10 L20 P0 X0 Y0 Z0")
+
+    def go_to_zero(self) -> None:
+        self._send_lines("G53 G0 Z0", "G90 G0 X0 Y0", "G90 G0 Z0")
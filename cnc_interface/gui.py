@@ -1,24 +1,212 @@
+from __future__ import annotations
+
 import tkinter
-from cnc_interface import machine
 import subprocess
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from cnc_interface import analysis, fleet, machine, split
+
+    Readout = Union[machine.DigitalReadout, split.RemoteReadout]
 
 
 def turn_off_screen() -> None:
     subprocess.run("xset -display :0 s activate", shell=True)
 
 
-def launch_window(cnc: machine.DigitalReadout) -> None:
-    mono_font = ("Courier", 24)
-
+class _LabelTexts:
+    def __init__(self) -> None:
+        self._texts: Dict[tkinter.Label, str] = {}
+
+    def set(self, label: tkinter.Label, text: str) -> None:
+        if self._texts.get(label) == text:
+            return
+        self._texts[label] = text
+        label.config(text=text)
+
+
+class _FrameStats:
+    def __init__(self, window_seconds: float = 1) -> None:
+        self._window_seconds = window_seconds
+        self._window_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._frames = 0
+        self._max_frame_seconds = 0.0
+        self.text = ""
+
+    def record(self, frame_seconds: float) -> None:
+        self._frames += 1
+        self._max_frame_seconds = max(self._max_frame_seconds, frame_seconds)
+        now = time.perf_counter()
+        elapsed = now - self._window_start
+        if elapsed < self._window_seconds:
+            return
+        cpu = time.process_time()
+        cpu_percent = (cpu - self._cpu_start) / elapsed * 100
+        self.text = (
+            f"{self._frames / elapsed:>4.0f} fps "
+            f"{self._max_frame_seconds * 1000:>5.1f} ms "
+            f"{cpu_percent:>3.0f}% cpu"
+        )
+        self._window_start = now
+        self._cpu_start = cpu
+        self._frames = 0
+        self._max_frame_seconds = 0
+
+
+class _ToolpathPreview:
+    """Top view of the loaded program with a live tool marker.
+
+    The path is drawn once per program. Consecutive points that land on the
+    same pixel are dropped first, so the number of canvas items follows the
+    preview's resolution rather than the program's length. Each frame only
+    moves the marker, and only when it changes pixel.
+    """
+
+    def __init__(self, canvas: tkinter.Canvas, size: int, max_points: int = 20_000, margin: int = 6) -> None:
+        self._canvas = canvas
+        self._size = size
+        self._max_points = max_points
+        self._margin = margin
+        self._toolpath: Optional[analysis.Toolpath] = None
+        self._origin = (0.0, 0.0)
+        self._scale = 1.0
+        self._marker_pixel = (-1, -1)
+        self._marker = canvas.create_oval(0, 0, 0, 0, outline="red", width=2, state="hidden")
+
+    def _to_pixel(self, x: float, y: float) -> Tuple[int, int]:
+        return (
+            round(self._margin + (x - self._origin[0]) * self._scale),
+            round(self._size - self._margin - (y - self._origin[1]) * self._scale),
+        )
+
+    def draw(self, toolpath: Optional[analysis.Toolpath]) -> None:
+        if toolpath is self._toolpath:
+            return
+        self._toolpath = toolpath
+        self._canvas.delete("path")
+        self._marker_pixel = (-1, -1)
+        if toolpath is None or not len(toolpath):
+            return
+        import numpy
+
+        points = numpy.vstack(([[0, 0]], toolpath.ends[:, :2].astype(numpy.float64)))
+        lower = points.min(axis=0)
+        extent = max(float((points.max(axis=0) - lower).max()), 1e-6)
+        self._origin = (float(lower[0]), float(lower[1]))
+        self._scale = (self._size - 2 * self._margin) / extent
+
+        pixels = numpy.rint((points - lower) * self._scale).astype(numpy.int32)
+        pixels[:, 0] += self._margin
+        pixels[:, 1] = self._size - self._margin - pixels[:, 1]
+        # Segment i runs from point i to point i + 1; break the path wherever
+        # the move type changes so rapids and cuts get their own style.
+        rapid = toolpath.rapid
+        breaks = numpy.flatnonzero(rapid[1:] != rapid[:-1]) + 1
+        keep = numpy.ones(len(pixels), dtype=bool)
+        keep[1:] = (pixels[1:] != pixels[:-1]).any(axis=1)
+        keep[breaks] = True
+        keep[-1] = True
+        stride = max(1, int(keep.sum()) // self._max_points)
+
+        for start, end in zip(numpy.concatenate(([0], breaks)), numpy.concatenate((breaks, [len(rapid)]))):
+            run = pixels[start:end + 1][keep[start:end + 1]]
+            if stride > 1:
+                run = numpy.vstack((run[:-1:stride], run[-1:]))
+            if len(run) < 2:
+                continue
+            if rapid[start]:
+                self._canvas.create_line(*run.ravel().tolist(), fill="gray", dash=(2, 4), tags="path")
+            else:
+                self._canvas.create_line(*run.ravel().tolist(), fill="blue", tags="path")
+        self._canvas.tag_raise(self._marker)
+
+    def move_marker(self, x: float, y: float) -> None:
+        if self._toolpath is None:
+            if self._marker_pixel != (-1, -1):
+                self._canvas.itemconfigure(self._marker, state="hidden")
+                self._marker_pixel = (-1, -1)
+            return
+        pixel = self._to_pixel(x, y)
+        if pixel == self._marker_pixel:
+            return
+        if self._marker_pixel == (-1, -1):
+            self._canvas.itemconfigure(self._marker, state="normal")
+        self._marker_pixel = pixel
+        self._canvas.coords(self._marker, pixel[0] - 4, pixel[1] - 4, pixel[0] + 4, pixel[1] + 4)
+
+
+def launch_window(
+    load_cnc: Callable[[], Readout],
+    frame_rate: float = 30,
+    startup_listener: Optional[Callable[[str], None]] = None,
+) -> None:
+    """Show the window at once and build the DRO when load_cnc returns.
+
+    load_cnc runs on a background thread, so slow imports and setup happen
+    behind a "CONNECTING" screen. startup_listener, if given, hears
+    "window" when that screen is up and "dro" after the first DRO frame.
+    """
     root = tkinter.Tk()
 
     root.attributes("-fullscreen", True)
 
+    label_connecting = tkinter.Label(root, text="CONNECTING...", font=("Courier", 24))
+    label_connecting.pack(expand=True)
+
+    loaded: List[Readout] = []
+    failed: List[BaseException] = []
+
+    def load() -> None:
+        try:
+            loaded.append(load_cnc())
+        except BaseException as e:
+            failed.append(e)
+
+    def wait_for_cnc() -> None:
+        if failed:
+            root.destroy()
+            return
+        if not loaded:
+            root.after(20, wait_for_cnc)
+            return
+        label_connecting.destroy()
+        _build_window(root, loaded[0], frame_rate, startup_listener)
+
+    threading.Thread(target=load, name="load-cnc", daemon=True).start()
+    root.update_idletasks()
+    if startup_listener is not None:
+        root.after(0, startup_listener, "window")
+    wait_for_cnc()
+    root.mainloop()
+    if failed:
+        raise failed[0]
+
+
+def _build_window(
+    root: tkinter.Tk,
+    cnc: Readout,
+    frame_rate: float,
+    startup_listener: Optional[Callable[[str], None]],
+) -> None:
+    mono_font = ("Courier", 24)
+
     status_bar_frame = tkinter.Frame(root)
 
     label_connection = tkinter.Label(status_bar_frame, font=mono_font)
     label_connection.grid(row=0, column=0)
 
+    label_poll_rate = tkinter.Label(status_bar_frame, font=mono_font)
+    label_poll_rate.grid(row=0, column=1)
+
+    label_latency = tkinter.Label(status_bar_frame, font=mono_font)
+    label_latency.grid(row=0, column=2)
+
+    label_frame_stats = tkinter.Label(status_bar_frame, font=("Courier", 12))
+    label_frame_stats.grid(row=1, column=0, columnspan=3)
+
     status_bar_frame.pack()
 
     second_row_frame = tkinter.Frame(root)
@@ -67,6 +255,18 @@ def launch_window(cnc: machine.DigitalReadout) -> None:
     label_step_size = tkinter.Label(spindle_frame, font=mono_font)
     label_step_size.grid(sticky="E", row=4, column=1)
 
+    tkinter.Label(spindle_frame, text="Jog:", font=mono_font).grid(sticky="E", row=5, column=0)
+    label_jog_mode = tkinter.Label(spindle_frame, font=mono_font)
+    label_jog_mode.grid(sticky="E", row=5, column=1)
+
+    tkinter.Label(spindle_frame, text="Job:", font=mono_font).grid(sticky="E", row=6, column=0)
+    label_job = tkinter.Label(spindle_frame, font=mono_font)
+    label_job.grid(sticky="E", row=6, column=1)
+
+    tkinter.Label(spindle_frame, text="Estimate:", font=mono_font).grid(sticky="E", row=7, column=0)
+    label_job_estimate = tkinter.Label(spindle_frame, font=mono_font)
+    label_job_estimate.grid(sticky="E", row=7, column=1)
+
     spindle_frame.grid(row=1, column=0)
 
     settings_frame.grid(row=0, column=0)
@@ -79,36 +279,160 @@ def launch_window(cnc: machine.DigitalReadout) -> None:
     button_goto_zero = tkinter.Button(buttons_frame, text="GO TO\nZERO", font=mono_font, width=7, height=4, command=cnc.go_to_zero)
     button_goto_zero.pack()
 
+    button_job = tkinter.Button(buttons_frame, text="START/\nPAUSE", font=mono_font, width=7, height=2, command=cnc.toggle_job)
+    button_job.pack()
+
+    button_abort_job = tkinter.Button(buttons_frame, text="ABORT", font=mono_font, width=7, height=2, command=cnc.abort_job)
+    button_abort_job.pack()
+
     buttons_frame.grid(row=0, column=1)
 
+    preview_size = 320
+    preview_canvas = tkinter.Canvas(second_row_frame, width=preview_size, height=preview_size, background="white")
+    preview_canvas.grid(row=0, column=2)
+    preview = _ToolpathPreview(preview_canvas, preview_size)
+
     second_row_frame.pack()
 
     button_turn_off_screen = tkinter.Button(root, text="SCREEN OFF", font=mono_font, command=turn_off_screen).pack()
 
-    def sync_model():
-        machine = cnc.machine.value()
+    texts = _LabelTexts()
 
-        label_connection.config(text="CONNECTED" if machine.is_connected else "DISCONNECTED")
-
-        machine_status = machine.machine_status
-        label_machine_x.config(text=f"{machine_status.machine_coord.x: > 9.3f}")
-        label_machine_y.config(text=f"{machine_status.machine_coord.y: > 9.3f}")
-        label_machine_z.config(text=f"{machine_status.machine_coord.z: > 9.3f}")
+    def sync_model(snapshot: machine.Snapshot):
+        machine = snapshot.value
 
-        label_work_x.config(text=f"{machine_status.work_coord.x: > 9.3f}")
-        label_work_y.config(text=f"{machine_status.work_coord.y: > 9.3f}")
-        label_work_z.config(text=f"{machine_status.work_coord.z: > 9.3f}")
+        texts.set(label_connection, "CONNECTED" if machine.is_connected else "DISCONNECTED")
 
+        machine_status = machine.machine_status
         spindle_settings = machine.spindle_settings
-        label_spindle_status.config(text="ON" if spindle_settings.is_on else "OFF")
-        label_spindle_speed.config(text=f"{spindle_settings.speed: >7,.0f}  RPM")
+        texts.set(label_spindle_status, "ON" if spindle_settings.is_on else "OFF")
+        texts.set(label_spindle_speed, f"{spindle_settings.speed: >7,.0f}  RPM")
 
         machine_settings = machine.machine_settings
-        label_feed_rate.config(text=f"{machine_settings.jog_feed_rate: >7.2f} mm/s")
-        label_step_size.config(text=f"{machine_settings.jog_step_size_xy: >7.2f}   mm")
+        texts.set(label_feed_rate, f"{machine_settings.jog_feed_rate: >7.2f} mm/s")
+        texts.set(label_step_size, f"{machine_settings.jog_step_size_xy: >7.2f}   mm")
+
+        job_progress = machine.job_progress
+        if job_progress is None:
+            texts.set(label_job, "NONE")
+        else:
+            at_line = f" L{job_progress.error_line}" if job_progress.error_line is not None else ""
+            texts.set(label_job, f"{job_progress.state}{at_line} {job_progress.fraction: >4.0%}")
+
+        job_estimate = machine.job_estimate
+        if job_estimate is None:
+            texts.set(label_job_estimate, "-")
+        else:
+            minutes, seconds = divmod(round(job_estimate.cycle_time_seconds), 60)
+            if cnc.envelope is None:
+                fit = ""
+            elif job_estimate.fits(cnc.envelope, machine_status):
+                fit = " FITS"
+            else:
+                fit = " OUTSIDE"
+            texts.set(label_job_estimate, f"{minutes: >4}:{seconds:02} min{fit}")
+
+    frame_interval_ms = max(1, round(1000 / frame_rate))
+    frame_stats = _FrameStats()
+    rendered_version = -1
+
+    def render_frame():
+        nonlocal rendered_version
+        frame_start = time.perf_counter()
+        snapshot = cnc.machine.snapshot()
+        if snapshot.version != rendered_version:
+            rendered_version = snapshot.version
+            sync_model(snapshot)
+        # Coordinates are dead-reckoned between polls, so they are drawn
+        # every frame rather than only when a new snapshot arrives.
+        machine_status = snapshot.value.machine_status
+        machine_coord = machine_status.machine_coord
+        work_coord = machine_status.work_coord
+        dx, dy, dz = cnc.estimator.offset()
+        texts.set(label_machine_x, f"{machine_coord.x + dx: > 9.3f}")
+        texts.set(label_machine_y, f"{machine_coord.y + dy: > 9.3f}")
+        texts.set(label_machine_z, f"{machine_coord.z + dz: > 9.3f}")
+        texts.set(label_work_x, f"{work_coord.x + dx: > 9.3f}")
+        texts.set(label_work_y, f"{work_coord.y + dy: > 9.3f}")
+        texts.set(label_work_z, f"{work_coord.z + dz: > 9.3f}")
+        preview.draw(cnc.toolpath)
+        preview.move_marker(work_coord.x + dx, work_coord.y + dy)
+        texts.set(label_poll_rate, f"{cnc.machine.poll_rate(): >5.1f} Hz")
+        texts.set(label_jog_mode, "CONTINUOUS" if cnc.controls.continuous_jog else "STEP")
+        # Rounded so the label does not have to be reconfigured every frame.
+        poll_age_ms = round(min(cnc.machine.poll_age() * 1000, 99_999), -2)
+        texts.set(label_latency, f"link {cnc.link_latency_seconds() * 1000: >4.0f} ms / age {poll_age_ms: >5.0f} ms")
+        frame_stats.record(time.perf_counter() - frame_start)
+        texts.set(label_frame_stats, frame_stats.text)
+        root.after(frame_interval_ms, render_frame)
+
+    render_frame()
+    if startup_listener is not None:
+        root.after(0, startup_listener, "dro")
+
+
+
+def _staleness_color(age_seconds: float) -> str:
+    if age_seconds < 1:
+        return "green"
+    if age_seconds < 5:
+        return "orange"
+    return "red"
+
+
+def launch_overview(monitored_fleet: fleet.Fleet, frame_rate: float = 10) -> None:
+    mono_font = ("Courier", 16)
+
+    root = tkinter.Tk()
 
-    while True:
-        sync_model()
-        root.update_idletasks()
-        root.update()
+    root.attributes("-fullscreen", True)
+
+    overview_frame = tkinter.Frame(root)
+
+    for column, heading in enumerate(("", "Machine", "State", "X", "Y", "Z", "Age")):
+        tkinter.Label(overview_frame, text=heading, font=mono_font).grid(sticky="E", row=0, column=column)
+
+    rows = []
+    for row, monitored in enumerate(monitored_fleet.machines, start=1):
+        indicator = tkinter.Canvas(overview_frame, width=16, height=16, highlightthickness=0)
+        dot = indicator.create_oval(2, 2, 14, 14, fill="red", outline="")
+        indicator.grid(row=row, column=0)
+        tkinter.Label(overview_frame, text=monitored.config.name, font=mono_font).grid(sticky="W", row=row, column=1)
+        labels = []
+        for column in range(2, 7):
+            label = tkinter.Label(overview_frame, font=mono_font)
+            label.grid(sticky="E", row=row, column=column)
+            labels.append(label)
+        rows.append((monitored, indicator, dot, labels))
+
+    overview_frame.pack()
+
+    button_turn_off_screen = tkinter.Button(root, text="SCREEN OFF", font=mono_font, command=turn_off_screen).pack()
 
+    texts = _LabelTexts()
+    colors: Dict[tkinter.Canvas, str] = {}
+    rendered_versions = [-1] * len(rows)
+    frame_interval_ms = max(1, round(1000 / frame_rate))
+
+    def render_frame():
+        for index, (monitored, indicator, dot, labels) in enumerate(rows):
+            label_state, label_x, label_y, label_z, label_age = labels
+            snapshot = monitored.machine.snapshot()
+            if snapshot.version != rendered_versions[index]:
+                rendered_versions[index] = snapshot.version
+                value = snapshot.value
+                work_coord = value.machine_status.work_coord
+                texts.set(label_state, value.machine_status.state if value.is_connected else "OFFLINE")
+                texts.set(label_x, f"{work_coord.x: > 9.3f}")
+                texts.set(label_y, f"{work_coord.y: > 9.3f}")
+                texts.set(label_z, f"{work_coord.z: > 9.3f}")
+            age = monitored.data_age()
+            texts.set(label_age, f"{min(age, 999): >4.0f} s")
+            color = _staleness_color(age)
+            if colors.get(indicator) != color:
+                colors[indicator] = color
+                indicator.itemconfigure(dot, fill=color)
+        root.after(frame_interval_ms, render_frame)
+
+    render_frame()
+    root.mainloop()
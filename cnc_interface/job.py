@@ -0,0 +1,227 @@
+from __future__ import annotations
+from contextlib import contextmanager
+
+import collections
+import dataclasses
+import enum
+import logging
+import os
+import re
+import threading
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+
+from cnc_interface import machine
+
+
+_logger = logging.getLogger(__name__)
+
+_PAREN_COMMENT = re.compile(r"\([^)]*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class JobState(enum.Enum):
+    READY = "READY"
+    RUNNING = "RUNNING"
+    PAUSED = "PAUSED"
+    DONE = "DONE"
+    ABORTED = "ABORTED"
+    FAILED = "FAILED"
+
+
+# Lines remembered after sending, to find the one a controller rejected;
+# more than fit in any controller's receive buffer.
+_RECENT_LINES = 256
+
+
+def read_lines(path: str) -> Iterator[Tuple[bytes, int]]:
+    with open(path, "rb") as f:
+        for raw_line in f:
+            yield raw_line, len(raw_line)
+
+
+def clean_lines(lines: Iterable[Tuple[bytes, int]]) -> Iterator[Tuple[str, int, int]]:
+    """Sendable lines with their size in the file and 1-based line number."""
+    # Byte counts of dropped lines are carried over to the next line that is
+    # sent, so progress still adds up to the file size.
+    skipped_bytes = 0
+    for number, (raw_line, size) in enumerate(lines, 1):
+        line = raw_line.decode("ascii", errors="ignore").split(";", 1)[0]
+        if "(" in line:
+            line = _PAREN_COMMENT.sub("", line)
+        line = _WHITESPACE.sub("", line).upper()
+        if not line or line == "%":
+            skipped_bytes += size
+            continue
+        yield line, size + skipped_bytes, number
+        skipped_bytes = 0
+
+
+def batches(
+    lines: Iterable[Tuple[str, int, int]], max_bytes: int
+) -> Iterator[Tuple[List[str], int, List[int]]]:
+    """Groups lines into sends of up to max_bytes, with their source bytes and line numbers."""
+    batch: List[str] = []
+    numbers: List[int] = []
+    batch_bytes = 0
+    source_bytes = 0
+    for line, size, number in lines:
+        if batch and batch_bytes + len(line) + 1 > max_bytes:
+            yield batch, source_bytes, numbers
+            batch, numbers, batch_bytes, source_bytes = [], [], 0, 0
+        batch.append(line)
+        numbers.append(number)
+        batch_bytes += len(line) + 1
+        source_bytes += size
+    if batch:
+        yield batch, source_bytes, numbers
+
+
+def _do_nothing() -> None:
+    pass
+
+
+@dataclasses.dataclass
+class JobSender:
+    """Streams a G-code file to a controller on its own thread.
+
+    Pausing and aborting stop sending and, through feed_hold, cycle_start
+    and stop, the motion the controller already has queued. A failed send
+    stops the controller too, as the rest of the job cannot follow.
+
+    Links without flow control, like UGS, take G-code as fast as it is
+    sent. For those, wait_until_idle holds the sender back once
+    max_bytes_ahead are sent until the controller has caught up. UGS only
+    tells idle from busy, so up to about twice that may be queued.
+    """
+    path: str
+    send_gcode: Callable[[List[str]], None]
+    batch_bytes: int = 128
+    feed_hold: Callable[[], object] = _do_nothing
+    cycle_start: Callable[[], object] = _do_nothing
+    stop: Callable[[], object] = _do_nothing
+    wait_until_idle: Optional[Callable[[float], bool]] = None
+    max_bytes_ahead: int = 16 * 1024
+    idle_wait_seconds: float = 0.5
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._resume_flag = threading.Event()
+        self._resume_flag.set()
+        self._abort_flag = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Line numbers of the latest lines passed to send_gcode.
+        self._recent: Deque[int] = collections.deque(maxlen=_RECENT_LINES)
+        self._progress = machine.JobProgress(
+            file_name=os.path.basename(self.path),
+            bytes_total=os.path.getsize(self.path),
+            state=JobState.READY.value,
+        )
+
+    def progress(self) -> machine.JobProgress:
+        with self._lock:
+            return self._progress
+
+    def _update(self, **changes: object) -> None:
+        with self._lock:
+            self._progress = self._progress.copy(update=changes)
+
+    def state(self) -> JobState:
+        return JobState(self.progress().state)
+
+    def _wait_until_idle(self) -> bool:
+        """False when aborted while waiting."""
+        assert self.wait_until_idle is not None
+        while not self.wait_until_idle(self.idle_wait_seconds):
+            if self._abort_flag.is_set():
+                return False
+        return True
+
+    def _rejected_line(self, error: machine.CommandError) -> Optional[int]:
+        if error.lines_after is None or error.lines_after >= len(self._recent):
+            return None
+        return self._recent[-1 - error.lines_after]
+
+    def _fail(self, error: str, line: Optional[int] = None) -> None:
+        # Whatever the controller still has queued would run on without
+        # the rest of the job.
+        self.stop()
+        self._update(state=JobState.FAILED.value, error=error, error_line=line)
+
+    def _run(self) -> None:
+        bytes_sent = 0
+        lines_sent = 0
+        bytes_ahead = 0
+        try:
+            for batch, source_bytes, numbers in batches(clean_lines(read_lines(self.path)), self.batch_bytes):
+                if self.wait_until_idle is not None and bytes_ahead >= self.max_bytes_ahead:
+                    if not self._wait_until_idle():
+                        break
+                    bytes_ahead = 0
+                self._resume_flag.wait()
+                if self._abort_flag.is_set():
+                    break
+                self._recent.extend(numbers)
+                self.send_gcode(batch)
+                bytes_sent += source_bytes
+                bytes_ahead += sum(len(line) + 1 for line in batch)
+                lines_sent += len(batch)
+                self._update(bytes_sent=bytes_sent, lines_sent=lines_sent)
+                if self._abort_flag.is_set():
+                    # Sent after abort() stopped the controller.
+                    self.stop()
+                    break
+            else:
+                if self.wait_until_idle is None or self._wait_until_idle():
+                    self._update(state=JobState.DONE.value, bytes_sent=self._progress.bytes_total)
+                    return
+        except machine.CommandError as e:
+            self._fail(str(e), self._rejected_line(e))
+            return
+        except machine.ConnectionError:
+            if not self._abort_flag.is_set():
+                self._fail("lost the connection to the controller")
+                return
+        except Exception as e:
+            _logger.exception("streaming %s failed", self.path)
+            self._fail(str(e) or type(e).__name__)
+            return
+        self._update(state=JobState.ABORTED.value)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="job-sender", daemon=True)
+            self._progress = self._progress.copy(update={"state": JobState.RUNNING.value})
+        self._thread.start()
+
+    def pause(self) -> None:
+        self._resume_flag.clear()
+        self.feed_hold()
+        self._update(state=JobState.PAUSED.value)
+
+    def resume(self) -> None:
+        self._update(state=JobState.RUNNING.value)
+        self.cycle_start()
+        self._resume_flag.set()
+
+    def abort(self) -> None:
+        with self._lock:
+            is_active = self._thread is not None and self._thread.is_alive()
+        self._abort_flag.set()
+        self._resume_flag.set()
+        if is_active:
+            self.stop()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @contextmanager
+    def running(self) -> Iterator[None]:
+        self.start()
+        try:
+            yield
+        finally:
+            self.abort()
+            self.join()
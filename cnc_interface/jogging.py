@@ -0,0 +1,231 @@
+from __future__ import annotations
+from concurrent import futures
+from contextlib import contextmanager
+
+import collections
+import dataclasses
+import math
+import threading
+import time
+from typing import Callable, Deque, Iterator, List, Optional, Tuple
+
+from cnc_interface import metrics
+
+
+@dataclasses.dataclass
+class JogStats:
+    ticks: int = 0
+    jogs_sent: int = 0
+    largest_jog: int = 0
+
+    @property
+    def ticks_merged(self) -> int:
+        return self.ticks - self.jogs_sent
+
+    def __str__(self) -> str:
+        return (
+            f"ticks={self.ticks} jogs={self.jogs_sent} "
+            f"merged={self.ticks_merged} largest={self.largest_jog}"
+        )
+
+
+@dataclasses.dataclass
+class JogCoalescer:
+    send_jog: Callable[[int, int, int], futures.Future]
+    window_seconds: float = 0.05
+    max_in_flight: int = 1
+
+    def __post_init__(self) -> None:
+        self.stats = JogStats()
+        self._lock = threading.Lock()
+        self._pending: List[int] = [0, 0, 0]
+        self._first_tick_at: Optional[float] = None
+        self._tick_latency = metrics.histogram("jog_tick_latency_seconds")
+        self._tick_interval = metrics.histogram("encoder_tick_interval_seconds")
+        self._last_tick_at: Optional[float] = None
+        self._has_pending = threading.Event()
+        self._stop_flag = threading.Event()
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, x: int, y: int, z: int) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            if self._last_tick_at is not None:
+                self._tick_interval.observe(now - self._last_tick_at)
+            self._last_tick_at = now
+            if self._first_tick_at is None:
+                self._first_tick_at = now
+            self._pending[0] += x
+            self._pending[1] += y
+            self._pending[2] += z
+            self.stats.ticks += abs(x) + abs(y) + abs(z)
+        self._has_pending.set()
+
+    def _take_pending(self) -> Tuple[int, int, int, float]:
+        with self._lock:
+            x, y, z = self._pending
+            first_tick_at = self._first_tick_at or time.perf_counter()
+            self._pending = [0, 0, 0]
+            self._first_tick_at = None
+            self._has_pending.clear()
+            if (x, y, z) != (0, 0, 0):
+                self.stats.jogs_sent += 1
+                self.stats.largest_jog = max(self.stats.largest_jog, abs(x) + abs(y) + abs(z))
+        return x, y, z, first_tick_at
+
+    def _acquire_slot(self) -> bool:
+        while not self._in_flight.acquire(timeout=0.1):
+            if self._stop_flag.is_set():
+                return False
+        return True
+
+    def _run(self) -> None:
+        while not self._stop_flag.is_set():
+            self._has_pending.wait()
+            # Give the dial a moment to produce more ticks, anything that
+            # arrives while all jog slots are busy gets merged as well.
+            self._stop_flag.wait(self.window_seconds)
+            if not self._acquire_slot():
+                return
+            x, y, z, first_tick_at = self._take_pending()
+            if (x, y, z) == (0, 0, 0):
+                self._in_flight.release()
+                continue
+            future = self.send_jog(x, y, z)
+            future.add_done_callback(lambda _, t=first_tick_at: self._on_jog_done(t))
+
+    def _on_jog_done(self, first_tick_at: float) -> None:
+        self._tick_latency.observe(time.perf_counter() - first_tick_at)
+        self._in_flight.release()
+
+    @contextmanager
+    def running(self) -> Iterator[None]:
+        self._stop_flag.clear()
+        self._thread = threading.Thread(target=self._run, name="jog-coalescer", daemon=True)
+        self._thread.start()
+        try:
+            yield
+        finally:
+            self._stop_flag.set()
+            self._has_pending.set()
+            self._thread.join()
+
+
+def _sign(value: int) -> int:
+    return (value > 0) - (value < 0)
+
+
+@dataclasses.dataclass
+class ContinuousJogger:
+    send_move: Callable[[float, float, float, float], futures.Future]
+    cancel: Callable[[], None]
+    step_size: Callable[[], float]
+    max_feed_rate: Callable[[], float]
+    stop_timeout_seconds: float = 0.15
+    lookahead_seconds: float = 0.2
+    velocity_window_seconds: float = 0.25
+    max_moves_in_flight: int = 2
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._wake_flag = threading.Event()
+        self._stop_flag = threading.Event()
+        self._ticks: Deque[float] = collections.deque()
+        self._direction: Tuple[int, int, int] = (0, 0, 0)
+        self._direction_changed = False
+        self._last_tick_at = -math.inf
+        self._moves: List[futures.Future] = []
+        self._planned_until = 0.0
+        self._is_moving = False
+        self._thread: Optional[threading.Thread] = None
+        self.moves_sent = 0
+        self.cancels_sent = 0
+
+    def tick(self, x: int, y: int, z: int, span_seconds: float = 0) -> None:
+        """Counts dial ticks, several at once when they came in one batch.
+
+        span_seconds is the time from the first to the last tick of the
+        batch, taken from their edge timestamps; the ticks are spread over
+        it, ending now, so the dial speed does not depend on how the reader
+        happened to batch them.
+        """
+        now = time.monotonic()
+        direction = (_sign(x), _sign(y), _sign(z))
+        count = abs(x) + abs(y) + abs(z)
+        with self._lock:
+            if direction != self._direction:
+                self._direction = direction
+                self._direction_changed = True
+                self._ticks.clear()
+            for i in range(count):
+                self._ticks.append(now - span_seconds * (count - 1 - i) / max(count - 1, 1))
+            self._last_tick_at = now
+        self._wake_flag.set()
+
+    def _tick_rate(self, now: float) -> float:
+        while self._ticks and now - self._ticks[0] > self.velocity_window_seconds:
+            self._ticks.popleft()
+        span = self._ticks[-1] - self._ticks[0] if self._ticks else 0
+        if span <= 0:
+            return len(self._ticks) / self.velocity_window_seconds
+        return (len(self._ticks) - 1) / span
+
+    def _stop_motion(self) -> None:
+        # Moves still waiting in the dispatcher would restart the machine
+        # right after the cancel, so they have to go first.
+        for move in self._moves:
+            move.cancel()
+        self._moves = []
+        self.cancel()
+        self.cancels_sent += 1
+        self._is_moving = False
+        self._planned_until = 0
+
+    def _step(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            direction = self._direction
+            direction_changed, self._direction_changed = self._direction_changed, False
+            is_idle = now - self._last_tick_at > self.stop_timeout_seconds
+            tick_rate = self._tick_rate(now)
+        if self._is_moving and (is_idle or direction_changed):
+            self._stop_motion()
+        if is_idle:
+            return
+        self._moves = [move for move in self._moves if not move.done()]
+        if len(self._moves) >= self.max_moves_in_flight:
+            return
+        if self._is_moving and self._planned_until - now > self.lookahead_seconds / 2:
+            return
+        # One dial tick per step size, so the feed follows the dial speed
+        # (mm/min) up to the configured jog feed rate.
+        feed_rate = min(self.max_feed_rate(), tick_rate * self.step_size() * 60)
+        if feed_rate <= 0:
+            return
+        distance = feed_rate / 60 * self.lookahead_seconds
+        x, y, z = (axis * distance for axis in direction)
+        self._moves.append(self.send_move(x, y, z, feed_rate))
+        self.moves_sent += 1
+        self._planned_until = max(now, self._planned_until) + self.lookahead_seconds
+        self._is_moving = True
+
+    def _run(self) -> None:
+        while not self._stop_flag.is_set():
+            self._wake_flag.wait(self.stop_timeout_seconds / 3)
+            self._wake_flag.clear()
+            self._step()
+        if self._is_moving:
+            self._stop_motion()
+
+    @contextmanager
+    def running(self) -> Iterator[None]:
+        self._stop_flag.clear()
+        self._thread = threading.Thread(target=self._run, name="continuous-jogger", daemon=True)
+        self._thread.start()
+        try:
+            yield
+        finally:
+            self._stop_flag.set()
+            self._wake_flag.set()
+            self._thread.join()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+from concurrent import futures
+
+import dataclasses
+import math
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from cnc_interface import machine
+
+Vector = Tuple[float, float, float]
+
+ZERO: Vector = (0.0, 0.0, 0.0)
+
+# Allowed distances within this of a whole number of steps count as whole.
+_STEP_TOLERANCE = 1e-6
+
+
+@dataclasses.dataclass
+class LimitStats:
+    passed: int = 0
+    clamped: int = 0
+    rejected: int = 0
+
+    def __str__(self) -> str:
+        return f"passed={self.passed} clamped={self.clamped} rejected={self.rejected}"
+
+
+@dataclasses.dataclass
+class SoftLimits:
+    """Keeps jogs inside the machine envelope without a round trip.
+
+    Tracks the range the machine may end up in: the last position at rest,
+    widened by every jog sent since, as any of them may still be running
+    or cut short by a cancel. Each jog is checked from the end of that
+    range it heads toward, and shortened to stay inside the envelope or
+    dropped when nothing of it is left. A jog whose command fails or is
+    dropped never reached the controller and leaves the range again.
+    Moves back toward the envelope are always let through, so a machine
+    outside it (not homed, say) can still be jogged in. Without an envelope
+    every jog passes unchanged; with one, jogs are dropped until a position
+    is known.
+
+    settle_seconds keeps a stopped sample from resetting the range right
+    after a jog was taken, when the poll may have been taken before the
+    controller started moving.
+    """
+    envelope: Optional[machine.Envelope] = None
+    settle_seconds: float = 0.5
+
+    def __post_init__(self) -> None:
+        self.stats = LimitStats()
+        self._lock = threading.Lock()
+        self._position: Optional[Vector] = None
+        # Where the machine last came to rest, and how far below and above
+        # that the jogs taken since may have moved it.
+        self._rest: Optional[Vector] = None
+        self._taken_low: Vector = ZERO
+        self._taken_high: Vector = ZERO
+        # Jogs sent whose commands have not finished yet.
+        self._pending: List[Vector] = []
+        self._moved_at = -math.inf
+
+    def on_sample(self, position: Vector, is_moving: bool, at: Optional[float] = None) -> None:
+        at = time.monotonic() if at is None else at
+        with self._lock:
+            self._position = position
+            if self._rest is None or (not is_moving and at - self._moved_at >= self.settle_seconds):
+                self._rest = position
+                self._taken_low = self._taken_high = ZERO
+
+    def _range(self) -> Tuple[Vector, Vector]:
+        assert self._rest is not None and self._position is not None
+        low, high = [], []
+        for axis in range(3):
+            pending = [move[axis] for move in self._pending]
+            rest = self._rest[axis]
+            # The current position too, for motion that was not a jog, such
+            # as a job or a move to zero.
+            low.append(min(rest + self._taken_low[axis] + sum(d for d in pending if d < 0), self._position[axis]))
+            high.append(max(rest + self._taken_high[axis] + sum(d for d in pending if d > 0), self._position[axis]))
+        return (low[0], low[1], low[2]), (high[0], high[1], high[2])
+
+    def _reserve(self, x: float, y: float, z: float, step: Optional[float]) -> Vector:
+        with self._lock:
+            if self.envelope is None:
+                self.stats.passed += 1
+                allowed: Vector = (x, y, z)
+            elif self._position is None:
+                self.stats.rejected += 1
+                return ZERO
+            else:
+                low, high = self._range()
+                start = tuple(h if d > 0 else l for l, h, d in zip(low, high, (x, y, z)))
+                allowed = self.envelope.clamp_move(start, x, y, z)  # type: ignore
+                if step:
+                    allowed = tuple(  # type: ignore
+                        math.trunc(distance / step + math.copysign(_STEP_TOLERANCE, distance)) * step
+                        for distance in allowed
+                    )
+                if allowed == (0, 0, 0):
+                    self.stats.rejected += 1
+                    return ZERO
+                if all(math.isclose(p, q, abs_tol=_STEP_TOLERANCE) for p, q in zip(allowed, (x, y, z))):
+                    self.stats.passed += 1
+                else:
+                    self.stats.clamped += 1
+            self._pending.append(allowed)
+            return allowed
+
+    def _finish(self, move: Vector, is_taken: bool) -> None:
+        with self._lock:
+            self._pending.remove(move)
+            if not is_taken:
+                return
+            self._taken_low = tuple(t + min(d, 0) for t, d in zip(self._taken_low, move))  # type: ignore
+            self._taken_high = tuple(t + max(d, 0) for t, d in zip(self._taken_high, move))  # type: ignore
+            self._moved_at = time.monotonic()
+
+    def limit(
+        self,
+        x: float,
+        y: float,
+        z: float,
+        send: Callable[[float, float, float], futures.Future],
+        step: Optional[float] = None,
+    ) -> futures.Future:
+        """Sends the part of a relative move that stays inside the envelope.
+
+        send gets the allowed move and returns the future of its command,
+        which decides whether the move counts as taken. With a step, each
+        axis is rounded down to whole steps, for jogs the controller only
+        takes as step counts. A rejected jog is not sent at all.
+        """
+        allowed = self._reserve(x, y, z, step)
+        if allowed == ZERO:
+            return _done()
+        try:
+            future = send(*allowed)
+        except BaseException:
+            self._finish(allowed, is_taken=False)
+            raise
+        future.add_done_callback(
+            lambda f: self._finish(allowed, is_taken=not f.cancelled() and f.exception() is None)
+        )
+        return future
+
+
+def _done() -> futures.Future:
+    # Stands in for a jog that soft limits stopped before it was sent.
+    future: futures.Future = futures.Future()
+    future.set_result(None)
+    return future
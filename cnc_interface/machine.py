@@ -1,150 +1,684 @@
 from __future__ import annotations
+from concurrent import futures
 from contextlib import contextmanager
 
 import dataclasses
-from typing import Callable, Generic, Iterator, TypeVar
+import functools
+import logging
+import math
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generic, Iterator, List, Optional, Protocol, Tuple, TypeVar, Union
 import pydantic
+import random
 import requests
+from requests import adapters
 import threading
 import time
 
-import rotary_encoder
+from cnc_interface import breaker, decoding, dispatch, estimation, jogging, limits, metrics
+
+if TYPE_CHECKING:
+    from cnc_interface import analysis, encoder, job, scheduler
+
+
+_logger = logging.getLogger(__name__)
 
 
 class ConnectionError(Exception):
     pass
 
 
-class MachineSettings(pydantic.BaseModel):
+class CommandError(Exception):
+    """The controller rejected a line of G-code.
+
+    lines_after, where the client can tell, counts the commands passed to
+    send_gcode after the rejected one, up to the end of the latest call;
+    the same text may well have been sent, and accepted, before.
+    """
+
+    def __init__(self, command: str, reason: str, lines_after: Optional[int] = None) -> None:
+        super().__init__(f"{reason} for {command!r}")
+        self.command = command
+        self.reason = reason
+        self.lines_after = lines_after
+
+
+def format_axes(x: float, y: float, z: float) -> str:
+    return " ".join(
+        f"{axis}{value:.3f}" for axis, value in (("X", x), ("Y", y), ("Z", z)) if value
+    )
+
+
+class _ImmutableModel(pydantic.BaseModel):
+    class Config:
+        frozen = True
+
+
+class MachineSettings(_ImmutableModel):
     jog_feed_rate: float = pydantic.Field(alias="jogFeedRate", default=0)
     jog_step_size_xy: float = pydantic.Field(alias="jogStepSizeXY", default=0)
     jog_step_size_z: float = pydantic.Field(alias="jogStepSizeZ", default=0)
     preferred_units: str = pydantic.Field(alias="preferredUnits", default="MM")
 
 
-class MachineCoords(pydantic.BaseModel):
+class MachineCoords(_ImmutableModel):
     units: str = "MM"
     x: float = 0
     y: float = 0
     z: float = 0
 
 
-class SpindleSettings(pydantic.BaseModel):
+class SpindleSettings(_ImmutableModel):
     speed: float = 0
     is_on: bool = False
 
 
-class MachineStatus(pydantic.BaseModel):
+class MachineStatus(_ImmutableModel):
     state: str = "UNKNOWN"
     machine_coord: MachineCoords = pydantic.Field(alias="machineCoord", default_factory=MachineCoords)
     work_coord: MachineCoords = pydantic.Field(alias="workCoord", default_factory=MachineCoords)
     spindle_speed: float = pydantic.Field(alias="spindleSpeed", default=0)
+    feed_speed: float = pydantic.Field(alias="feedSpeed", default=0)
+
+
+class JobProgress(_ImmutableModel):
+    file_name: str = ""
+    state: str = "READY"
+    bytes_total: int = 0
+    bytes_sent: int = 0
+    lines_sent: int = 0
+    # Why a FAILED job stopped, and the line in the file it stopped at
+    # when that is known.
+    error: str = ""
+    error_line: Optional[int] = None
+
+    @property
+    def fraction(self) -> float:
+        if not self.bytes_total:
+            return 0
+        return self.bytes_sent / self.bytes_total
+
+
+class Envelope(_ImmutableModel):
+    """Reachable machine coordinates along each axis."""
+    lower: MachineCoords
+    upper: MachineCoords
+
+    @classmethod
+    def from_travel(cls, x: float, y: float, z: float) -> Envelope:
+        """Homed machine coordinates, which run from -travel to 0 on each axis."""
+        return cls(lower=MachineCoords(x=-x, y=-y, z=-z), upper=MachineCoords())
+
+    def contains(self, x: float, y: float, z: float) -> bool:
+        return (
+            self.lower.x <= x <= self.upper.x
+            and self.lower.y <= y <= self.upper.y
+            and self.lower.z <= z <= self.upper.z
+        )
+
+    def clamp_move(self, start: Tuple[float, float, float], x: float, y: float, z: float) -> Tuple[float, float, float]:
+        """The relative move from start, shortened per axis to end inside the envelope.
+
+        An axis that starts outside may still move back toward the inside.
+        """
+        allowed = []
+        for position, distance, lower, upper in zip(
+            start, (x, y, z), (self.lower.x, self.lower.y, self.lower.z), (self.upper.x, self.upper.y, self.upper.z)
+        ):
+            end = min(max(position + distance, min(lower, position)), max(upper, position))
+            allowed.append(end - position)
+        return allowed[0], allowed[1], allowed[2]
+
+
+class JobEstimate(_ImmutableModel):
+    lower: MachineCoords = pydantic.Field(default_factory=MachineCoords)
+    upper: MachineCoords = pydantic.Field(default_factory=MachineCoords)
+    segments: int = 0
+    path_length: float = 0
+    cut_length: float = 0
+    cycle_time_seconds: float = 0
+
+    def fits(self, envelope: Envelope, machine_status: MachineStatus) -> bool:
+        """Whether the program stays inside envelope from the current work zero."""
+        offset = machine_status.machine_coord
+        work = machine_status.work_coord
+        return envelope.contains(
+            self.lower.x + offset.x - work.x,
+            self.lower.y + offset.y - work.y,
+            self.lower.z + offset.z - work.z,
+        ) and envelope.contains(
+            self.upper.x + offset.x - work.x,
+            self.upper.y + offset.y - work.y,
+            self.upper.z + offset.z - work.z,
+        )
 
 
-class Machine(pydantic.BaseModel):
+class Machine(_ImmutableModel):
     is_connected: bool = False
     machine_status: MachineStatus = pydantic.Field(default_factory=MachineStatus)
     machine_settings: MachineSettings = pydantic.Field(default_factory=MachineSettings)
     spindle_settings: SpindleSettings = pydantic.Field(default_factory=SpindleSettings)
+    job_progress: Optional[JobProgress] = None
+    job_estimate: Optional[JobEstimate] = None
+
+
+class PollPolicy(Protocol):
+    """Decides how long a SelfUpdatingValue waits before its next poll."""
+
+    def next_delay_seconds(self, value: Any) -> float:
+        ...
+
+    def notify_command(self) -> None:
+        """A command was sent; policies that poll faster after one override this."""
+
+
+@dataclasses.dataclass
+class FixedPollPolicy(PollPolicy):
+    delay_seconds: float = 0.1
+
+    def next_delay_seconds(self, value: Any) -> float:
+        return self.delay_seconds
+
+
+ACTIVE_STATES = frozenset({"RUN", "JOG", "HOME"})
+
+
+@dataclasses.dataclass
+class AdaptivePollPolicy(PollPolicy):
+    active_delay_seconds: float = 0.1
+    idle_delay_seconds: float = 0.5
+    command_boost_seconds: float = 2
+    min_backoff_seconds: float = 0.5
+    max_backoff_seconds: float = 30
+    jitter: float = 0.2
+
+    _last_command: float = -math.inf
+    _failures: int = 0
+
+    def _backoff_seconds(self) -> float:
+        exponent = min(self._failures - 1, 16)
+        backoff = min(self.min_backoff_seconds * 2 ** exponent, self.max_backoff_seconds)
+        return backoff * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def next_delay_seconds(self, value: Machine) -> float:
+        if not value.is_connected:
+            self._failures += 1
+            return self._backoff_seconds()
+        self._failures = 0
+        if value.machine_status.state.upper() in ACTIVE_STATES:
+            return self.active_delay_seconds
+        if time.monotonic() - self._last_command < self.command_boost_seconds:
+            return self.active_delay_seconds
+        return self.idle_delay_seconds
+
+    def notify_command(self) -> None:
+        self._last_command = time.monotonic()
 
 
 class _UpdateThread(threading.Thread):
-    def __init__(self, value: SelfUpdatingValue, update_delay_seconds: float):
+    def __init__(self, value: SelfUpdatingValue):
         self._stop_flag = threading.Event()
+        self._wake_flag = threading.Event()
         self._value = value
-        self._update_delay_seconds = update_delay_seconds
         name = "updater-for-" + repr(value)
         super().__init__(name=name, daemon=True)
 
     def run(self) -> None:
         while not self._stop_flag.is_set():
             self._value.update()
-            time.sleep(self._update_delay_seconds)
+            self._wake_flag.wait(self._value.next_delay_seconds())
+            self._wake_flag.clear()
     
+    def wake(self) -> None:
+        self._wake_flag.set()
+
     def stop(self) -> None:
         self._stop_flag.set()
+        self._wake_flag.set()
         self.join()
 
 
 _T = TypeVar("_T", bound=pydantic.BaseModel)
 
 
+@dataclasses.dataclass(frozen=True)
+class Snapshot(Generic[_T]):
+    version: int
+    value: _T
+
+
 @dataclasses.dataclass
 class SelfUpdatingValue(Generic[_T]):
     _value: _T
     _fetch_new_value: Callable[[], _T]
     _update_delay_seconds: float = 0.1
     _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+    _poll_policy: Optional[PollPolicy] = None
+    _scheduler: Optional[scheduler.PollScheduler] = None
 
     def __post_init__(self) -> None:
-        self._update_thread = _UpdateThread(self, self._update_delay_seconds)
+        if self._poll_policy is None:
+            self._poll_policy = FixedPollPolicy(self._update_delay_seconds)
+        self._fetch_seconds = 0.0
+        self._delay_seconds = 0.0
+        self._updated_at: Optional[float] = None
+        self._snapshot = Snapshot(0, self._value)
+        self._published = threading.Condition(self._lock)
+        self._subscribers: List[Callable[[Snapshot[_T]], None]] = []
+        self._updater: Union[_UpdateThread, scheduler.ScheduledUpdater]
+        if self._scheduler is None:
+            self._updater = _UpdateThread(self)
+        else:
+            self._updater = self._scheduler.updater(self)
 
     def update(self) -> None:
+        start = time.monotonic()
         new_value = self._fetch_new_value()
+        now = time.monotonic()
+        metrics.histogram("poll_fetch_seconds").observe(now - start)
         with self._lock:
+            if self._updated_at is not None:
+                metrics.histogram("poll_age_seconds").observe(now - self._updated_at)
+            self._updated_at = now
+            self._fetch_seconds = now - start
+            if new_value == self._value:
+                return
             self._value = new_value
+            self._snapshot = Snapshot(self._snapshot.version + 1, new_value)
+            snapshot = self._snapshot
+            subscribers = list(self._subscribers)
+            self._published.notify_all()
+        for subscriber in subscribers:
+            subscriber(snapshot)
+
+    def snapshot(self) -> Snapshot[_T]:
+        with self._lock:
+            return self._snapshot
 
-    def value(self) -> _T:
+    def version(self) -> int:
+        return self.snapshot().version
+
+    def wait_for_newer(self, version: int, timeout: Optional[float] = None) -> Optional[Snapshot[_T]]:
+        with self._lock:
+            if not self._published.wait_for(lambda: self._snapshot.version > version, timeout):
+                return None
+            return self._snapshot
+
+    def subscribe(self, subscriber: Callable[[Snapshot[_T]], None]) -> Callable[[], None]:
         with self._lock:
-            return self._value.copy(deep=True)
+            self._subscribers.append(subscriber)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._subscribers.remove(subscriber)
+
+        return unsubscribe
+
+    def next_delay_seconds(self) -> float:
+        assert self._poll_policy is not None
+        with self._lock:
+            value = self._value
+        delay_seconds = self._poll_policy.next_delay_seconds(value)
+        with self._lock:
+            self._delay_seconds = delay_seconds
+        return delay_seconds
+
+    def poll_age(self) -> float:
+        with self._lock:
+            if self._updated_at is None:
+                return math.inf
+            return time.monotonic() - self._updated_at
+
+    def fetch_seconds(self) -> float:
+        with self._lock:
+            return self._fetch_seconds
+
+    def poll_period(self) -> float:
+        """Seconds from one poll to the next: the last fetch and the delay after it."""
+        with self._lock:
+            return self._fetch_seconds + self._delay_seconds
+
+    def poll_rate(self) -> float:
+        period = self.poll_period()
+        if period <= 0:
+            return 0
+        return 1 / period
+
+    def notify_command(self) -> None:
+        assert self._poll_policy is not None
+        self._poll_policy.notify_command()
+        self._updater.wake()
+
+    def wake(self) -> None:
+        self._updater.wake()
+
+    def value(self) -> _T:
+        return self.snapshot().value
 
     @contextmanager
     def enabled(self) -> Iterator[None]:
-        self._update_thread.start()
+        self._updater.start()
         try:
             yield
         finally:
-            self._update_thread.stop()
+            self._updater.stop()
+
+
+@dataclasses.dataclass
+class HTTPTransport:
+    pool_size: int = 4
+    keep_alive: bool = True
+    timeout: Tuple[float, float] = (1, 1)
+    # Hosts to keep pools for; raise when one transport is shared by clients
+    # for several machines.
+    host_pools: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = adapters.HTTPAdapter(
+            pool_connections=self.host_pools or self.pool_size,
+            pool_maxsize=self.pool_size,
+            pool_block=True,
+        )
+        session.mount("http://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def _get_session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                self._session = self._new_session()
+            return self._session
+
+    def _drop_session(self, session: requests.Session) -> None:
+        with self._lock:
+            if self._session is not session:
+                return
+            self._session = None
+        session.close()
+
+    def send(
+        self,
+        request: requests.Request,
+        timeout: Optional[Tuple[float, float]] = None,
+        idempotent: bool = False,
+    ) -> requests.Response:
+        """Sends request on a pooled connection.
+
+        Only idempotent requests are retried after a connection error: the
+        server may have acted on the first attempt before the connection
+        dropped, and a repeated jog or G-code line would move the machine
+        twice.
+        """
+        timeout = timeout or self.timeout
+        prepared = request.prepare()
+        session = self._get_session()
+        try:
+            return session.send(prepared, timeout=timeout)
+        except requests.ConnectTimeout:
+            raise
+        except requests.ConnectionError:
+            # A pooled socket may have been closed by the server while idle,
+            # drop the whole pool so the next request gets a fresh connection.
+            self._drop_session(session)
+            if not idempotent:
+                raise
+        return self._get_session().send(prepared, timeout=timeout)
+
+    def close(self) -> None:
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+class _SettingsCache:
+    def __init__(self, max_age_seconds: float) -> None:
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._settings: Optional[MachineSettings] = None
+        self._stored_at = -math.inf
+        self._generation = 0
+        self._is_refreshing = False
+
+    def get(self) -> Optional[MachineSettings]:
+        with self._lock:
+            return self._settings
+
+    def is_stale(self) -> bool:
+        with self._lock:
+            return time.monotonic() - self._stored_at > self.max_age_seconds
+
+    def begin_refresh(self) -> Optional[int]:
+        with self._lock:
+            if self._is_refreshing:
+                return None
+            self._is_refreshing = True
+            return self._generation
+
+    def finish_refresh(self, generation: int, settings: Optional[MachineSettings]) -> None:
+        with self._lock:
+            self._is_refreshing = False
+            # A write that happened while the refresh was in flight is newer
+            # than whatever the refresh read from the server.
+            if generation != self._generation:
+                return
+            if settings is None:
+                self._settings = None
+                self._stored_at = -math.inf
+                return
+            self._settings = settings
+            self._stored_at = time.monotonic()
+
+    def write(self, settings: MachineSettings) -> None:
+        with self._lock:
+            self._generation += 1
+            self._settings = settings
+            self._stored_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._settings = None
+            self._stored_at = -math.inf
+
+
+class _ModelCache:
+    def __init__(self) -> None:
+        self._coords: List[Tuple[decoding.CoordsRecord, MachineCoords]] = []
+        self._status: Optional[Tuple[decoding.StatusRecord, MachineStatus]] = None
+        self._settings: Optional[Tuple[decoding.SettingsRecord, MachineSettings]] = None
+
+    def _coords_model(self, record: decoding.CoordsRecord) -> MachineCoords:
+        for cached_record, model in self._coords:
+            if cached_record == record:
+                return model
+        return MachineCoords.construct(**record._asdict())
+
+    def status_model(self, record: decoding.StatusRecord) -> MachineStatus:
+        if self._status is not None and self._status[0] == record:
+            return self._status[1]
+        machine_coord = self._coords_model(record.machine_coord)
+        work_coord = self._coords_model(record.work_coord)
+        model = MachineStatus.construct(
+            state=record.state,
+            machine_coord=machine_coord,
+            work_coord=work_coord,
+            spindle_speed=record.spindle_speed,
+            feed_speed=record.feed_speed,
+        )
+        self._coords = [(record.machine_coord, machine_coord), (record.work_coord, work_coord)]
+        self._status = (record, model)
+        return model
+
+    def settings_model(self, record: decoding.SettingsRecord) -> MachineSettings:
+        if self._settings is not None and self._settings[0] == record:
+            return self._settings[1]
+        model = MachineSettings.construct(**record._asdict())
+        self._settings = (record, model)
+        return model
 
 
 @dataclasses.dataclass
 class UGSClient:
     ip_address: str
+    port: int = 8080
     has_connection: bool = False
+    transport: HTTPTransport = dataclasses.field(default_factory=HTTPTransport)
+    settings_max_age_seconds: float = 5
+    breaker_failure_threshold: int = 2
+    probe_interval_seconds: float = 1
+    probe_timeout: Tuple[float, float] = (0.5, 0.5)
+    fetch_executor: Optional[futures.Executor] = None
+    call_later: Optional[Callable[[float, Callable[[], None]], None]] = None
+    idle_poll_seconds: float = 0.1
 
-    def _send_request(self, request: requests.Request) -> requests.Response:
-        with requests.Session() as session:
-            try:
-                response = session.send(request.prepare(), timeout=(1, 1))
-            except requests.ConnectionError as e:
-                self.has_connection = False
-                raise ConnectionError() from e
+    def __post_init__(self) -> None:
+        self._owns_fetch_executor = self.fetch_executor is None
+        self._fetch_executor = self.fetch_executor or futures.ThreadPoolExecutor(2, thread_name_prefix="ugs-fetch")
+        self._settings_cache = _SettingsCache(self.settings_max_age_seconds)
+        self._models = _ModelCache()
+        self._connection_listeners: List[Callable[[bool], None]] = []
+        self._link_lock = threading.Lock()
+        self._is_link_up = False
+        self.breaker = breaker.CircuitBreaker(
+            self._probe,
+            failure_threshold=self.breaker_failure_threshold,
+            probe_interval_seconds=self.probe_interval_seconds,
+            call_later=self.call_later,
+        )
+        self.breaker.add_listener(self._on_breaker_change)
+
+    def close(self) -> None:
+        self.breaker.close()
+        if self._owns_fetch_executor:
+            self._fetch_executor.shutdown(wait=True)
+        self.transport.close()
+
+    def add_connection_listener(self, listener: Callable[[bool], None]) -> None:
+        self._connection_listeners.append(listener)
+
+    def _on_breaker_change(self, state: breaker.BreakerState) -> None:
+        if state is breaker.BreakerState.OPEN:
+            self.has_connection = False
+            self._settings_cache.invalidate()
+        self._set_link_up(state is breaker.BreakerState.CLOSED)
+
+    def _set_link_up(self, is_up: bool) -> None:
+        # Listeners hear about the first contact with the server and about
+        # the breaker opening and closing, not every failed request.
+        with self._link_lock:
+            if self._is_link_up == is_up:
+                return
+            self._is_link_up = is_up
+        for listener in self._connection_listeners:
+            listener(is_up)
+
+    def _probe(self) -> bool:
+        try:
+            response = self.transport.send(
+                requests.Request("GET", self._url("status/getStatus")), timeout=self.probe_timeout, idempotent=True
+            )
+        except requests.RequestException:
+            return False
+        return response.status_code < 400
+
+    def _send_request(self, request: requests.Request, idempotent: bool = False) -> requests.Response:
+        if not self.breaker.allow_request():
+            raise ConnectionError()
+        endpoint = request.url.split("/api/v1/", 1)[-1]
+        try:
+            with metrics.histogram("ugs_request_seconds", endpoint=endpoint).time():
+                response = self.transport.send(request, idempotent=idempotent)
+        except requests.RequestException as e:
+            self.has_connection = False
+            self.breaker.record_failure()
+            raise ConnectionError() from e
         if response.status_code >= 400:
             self.has_connection = False
+            self.breaker.record_failure()
             raise ConnectionError()
         self.has_connection = True
+        self.breaker.record_success()
+        self._set_link_up(True)
         return response
 
+    def _url(self, endpoint: str) -> str:
+        return f"http://{self.ip_address}:{self.port}/api/v1/{endpoint}"
+
     def get_machine_status(self) -> MachineStatus:
         try:
             response = self._send_request(
-                requests.Request("GET", f"http://{self.ip_address}:8080/api/v1/status/getStatus")
+                requests.Request("GET", self._url("status/getStatus")), idempotent=True
             )
         except ConnectionError:
             return MachineStatus()
-        return MachineStatus(**response.json())
+        return self._models.status_model(decoding.decode_status(response.json()))
     
+    def _fetch_machine_settings(self) -> MachineSettings:
+        response = self._send_request(
+            requests.Request("GET", self._url("settings/getSettings")), idempotent=True
+        )
+        return self._models.settings_model(decoding.decode_settings(response.json()))
+
+    def _refresh_settings_cache(self) -> None:
+        generation = self._settings_cache.begin_refresh()
+        if generation is None:
+            return
+        try:
+            machine_settings: Optional[MachineSettings] = self._fetch_machine_settings()
+        except ConnectionError:
+            machine_settings = None
+        self._settings_cache.finish_refresh(generation, machine_settings)
+
     def get_machine_settings(self) -> MachineSettings:
         try:
-            response = self._send_request(
-                requests.Request("GET", f"http://{self.ip_address}:8080/api/v1/settings/getSettings")
-            )
+            machine_settings = self._fetch_machine_settings()
         except ConnectionError:
+            self._settings_cache.invalidate()
             return MachineSettings()
-        return MachineSettings(**response.json())
+        self._settings_cache.write(machine_settings)
+        return machine_settings
+
+    def get_machine_status_and_settings(self) -> Tuple[MachineStatus, MachineSettings]:
+        machine_settings = self._settings_cache.get()
+        if machine_settings is None:
+            settings_future = self._fetch_executor.submit(self.get_machine_settings)
+            machine_status = self.get_machine_status()
+            return machine_status, settings_future.result()
+        if self._settings_cache.is_stale():
+            # Other UGS clients may have changed the settings, check in the
+            # background and serve the cached value in the meantime.
+            self._fetch_executor.submit(self._refresh_settings_cache)
+        return self.get_machine_status(), machine_settings
     
     def post_machine_settings(self, machine_settings: MachineSettings) -> None:
         try:
             self._send_request(
                 requests.Request(
                     "POST", 
-                    f"http://{self.ip_address}:8080/api/v1/settings/setSettings",
+                    self._url("settings/setSettings"),
                     json=machine_settings.dict(by_alias=True)
                 )
             )
         except ConnectionError:
+            self._settings_cache.invalidate()
             return
+        self._settings_cache.write(machine_settings)
     
+    def send_gcode(self, commands: List[str]) -> None:
+        self._send_request(
+            requests.Request(
+                "POST",
+                self._url("machine/sendGcode"),
+                json={"commands": "\n".join(commands)}
+            )
+        )
+
     def post_spindle_settings(self, spindle_settings: SpindleSettings) -> None:
         json = {
             "commands": f"S{spindle_settings.speed} {'M03' if spindle_settings.is_on else 'M05'}"
@@ -153,7 +687,7 @@ class UGSClient:
             self._send_request(
                 requests.Request(
                     "POST", 
-                    f"http://{self.ip_address}:8080/api/v1/machine/sendGcode",
+                    self._url("machine/sendGcode"),
                     json=json
                 )
             )
@@ -161,26 +695,25 @@ class UGSClient:
             return
     
     def jog(self, x: int, y: int, z: int) -> None:
-        try:
-            self._send_request(
-                requests.Request(
-                    "GET", 
-                    f"http://{self.ip_address}:8080/api/v1/machine/jog", 
-                    params={
-                        "x": x,
-                        "y": y,
-                        "z": z,
-                    })
-            )
-        except ConnectionError:
-            return
+        # Raises ConnectionError, so that soft limits do not count a jog
+        # UGS never got.
+        self._send_request(
+            requests.Request(
+                "GET", 
+                self._url("machine/jog"), 
+                params={
+                    "x": x,
+                    "y": y,
+                    "z": z,
+                })
+        )
     
     def reset_zero(self) -> None:
         try:
             self._send_request(
                 requests.Request(
                     "GET", 
-                    f"http://{self.ip_address}:8080/api/v1/machine/resetToZero", 
+                    self._url("machine/resetToZero"), 
                 )
             )
         except ConnectionError:
@@ -194,45 +727,286 @@ class UGSClient:
             self._send_request(
                 requests.Request(
                     "POST", 
-                    f"http://{self.ip_address}:8080/api/v1/machine/sendGcode",
+                    self._url("machine/sendGcode"),
                     json=json
                 )
             )
         except ConnectionError:
             return
+
+    def jog_move(self, x: float, y: float, z: float, feed_rate: float) -> None:
+        json = {
+            "commands": f"$J=G91 G21 {format_axes(x, y, z)} F{feed_rate:.0f}"
+        }
+        self._send_request(
+            requests.Request(
+                "POST",
+                self._url("machine/sendGcode"),
+                json=json
+            )
+        )
+
+    def cancel_jog(self) -> None:
+        try:
+            self._send_request(
+                requests.Request(
+                    "GET",
+                    self._url("machine/cancelJog"),
+                )
+            )
+        except ConnectionError:
+            return
+
+    def _send_job_control(self, endpoint: str) -> None:
+        try:
+            self._send_request(requests.Request("GET", self._url(endpoint)))
+        except ConnectionError:
+            return
+
+    # UGS pauses or resumes, depending on the controller state, from the
+    # one endpoint.
+    def feed_hold(self) -> None:
+        self._send_job_control("files/pause")
+
+    def resume(self) -> None:
+        self._send_job_control("files/pause")
+
+    def stop(self) -> None:
+        # Drops the commands UGS still has queued and stops the controller.
+        self._send_job_control("files/cancel")
+
+    def wait_until_idle(self, timeout_seconds: float) -> bool:
+        """Waits for the controller to work through the G-code sent so far.
+
+        UGS acknowledges sendGcode as soon as the commands are queued, so
+        this watches the machine state instead. A batch the controller has
+        not started on yet reads as idle.
+        """
+        deadline = time.monotonic() + timeout_seconds
+        while self.get_machine_status().state != "IDLE":
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(remaining, self.idle_poll_seconds))
+        return True
         
 
 
+class MachineClient(Protocol):
+    has_connection: bool
+
+    def add_connection_listener(self, listener: Callable[[bool], None]) -> None:
+        ...
+
+    def get_machine_status_and_settings(self) -> Tuple[MachineStatus, MachineSettings]:
+        ...
+
+    def post_machine_settings(self, machine_settings: MachineSettings) -> None:
+        ...
+
+    def post_spindle_settings(self, spindle_settings: SpindleSettings) -> None:
+        ...
+
+    def jog(self, x: int, y: int, z: int) -> None:
+        ...
+
+    def reset_zero(self) -> None:
+        ...
+
+    def go_to_zero(self) -> None:
+        ...
+
+    def jog_move(self, x: float, y: float, z: float, feed_rate: float) -> None:
+        ...
+
+    def send_gcode(self, commands: List[str]) -> None:
+        ...
+
+    def cancel_jog(self) -> None:
+        ...
+
+    def feed_hold(self) -> None:
+        ...
+
+    def resume(self) -> None:
+        ...
+
+    def stop(self) -> None:
+        ...
+
+    def wait_until_idle(self, timeout_seconds: float) -> bool:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
 @dataclasses.dataclass
 class DigitalReadout:
-    ugs_client: UGSClient
+    ugs_client: MachineClient
     controls: Controls
     has_connection: bool = False
+    poll_policy: PollPolicy = dataclasses.field(default_factory=AdaptivePollPolicy)
+    job_sender: Optional[job.JobSender] = None
+    envelope: Optional[Envelope] = None
+    # Reads the controller's per-axis rate and acceleration limits for job
+    # estimates, when the backend can.
+    read_axis_limits: Optional[Callable[[], Optional[analysis.AxisLimits]]] = None
 
     def __post_init__(self) -> None:
-        self.machine = SelfUpdatingValue(Machine(), self._fetch_machine)
+        self.job_estimate: Optional[JobEstimate] = None
+        self.toolpath: Optional[analysis.Toolpath] = None
+        self.machine = SelfUpdatingValue(Machine(), self._fetch_machine, _poll_policy=self.poll_policy)
+        self.controls.dispatcher.add_executed_listener(lambda _: self.machine.notify_command())
+        self.ugs_client.add_connection_listener(lambda _: self.machine.wake())
+        self.estimator = estimation.PositionEstimator()
+        self.controls.add_move_listener(self.estimator.on_move)
+        self.controls.soft_limits.envelope = self.envelope
+
+    def _on_poll(self, value: Machine) -> None:
+        # Every poll, not only the ones that change the snapshot: a sample
+        # equal to the last one still confirms the machine stands still.
+        if not value.is_connected:
+            # The status of a machine that could not be reached is a
+            # placeholder at zero, not a position.
+            return
+        machine_status = value.machine_status
+        machine_coord = machine_status.machine_coord
+        position = (machine_coord.x, machine_coord.y, machine_coord.z)
+        is_moving = machine_status.state.upper() in ACTIVE_STATES
+        # The next sample is due a poll period from now, which the poll
+        # policy and the link decide.
+        self.estimator.set_poll_period(self.machine.poll_period(), self.machine.fetch_seconds())
+        self.estimator.on_sample(position, is_moving)
+        self.controls.soft_limits.on_sample(position, is_moving)
+
+    def set_envelope(self, envelope: Optional[Envelope]) -> None:
+        self.envelope = envelope
+        self.controls.soft_limits.envelope = envelope
+        self.machine.wake()
+
+    def load_envelope(self, read_envelope: Callable[[], Optional[Envelope]]) -> None:
+        """Reads the envelope from the controller once, after the link first comes up.
+
+        read_envelope runs on its own thread, as it usually waits on the
+        controller; until it returns an envelope, each reconnect tries again.
+        """
+        is_reading = threading.Lock()
+
+        def read() -> None:
+            try:
+                envelope = read_envelope()
+                if envelope is not None and self.envelope is None:
+                    self.set_envelope(envelope)
+            finally:
+                is_reading.release()
+
+        def on_connection_change(is_connected: bool) -> None:
+            if is_connected and self.envelope is None and is_reading.acquire(blocking=False):
+                threading.Thread(target=read, name="read-envelope", daemon=True).start()
+
+        self.ugs_client.add_connection_listener(on_connection_change)
+        if self.ugs_client.has_connection:
+            on_connection_change(True)
 
     def _fetch_machine(self) -> Machine:
-        machine_status = self.ugs_client.get_machine_status()
-        machine_settings = self.ugs_client.get_machine_settings()
+        machine_status, machine_settings = self.ugs_client.get_machine_status_and_settings()
 
-        return Machine(
+        value = Machine(
             is_connected=self.ugs_client.has_connection,
             machine_status=machine_status,
             machine_settings=machine_settings,
             spindle_settings=self.controls.get_spindle_settings(),
+            job_progress=self.job_sender.progress() if self.job_sender is not None else None,
+            job_estimate=self.job_estimate,
+        )
+        self._on_poll(value)
+        return value
+
+    def load_job(self, path: str) -> None:
+        from cnc_interface import job
+
+        if self.job_sender is not None:
+            self.job_sender.abort()
+        # Pause and abort go ahead of whatever else is queued for the controller.
+        safety = functools.partial(self.controls.dispatcher.submit, dispatch.Priority.SAFETY)
+        self.job_sender = job.JobSender(
+            path,
+            self.ugs_client.send_gcode,
+            feed_hold=functools.partial(safety, self.ugs_client.feed_hold),
+            cycle_start=functools.partial(safety, self.ugs_client.resume),
+            stop=functools.partial(safety, self.ugs_client.stop),
+            wait_until_idle=self.ugs_client.wait_until_idle,
         )
+        self.job_estimate = None
+        self.toolpath = None
+        threading.Thread(target=self._analyze_job, args=(self.job_sender,), name="job-analysis", daemon=True).start()
+        self.machine.wake()
+
+    def _analyze_job(self, sender: job.JobSender) -> None:
+        try:
+            from cnc_interface import analysis
+        except ImportError:
+            return
+        try:
+            toolpath = analysis.parse_program(sender.path)
+            axis_limits = self.read_axis_limits() if self.read_axis_limits is not None else None
+            estimate = analysis.estimate(
+                toolpath,
+                self.machine.value().machine_settings,
+                self.controls.max_feedrate,
+                axis_limits=axis_limits,
+            )
+        except Exception:
+            _logger.exception("could not analyze %s", sender.path)
+            return
+        if sender is not self.job_sender:
+            return
+        self.toolpath = toolpath
+        self.job_estimate = estimate
+        self.machine.wake()
+
+    def toggle_job(self) -> None:
+        from cnc_interface import job
+
+        if self.job_sender is None:
+            return
+        state = self.job_sender.state()
+        if state is job.JobState.READY:
+            self.job_sender.start()
+        elif state is job.JobState.RUNNING:
+            self.job_sender.pause()
+        elif state is job.JobState.PAUSED:
+            self.job_sender.resume()
+        self.machine.wake()
+
+    def abort_job(self) -> None:
+        if self.job_sender is None:
+            return
+        self.job_sender.abort()
+        self.machine.wake()
+
+    def link_latency_seconds(self) -> float:
+        return metrics.histogram("ugs_request_seconds", endpoint="status/getStatus").last
 
     def reset_zero(self) -> None:
-        self.ugs_client.reset_zero()
+        self.controls.dispatcher.submit(
+            dispatch.Priority.SAFETY, self.ugs_client.reset_zero, key="reset_zero"
+        )
     
     def go_to_zero(self) -> None:
-        self.ugs_client.go_to_zero()
+        self.controls.dispatcher.submit(
+            dispatch.Priority.SAFETY, self.ugs_client.go_to_zero, key="go_to_zero"
+        )
 
     @contextmanager
     def syncing(self) -> Iterator[None]:
-        with self.machine.enabled():
-            yield
+        try:
+            with self.machine.enabled():
+                yield
+        finally:
+            if self.job_sender is not None:
+                self.job_sender.abort()
 
 
 @dataclasses.dataclass(frozen=True)
@@ -266,9 +1040,10 @@ STEP_SIZES = [
 
 SHORT_PRESS_SECONDS = 0.5
 
+
 @dataclasses.dataclass
 class Controls:
-    ugs_client: UGSClient
+    ugs_client: MachineClient
 
     x_dial: Dial
     y_dial: Dial
@@ -280,6 +1055,15 @@ class Controls:
 
     max_spindle_speed: float = 10_000
     min_spindle_speed: float = 100
+
+    jog_window_seconds: float = 0.05
+    max_jogs_in_flight: int = 1
+    continuous_jog: bool = False
+    input_backend: str = "rotary_encoder"
+    gpio_chip: str = "gpiochip0"
+
+    dispatcher: dispatch.CommandDispatcher = dataclasses.field(default_factory=dispatch.CommandDispatcher)
+    soft_limits: limits.SoftLimits = dataclasses.field(default_factory=limits.SoftLimits)
     
     _spindle_settings: SpindleSettings = dataclasses.field(default_factory=SpindleSettings)
 
@@ -293,12 +1077,43 @@ class Controls:
 
     def __post_init__(self) -> None:
         self._feedrate = self.max_feedrate
-        self._spindle_settings.speed = self.max_spindle_speed
+        self._move_listeners: List[Callable[[float, float, float, float], None]] = []
+        self._posted_settings: Optional[MachineSettings] = None
+        self._jogger = jogging.JogCoalescer(
+            self._send_jog,
+            window_seconds=self.jog_window_seconds,
+            max_in_flight=self.max_jogs_in_flight,
+        )
+        self._continuous_jogger = jogging.ContinuousJogger(
+            self._send_jog_move,
+            self._cancel_jog,
+            step_size=self.step_size,
+            max_feed_rate=lambda: self._feedrate,
+        )
+        self._handlers_by_dial = self._dial_handlers()
+        self._spindle_settings = self._spindle_settings.copy(update={"speed": self.max_spindle_speed})
+        self.ugs_client.add_connection_listener(self._on_connection_change)
+        # Settings are pushed once the link is up rather than here, so that
+        # startup never waits on a controller that is still booting.
+        if self.ugs_client.has_connection:
+            self._resync()
+
+    def _on_connection_change(self, is_connected: bool) -> None:
+        if is_connected:
+            self._resync()
+        else:
+            self._posted_settings = None
+
+    def _resync(self) -> None:
         self._post_settings()
         self._post_spindle()
 
     def get_spindle_settings(self) -> SpindleSettings:
-        return self._spindle_settings.copy(deep=True)
+        return self._spindle_settings
+
+    @property
+    def jog_stats(self) -> jogging.JogStats:
+        return self._jogger.stats
 
     def do_nothing(self) -> None:
         pass
@@ -314,17 +1129,102 @@ class Controls:
             self._feedrate = self.fine_feedrate
         self._post_settings()
 
+    def _machine_settings(self) -> MachineSettings:
+        return MachineSettings(
+            jogFeedRate=self._feedrate,
+            jogStepSizeXY=self.step_size(),
+            jogStepSizeZ=self.step_size(),
+        )
+
     def _post_settings(self) -> None:
-        self.ugs_client.post_machine_settings(
-            MachineSettings(
-                jogFeedRate=self._feedrate,
-                jogStepSizeXY=self.step_size(),
-                jogStepSizeZ=self.step_size(),
-            )
+        self._submit(
+            dispatch.Priority.SETTINGS,
+            functools.partial(self._post_machine_settings, self._machine_settings()),
+            key="settings",
         )
+
+    def _post_machine_settings(self, machine_settings: MachineSettings) -> None:
+        # Runs on the dispatcher thread. The client swallows a failed post,
+        # so only a link that is still up counts as the controller having it.
+        self.ugs_client.post_machine_settings(machine_settings)
+        self._posted_settings = machine_settings if self.ugs_client.has_connection else None
+
+    def _jog_steps(self, x: int, y: int, z: int, machine_settings: MachineSettings) -> None:
+        # The controller turns steps into millimetres with the last step size
+        # it received, and a settings post queued at SETTINGS priority runs
+        # after this jog; post it first so the move matches the soft limits.
+        if machine_settings != self._posted_settings:
+            self._post_machine_settings(machine_settings)
+        self.ugs_client.jog(x, y, z)
     
     def _post_spindle(self) -> None:
-        self.ugs_client.post_spindle_settings(self.get_spindle_settings())
+        self._submit(
+            dispatch.Priority.SETTINGS,
+            functools.partial(self.ugs_client.post_spindle_settings, self.get_spindle_settings()),
+            key="spindle",
+        )
+
+    def add_move_listener(self, listener: Callable[[float, float, float, float], None]) -> None:
+        self._move_listeners.append(listener)
+
+    def _notify_move(self, x: float, y: float, z: float, feed_rate: float) -> None:
+        for listener in self._move_listeners:
+            listener(x, y, z, feed_rate)
+
+    def _send_jog(self, x: int, y: int, z: int) -> futures.Future:
+        machine_settings = self._machine_settings()
+        step_size = machine_settings.jog_step_size_xy
+        feed_rate = machine_settings.jog_feed_rate
+
+        def send(dx: float, dy: float, dz: float) -> futures.Future:
+            self._notify_move(dx, dy, dz, feed_rate)
+            steps = (round(distance / step_size) for distance in (dx, dy, dz))
+            return self._submit(
+                dispatch.Priority.JOG,
+                functools.partial(self._jog_steps, *steps, machine_settings),
+                command="jog",
+            )
+
+        return self.soft_limits.limit(x * step_size, y * step_size, z * step_size, send, step=step_size)
+
+    def _send_jog_move(self, x: float, y: float, z: float, feed_rate: float) -> futures.Future:
+        def send(dx: float, dy: float, dz: float) -> futures.Future:
+            self._notify_move(dx, dy, dz, feed_rate)
+            return self._submit(
+                dispatch.Priority.JOG,
+                functools.partial(self.ugs_client.jog_move, dx, dy, dz, feed_rate),
+                command="jog_move",
+            )
+
+        return self.soft_limits.limit(x, y, z, send)
+
+    def _cancel_jog(self) -> None:
+        # Jogs still queued would restart the machine right after the
+        # cancel; drop them and let the cancel jump whatever else is queued.
+        self.dispatcher.drop_pending(dispatch.Priority.JOG)
+        self._submit(dispatch.Priority.SAFETY, self.ugs_client.cancel_jog, command="cancel_jog")
+
+    def _jog(self, x: int, y: int, z: int, span_seconds: float = 0) -> None:
+        if self.continuous_jog:
+            self._continuous_jogger.tick(x, y, z, span_seconds)
+        else:
+            self._jogger.add(x, y, z)
+
+    def toggle_continuous_jog(self) -> None:
+        self.continuous_jog = not self.continuous_jog
+
+    def _submit(
+        self,
+        priority: dispatch.Priority,
+        action: Callable[[], None],
+        key: Optional[str] = None,
+        command: Optional[str] = None,
+    ) -> futures.Future:
+        submitted_at = time.perf_counter()
+        latency = metrics.histogram("command_latency_seconds", command=command or key or "other")
+        future = self.dispatcher.submit(priority, action, key=key)
+        future.add_done_callback(lambda _: latency.observe(time.perf_counter() - submitted_at))
+        return future
 
     def on_x_cw(self) -> None:
         if self._is_x_pressed:
@@ -332,26 +1232,27 @@ class Controls:
             self._post_settings()
         else:
             self._when_x_down = 0
-            self.ugs_client.jog(1, 0, 0)
+            self._jog(1, 0, 0)
  
     def on_y_cw(self) -> None:
         if self._is_y_pressed:
             pass
         else:
             self._when_y_down = 0
-            self.ugs_client.jog(0, 1, 0)
+            self._jog(0, 1, 0)
 
     def on_z_cw(self) -> None:
         if self._is_z_pressed:
-            self._spindle_settings.speed = increase(
+            speed = increase(
                 self._spindle_settings.speed,
                 self.min_spindle_speed,
                 self.max_spindle_speed,
             )
+            self._spindle_settings = self._spindle_settings.copy(update={"speed": speed})
             self._post_spindle()
         else:
             self._when_y_down = 0
-            self.ugs_client.jog(0, 0, 1)
+            self._jog(0, 0, 1)
 
     def on_x_ccw(self) -> None:
         if self._is_x_pressed:
@@ -359,26 +1260,27 @@ class Controls:
             self._post_settings()
         else:
             self._when_x_down = 0
-            self.ugs_client.jog(-1, 0, 0)
+            self._jog(-1, 0, 0)
  
     def on_y_ccw(self) -> None:
         if self._is_y_pressed:
             pass
         else:
             self._when_y_down = 0
-            self.ugs_client.jog(0, -1, 0)
+            self._jog(0, -1, 0)
 
     def on_z_ccw(self) -> None:
         if self._is_z_pressed:
-            self._spindle_settings.speed = decrease(
+            speed = decrease(
                 self._spindle_settings.speed,
                 self.min_spindle_speed,
                 self.max_spindle_speed,
             )
+            self._spindle_settings = self._spindle_settings.copy(update={"speed": speed})
             self._post_spindle()
         else:
             self._when_z_down = 0
-            self.ugs_client.jog(0, 0, -1)
+            self._jog(0, 0, -1)
 
     def on_x_down(self) -> None:
         self._is_x_pressed = True
@@ -402,17 +1304,76 @@ class Controls:
         self._is_y_pressed = False
         if time.time() - self._when_y_down > SHORT_PRESS_SECONDS:
             return
+        self.toggle_continuous_jog()
     
     def on_z_up(self) -> None:
         self._is_z_pressed = False
         if time.time() - self._when_z_down > SHORT_PRESS_SECONDS:
             return
-        self._spindle_settings.is_on = not self._spindle_settings.is_on
+        self._spindle_settings = self._spindle_settings.copy(
+            update={"is_on": not self._spindle_settings.is_on}
+        )
         self._post_spindle()
 
     @contextmanager
-    def connected(self) -> Iterator[None]:
-        with rotary_encoder.connect(
+    def running(self) -> Iterator[None]:
+        with self.dispatcher.running(), self._jogger.running(), self._continuous_jogger.running():
+            yield
+
+    def _dial_handlers(self) -> Dict[Dial, Tuple[Callable[[], None], ...]]:
+        return {
+            self.x_dial: (self.on_x_cw, self.on_x_ccw, self.on_x_down, self.on_x_up),
+            self.y_dial: (self.on_y_cw, self.on_y_ccw, self.on_y_down, self.on_y_up),
+            self.z_dial: (self.on_z_cw, self.on_z_ccw, self.on_z_down, self.on_z_up),
+        }
+
+    def on_ticks(self, batch: encoder.TickBatch) -> None:
+        axis = (self.x_dial, self.y_dial, self.z_dial).index(batch.dial)
+        is_pressed = (self._is_x_pressed, self._is_y_pressed, self._is_z_pressed)[axis]
+        if not is_pressed:
+            # One jog for the whole batch, timed by its edges rather than
+            # by when the batch arrived.
+            delta = [0, 0, 0]
+            delta[axis] = batch.delta
+            self._jog(*delta, span_seconds=(batch.last_ns - batch.first_ns) / 1e9)
+            return
+        on_cw, on_ccw, _, _ = self._handlers_by_dial[batch.dial]
+        on_turn = on_cw if batch.delta > 0 else on_ccw
+        for _ in range(abs(batch.delta)):
+            on_turn()
+
+    def on_button(self, dial: Dial, is_pressed: bool, timestamp_ns: int) -> None:
+        _, _, on_down, on_up = self._handlers_by_dial[dial]
+        if is_pressed:
+            on_down()
+        else:
+            on_up()
+
+    @contextmanager
+    def connected(self, event_source: Optional[encoder.EventSource] = None) -> Iterator[None]:
+        if event_source is None and self.input_backend == "none":
+            with self.running():
+                yield
+            return
+        if event_source is None and self.input_backend == "rotary_encoder":
+            with self._rotary_encoder_connected():
+                yield
+            return
+        from cnc_interface import encoder
+
+        dials = (self.x_dial, self.y_dial, self.z_dial)
+        if event_source is None:
+            pins = [pin for dial in dials for pin in (dial.clk_pin, dial.dt_pin, dial.sw_pin)]
+            event_source = encoder.GpiodEventSource(pins, chip=self.gpio_chip)
+        reader = encoder.EncoderReader(event_source, dials, self.on_ticks, self.on_button)
+        with self.running(), reader.running():
+            yield
+
+    @contextmanager
+    def _rotary_encoder_connected(self) -> Iterator[None]:
+        import rotary_encoder
+
+        with self.running(), rotary_encoder.connect(
             clk_pin=self.x_dial.clk_pin,
             dt_pin=self.x_dial.dt_pin,
             sw_pin=self.x_dial.sw_pin,
@@ -1,22 +1,146 @@
+import argparse
+from contextlib import ExitStack
 import socket
+from typing import TYPE_CHECKING, Callable, List, Optional
 
-from cnc_interface import gui, machine
+# Only what is needed to put a window on screen is imported up front,
+# pydantic, requests and the machine modules load in the background.
+from cnc_interface import gui
 
+if TYPE_CHECKING:
+    from cnc_interface import analysis, machine, split
 
-def main():
-    socket.setdefaulttimeout(1)
 
-    ugs_client = machine.UGSClient("192.168.2.223")
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="CNC pendant and digital readout for UGS.")
+    parser.add_argument("--backend", choices=("ugs", "grbl"), default="ugs")
+    parser.add_argument("--host", default="192.168.2.223", help="address of the UGS pendant server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--serial-port", default="/dev/ttyUSB0", help="GRBL serial device for the grbl backend")
+    parser.add_argument("--baud-rate", type=int, default=115200)
+    parser.add_argument(
+        "--input", choices=("rotary_encoder", "gpiod", "none"), default="rotary_encoder",
+        help="dial input backend, 'none' for a display-only readout",
+    )
+    parser.add_argument("--fleet", help="JSON file listing several UGS machines to monitor on one overview")
+    parser.add_argument("--job", help="G-code file to load, started from the pendant")
+    parser.add_argument(
+        "--travel", type=float, nargs=3, metavar=("X", "Y", "Z"),
+        help=(
+            "machine travel in mm, for checking that jobs fit and keeping jogs inside it "
+            "(homed machine coordinates run from -travel to 0); read from GRBL $130-$132 by default"
+        ),
+    )
+    parser.add_argument("--record", help="append every machine snapshot to this telemetry ring file")
+    parser.add_argument("--replay", help="play back a telemetry file instead of connecting to a controller")
+    parser.add_argument("--replay-speed", type=float, default=1, help="playback speed as a multiple of real time")
+    parser.add_argument("--proxy-port", type=int, help="serve the latest machine snapshot to other tools on this port")
+    parser.add_argument("--proxy-host", default="127.0.0.1", help="address the status proxy listens on")
+    parser.add_argument(
+        "--active-poll-seconds",
+        type=float,
+        default=0.1,
+        help="status poll interval while the machine moves; the display interpolates in between",
+    )
+    parser.add_argument(
+        "--split",
+        action="store_true",
+        help="run input handling, command dispatch and polling in a separate process from the GUI",
+    )
+    parser.add_argument("--metrics-port", type=int, help="serve metrics on http://127.0.0.1:<port>/metrics")
+    parser.add_argument("--metrics-dump-seconds", type=float, help="print a metrics summary to stderr periodically")
+    return parser.parse_args(argv)
+
+
+def _enter_metrics(args: argparse.Namespace, stack: ExitStack) -> None:
+    from cnc_interface import metrics
+
+    if args.metrics_port is not None:
+        stack.enter_context(metrics.serving(args.metrics_port))
+    if args.metrics_dump_seconds:
+        stack.enter_context(metrics.dumping(args.metrics_dump_seconds))
+
+
+def load_readout(args: argparse.Namespace, stack: ExitStack) -> "machine.DigitalReadout":
+    from cnc_interface import machine
+
+    _enter_metrics(args, stack)
+
+    ugs_client: machine.MachineClient
+    read_envelope: Optional[Callable[[], Optional[machine.Envelope]]] = None
+    read_axis_limits: Optional[Callable[[], Optional["analysis.AxisLimits"]]] = None
+    poll_policy: machine.PollPolicy = machine.AdaptivePollPolicy(active_delay_seconds=args.active_poll_seconds)
+    if args.replay:
+        from cnc_interface import telemetry
+
+        ugs_client = telemetry.ReplayClient(args.replay, speed=args.replay_speed)
+        # A recorded disconnect must not make the player back off.
+        poll_policy = machine.FixedPollPolicy(0.1)
+    elif args.backend == "grbl":
+        from cnc_interface import grbl
+
+        grbl_client = grbl.GrblClient(args.serial_port, args.baud_rate)
+        ugs_client = grbl_client
+        read_envelope = grbl_client.read_envelope
+        read_axis_limits = grbl_client.read_axis_limits
+    else:
+        ugs_client = machine.UGSClient(args.host, args.port)
     controls = machine.Controls(
         ugs_client,
         x_dial=machine.Dial(0, 5, 6),
         y_dial=machine.Dial(13, 19, 26),
         z_dial=machine.Dial(21, 20, 16),
+        input_backend=args.input,
     )
-    cnc = machine.DigitalReadout(ugs_client, controls)
+    envelope = machine.Envelope.from_travel(*args.travel) if args.travel else None
+    cnc = machine.DigitalReadout(
+        ugs_client, controls, poll_policy=poll_policy, envelope=envelope, read_axis_limits=read_axis_limits
+    )
+    if envelope is None and read_envelope is not None:
+        cnc.load_envelope(read_envelope)
+    if args.job:
+        cnc.load_job(args.job)
+
+    stack.enter_context(controls.connected())
+    stack.enter_context(cnc.syncing())
+    if args.record:
+        from cnc_interface import telemetry
+
+        stack.enter_context(telemetry.Recorder(args.record).recording(cnc.machine))
+    if args.proxy_port is not None:
+        from cnc_interface import proxy
+
+        stack.enter_context(proxy.StatusProxy(cnc.machine, args.proxy_host, args.proxy_port).serving())
+    return cnc
+
+
+def load_remote_readout(args: argparse.Namespace, stack: ExitStack) -> "split.RemoteReadout":
+    from cnc_interface import split
+
+    cnc = split.RemoteReadout(args)
+    stack.callback(cnc.close)
+    return cnc
+
 
-    with controls.connected(), cnc.syncing():
-        gui.launch_window(cnc)
+def run(args: argparse.Namespace, startup_listener: Optional[Callable[[str], None]] = None) -> None:
+    socket.setdefaulttimeout(1)
+
+    if args.fleet:
+        from cnc_interface import fleet
+
+        with ExitStack() as stack:
+            _enter_metrics(args, stack)
+            monitored_fleet = stack.enter_context(fleet.Fleet(fleet.load_config(args.fleet)).running())
+            gui.launch_overview(monitored_fleet)
+        return
+
+    with ExitStack() as stack:
+        load = load_remote_readout if args.split else load_readout
+        gui.launch_window(lambda: load(args, stack), startup_listener=startup_listener)
+
+
+def main():
+    run(parse_args())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+from __future__ import annotations
+from contextlib import contextmanager
+
+import bisect
+from http import server
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, TextIO, Tuple
+
+
+# Exponential buckets from 100 us to roughly 50 s, plenty for anything
+# between a GPIO callback and a controller timeout.
+BUCKET_BOUNDS: Tuple[float, ...] = tuple(0.0001 * 2 ** i for i in range(20))
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    __slots__ = ("name", "labels", "_lock", "_counts", "count", "total", "max", "last")
+
+    def __init__(self, name: str, labels: Tuple[Tuple[str, str], ...] = ()) -> None:
+        self.name = name
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds: float) -> None:
+        index = bisect.bisect_left(BUCKET_BOUNDS, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            counts = list(self._counts)
+            count = self.count
+            maximum = self.max
+        if not count:
+            return 0
+        rank = q * count
+        seen = 0
+        for bound, bucket_count in zip(BUCKET_BOUNDS, counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound, maximum)
+        return maximum
+
+    def mean(self) -> float:
+        with self._lock:
+            return self.total / self.count if self.count else 0
+
+    def _label_text(self, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        labels = self.labels + extra
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+    def render(self) -> List[str]:
+        with self._lock:
+            counts = list(self._counts)
+            count = self.count
+            total = self.total
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKET_BOUNDS, counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{self._label_text((('le', f'{bound:g}'),))} {cumulative}")
+        lines.append(f"{self.name}_bucket{self._label_text((('le', '+Inf'),))} {count}")
+        lines.append(f"{self.name}_sum{self._label_text()} {total:.6f}")
+        lines.append(f"{self.name}_count{self._label_text()} {count}")
+        return lines
+
+    def summary(self) -> str:
+        return (
+            f"{self.name}{self._label_text()}: n={self.count} "
+            f"mean={self.mean() * 1000:.1f}ms p50={self.quantile(0.5) * 1000:.1f}ms "
+            f"p99={self.quantile(0.99) * 1000:.1f}ms max={self.max * 1000:.1f}ms"
+        )
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: Dict[_Key, Histogram] = {}
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is not None:
+            return histogram
+        with self._lock:
+            return self._histograms.setdefault(key, Histogram(*key))
+
+    def histograms(self) -> List[Histogram]:
+        with self._lock:
+            return sorted(self._histograms.values(), key=lambda h: (h.name, h.labels))
+
+    def render_text(self) -> str:
+        lines: List[str] = []
+        for histogram in self.histograms():
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+    def summary_text(self) -> str:
+        return "\n".join(histogram.summary() for histogram in self.histograms()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def histogram(name: str, **labels: str) -> Histogram:
+    return REGISTRY.histogram(name, **labels)
+
+
+class _DumpThread(threading.Thread):
+    def __init__(self, registry: Registry, interval_seconds: float, stream: TextIO):
+        self._stop_flag = threading.Event()
+        self._registry = registry
+        self._interval_seconds = interval_seconds
+        self._stream = stream
+        super().__init__(name="metrics-dump", daemon=True)
+
+    def run(self) -> None:
+        while not self._stop_flag.wait(self._interval_seconds):
+            self._stream.write(self._registry.summary_text())
+            self._stream.flush()
+
+    def stop(self) -> None:
+        self._stop_flag.set()
+        self.join()
+
+
+@contextmanager
+def dumping(interval_seconds: float, stream: TextIO = sys.stderr, registry: Registry = REGISTRY) -> Iterator[None]:
+    thread = _DumpThread(registry, interval_seconds, stream)
+    thread.start()
+    try:
+        yield
+    finally:
+        thread.stop()
+
+
+class _ScrapeHandler(server.BaseHTTPRequestHandler):
+    server: _ScrapeServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        payload = self.server.registry.render_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class _ScrapeServer(server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, registry: Registry):
+        self.registry = registry
+        super().__init__(("127.0.0.1", port), _ScrapeHandler)
+
+
+@contextmanager
+def serving(port: int, registry: Registry = REGISTRY) -> Iterator[int]:
+    scrape_server = _ScrapeServer(port, registry)
+    thread = threading.Thread(target=scrape_server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    try:
+        yield scrape_server.server_address[1]
+    finally:
+        scrape_server.shutdown()
+        scrape_server.server_close()
+        thread.join()
@@ -0,0 +1,198 @@
+from __future__ import annotations
+from contextlib import contextmanager
+
+import asyncio
+import os
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+from urllib import parse
+
+from cnc_interface import machine, metrics
+
+
+MAX_HEADER_BYTES = 8192
+_BODY_CHUNK_BYTES = 65536
+
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+class StatusProxy:
+    """Serves the latest Machine snapshot to any number of local clients.
+
+    GET /machine returns the snapshot as JSON with an ETag. Clients send it
+    back in If-None-Match to get 304 while nothing changed, and add
+    ?wait=<seconds> to hold the request open until the next version is
+    published. Every client is served from the one upstream poller: each
+    version is serialized once, and waiting clients are parked coroutines
+    on one asyncio loop, so hundreds of idle long-polls cost no threads.
+    """
+
+    def __init__(
+        self,
+        value: machine.SelfUpdatingValue[machine.Machine],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        max_wait_seconds: float = 30,
+    ) -> None:
+        self.value = value
+        self.host = host
+        self.port = port
+        self.max_wait_seconds = max_wait_seconds
+        # Versions restart at zero with the process, the boot id keeps ETags
+        # from one run from matching another's.
+        self._boot_id = os.urandom(4).hex()
+        self._loop = asyncio.new_event_loop()
+        self._changed: Optional[asyncio.Event] = None
+        self._version = -1
+        self._etag = ""
+        self._body = b""
+        self._startup_error: Optional[BaseException] = None
+        self.clients = 0
+
+    def _publish(self, snapshot: machine.Snapshot[machine.Machine]) -> None:
+        body = snapshot.value.json(by_alias=True).encode()
+        self._loop.call_soon_threadsafe(self._set_current, snapshot.version, body)
+
+    def _set_current(self, version: int, body: bytes) -> None:
+        assert self._changed is not None
+        if version <= self._version:
+            return
+        self._version = version
+        self._etag = f'"{self._boot_id}-{version}"'
+        self._body = body
+        # Waiters hold the old event; replacing it wakes them all at once.
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str]]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        for line in lines[1:]:
+            name, _, header_value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = header_value.strip()
+        return method, target, headers
+
+    async def _discard_body(self, reader: asyncio.StreamReader, headers: Dict[str, str]) -> bool:
+        """Reads past a request body; False when where it ends is unknown."""
+        if "transfer-encoding" in headers:
+            return False
+        try:
+            remaining = int(headers.get("content-length", "0"))
+        except ValueError:
+            return False
+        if remaining < 0:
+            return False
+        while remaining:
+            try:
+                chunk = await reader.read(min(remaining, _BODY_CHUNK_BYTES))
+            except ConnectionError:
+                return False
+            if not chunk:
+                return False
+            remaining -= len(chunk)
+        return True
+
+    async def _respond(self, method: str, target: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        url = parse.urlsplit(target)
+        if url.path != "/machine":
+            return 404, {}, b""
+        if method != "GET":
+            return 405, {"Allow": "GET"}, b""
+        query = parse.parse_qs(url.query)
+        try:
+            wait_seconds = min(float(query.get("wait", ["0"])[0]), self.max_wait_seconds)
+        except ValueError:
+            return 400, {}, b""
+        if_none_match = headers.get("if-none-match")
+        if if_none_match == self._etag and wait_seconds > 0:
+            assert self._changed is not None
+            with metrics.histogram("proxy_wait_seconds").time():
+                try:
+                    await asyncio.wait_for(self._changed.wait(), wait_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        if if_none_match == self._etag:
+            return 304, {"ETag": self._etag}, b""
+        return 200, {"ETag": self._etag, "Content-Type": "application/json"}, self._body
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients += 1
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    return
+                method, target, headers = request
+                # Whatever body came with the request has to be read past
+                # before the next request on this connection can be.
+                is_reusable = await self._discard_body(reader, headers)
+                if is_reusable:
+                    status, response_headers, body = await self._respond(method, target, headers)
+                else:
+                    status, response_headers, body = 400, {"Connection": "close"}, b""
+                head = [f"HTTP/1.1 {status} {_REASONS[status]}", f"Content-Length: {len(body)}", "Cache-Control: no-cache"]
+                head.extend(f"{name}: {header_value}" for name, header_value in response_headers.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if not is_reusable or headers.get("connection", "").lower() == "close":
+                    return
+        except (ConnectionError, asyncio.CancelledError):
+            # Cancelled at shutdown; finishing normally keeps asyncio from
+            # logging every parked long-poll as an error.
+            return
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    def _run(self, started: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._changed = asyncio.Event()
+            server = self._loop.run_until_complete(
+                asyncio.start_server(self._serve_client, self.host, self.port, limit=MAX_HEADER_BYTES, backlog=512)
+            )
+            self.port = server.sockets[0].getsockname()[1]
+        except BaseException as e:
+            # Handed to serving(), which is waiting on `started`.
+            self._startup_error = e
+            self._loop.close()
+            return
+        finally:
+            started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            server.close()
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.run_until_complete(server.wait_closed())
+            self._loop.close()
+
+    @contextmanager
+    def serving(self) -> Iterator[int]:
+        started = threading.Event()
+        thread = threading.Thread(target=self._run, args=(started,), name="status-proxy", daemon=True)
+        thread.start()
+        started.wait()
+        if self._startup_error is not None:
+            thread.join()
+            raise self._startup_error
+        unsubscribe = self.value.subscribe(self._publish)
+        self._publish(self.value.snapshot())
+        try:
+            yield self.port
+        finally:
+            unsubscribe()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            thread.join()
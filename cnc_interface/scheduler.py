@@ -0,0 +1,145 @@
+from __future__ import annotations
+from concurrent import futures
+from contextlib import contextmanager
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Iterator, List, Optional, Protocol, Tuple
+
+
+class Pollable(Protocol):
+    def update(self) -> None:
+        ...
+
+    def next_delay_seconds(self) -> float:
+        ...
+
+
+class PollScheduler:
+    """Runs timed callbacks for many values on one timer thread and a small pool.
+
+    Used instead of one updater thread per SelfUpdatingValue when a process
+    polls many machines: the timer thread sleeps until the earliest due
+    callback and hands it to the pool, so thread count stays fixed no matter
+    how many values are registered.
+    """
+
+    def __init__(self, workers: int = 4) -> None:
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._heap: List[Tuple[float, int, Callable[[], None]]] = []
+        self._sequence = itertools.count()
+        self._stopping = False
+        self._executor: Optional[futures.ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def call_later(self, delay_seconds: float, callback: Callable[[], None]) -> None:
+        due = time.monotonic() + delay_seconds
+        with self._lock:
+            if self._stopping:
+                return
+            heapq.heappush(self._heap, (due, next(self._sequence), callback))
+            if self._heap[0][2] is callback:
+                self._changed.notify()
+
+    def updater(self, value: Pollable) -> ScheduledUpdater:
+        return ScheduledUpdater(self, value)
+
+    def _run(self) -> None:
+        assert self._executor is not None
+        while True:
+            with self._lock:
+                while not self._stopping:
+                    if self._heap:
+                        delay = self._heap[0][0] - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self._changed.wait(delay)
+                    else:
+                        self._changed.wait()
+                if self._stopping:
+                    return
+                _, _, callback = heapq.heappop(self._heap)
+            self._executor.submit(callback)
+
+    def start(self) -> None:
+        self._executor = futures.ThreadPoolExecutor(self.workers, thread_name_prefix="poll-worker")
+        self._thread = threading.Thread(target=self._run, name="poll-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopping = True
+            self._heap.clear()
+            self._changed.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    @contextmanager
+    def running(self) -> Iterator[PollScheduler]:
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
+
+
+class ScheduledUpdater:
+    """Drop-in for a value's updater thread, driven by a PollScheduler."""
+
+    def __init__(self, scheduler: PollScheduler, value: Pollable) -> None:
+        self._scheduler = scheduler
+        self._value = value
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._generation = 0
+        self._is_updating = False
+        self._is_woken = False
+        self._is_stopped = False
+
+    def _schedule(self, delay_seconds: float) -> None:
+        # Must hold self._lock. Older timer entries are left in the heap and
+        # ignored when they fire, instead of being searched for and removed.
+        self._generation += 1
+        generation = self._generation
+        self._scheduler.call_later(delay_seconds, lambda: self._update(generation))
+
+    def _update(self, generation: int) -> None:
+        with self._lock:
+            if self._is_stopped or generation != self._generation or self._is_updating:
+                return
+            self._is_updating = True
+            self._is_woken = False
+        try:
+            self._value.update()
+        finally:
+            delay_seconds = self._value.next_delay_seconds()
+            with self._lock:
+                self._is_updating = False
+                self._idle.notify_all()
+                if not self._is_stopped:
+                    self._schedule(0 if self._is_woken else delay_seconds)
+
+    def start(self) -> None:
+        with self._lock:
+            self._schedule(0)
+
+    def wake(self) -> None:
+        with self._lock:
+            if self._is_stopped:
+                return
+            if self._is_updating:
+                self._is_woken = True
+                return
+            self._schedule(0)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._is_stopped = True
+            self._generation += 1
+            self._idle.wait_for(lambda: not self._is_updating)
@@ -0,0 +1,324 @@
+from __future__ import annotations
+from contextlib import ExitStack, contextmanager
+
+import argparse
+import logging
+import multiprocessing
+import pickle
+import struct
+import threading
+import time
+import zlib
+from multiprocessing import connection, shared_memory
+from typing import TYPE_CHECKING, Iterator, NamedTuple, Optional, Tuple
+
+from cnc_interface import estimation, machine
+
+if TYPE_CHECKING:
+    from cnc_interface import analysis
+
+
+_logger = logging.getLogger(__name__)
+
+# sequence (odd while a write is in progress), payload length, payload crc32.
+BLOCK_HEADER = struct.Struct("<QII")
+_SEQUENCE = struct.Struct("<Q")
+
+# DigitalReadout methods the GUI may call through the command pipe.
+COMMANDS = ("reset_zero", "go_to_zero", "toggle_job", "abort_job")
+
+
+class SnapshotBlock:
+    """A shared memory slot with one writer and any number of readers.
+
+    Guarded by a seqlock: the writer makes the sequence odd, writes, and
+    makes it even again; a reader retries until it copied the payload
+    between two reads of the same even sequence. Neither side ever blocks
+    the other. The crc32 catches a torn copy that the sequence alone could
+    miss on CPUs with weak memory ordering, since Python has no fences.
+    """
+
+    def __init__(self, name: Optional[str] = None, size: int = 1 << 16) -> None:
+        self._is_owner = name is None
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            # Attached from a spawned child, which shares the owner's
+            # resource tracker; only the owner unlinks the block.
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.name = self._memory.name
+        self.capacity = self._memory.size - BLOCK_HEADER.size
+        self._sequence = 0
+
+    def sequence(self) -> int:
+        return _SEQUENCE.unpack_from(self._memory.buf, 0)[0]
+
+    def write(self, payload: bytes) -> None:
+        if len(payload) > self.capacity:
+            raise ValueError(f"{len(payload)} byte payload does not fit in {self.capacity} bytes")
+        buffer = self._memory.buf
+        BLOCK_HEADER.pack_into(buffer, 0, self._sequence + 1, len(payload), zlib.crc32(payload))
+        buffer[BLOCK_HEADER.size:BLOCK_HEADER.size + len(payload)] = payload
+        self._sequence += 2
+        _SEQUENCE.pack_into(buffer, 0, self._sequence)
+
+    def read(self, timeout_seconds: float = 0.1) -> Optional[Tuple[int, bytes]]:
+        """The latest sequence and payload; sequence 0 means nothing was written yet.
+
+        None when no whole payload could be copied within timeout_seconds,
+        as when the writer died halfway through a write.
+        """
+        buffer = self._memory.buf
+        deadline = time.monotonic() + timeout_seconds
+        while True:
+            sequence, length, crc = BLOCK_HEADER.unpack_from(buffer, 0)
+            if sequence % 2 == 0 and length <= self.capacity:
+                payload = bytes(buffer[BLOCK_HEADER.size:BLOCK_HEADER.size + length])
+                if _SEQUENCE.unpack_from(buffer, 0)[0] == sequence and zlib.crc32(payload) == crc:
+                    return sequence, payload
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0)
+
+    def close(self) -> None:
+        self._memory.close()
+        if self._is_owner:
+            self._memory.unlink()
+
+
+class SharedState(NamedTuple):
+    """What the GUI process needs from the control process, one pickle per write."""
+    version: int
+    machine: machine.Machine
+    # time.monotonic() of the last successful poll, which is system-wide.
+    polled_at: float
+    poll_rate: float
+    continuous_jog: bool
+    link_latency_seconds: float
+    envelope: Optional[machine.Envelope]
+    estimator: estimation.EstimatorState
+
+
+class SnapshotPublisher:
+    """Writes a DigitalReadout's state to a SnapshotBlock whenever it changes.
+
+    Runs in the control process. Writes happen on their own thread when a
+    poll lands or a jog is sent, plus a heartbeat so that poll age and the
+    jog mode stay fresh while nothing else changes.
+    """
+
+    def __init__(self, cnc: machine.DigitalReadout, block: SnapshotBlock, heartbeat_seconds: float = 0.2) -> None:
+        self.cnc = cnc
+        self.block = block
+        self.heartbeat_seconds = heartbeat_seconds
+        self._changed = threading.Condition()
+        self._is_dirty = True
+        self._stop_flag = False
+        self.writes = 0
+
+    def _on_change(self, *_: object) -> None:
+        with self._changed:
+            self._is_dirty = True
+            self._changed.notify()
+
+    def _state(self) -> SharedState:
+        snapshot = self.cnc.machine.snapshot()
+        return SharedState(
+            version=snapshot.version,
+            machine=snapshot.value,
+            polled_at=time.monotonic() - self.cnc.machine.poll_age(),
+            poll_rate=self.cnc.machine.poll_rate(),
+            continuous_jog=self.cnc.controls.continuous_jog,
+            link_latency_seconds=self.cnc.link_latency_seconds(),
+            envelope=self.cnc.envelope,
+            estimator=self.cnc.estimator.state(),
+        )
+
+    def _run(self) -> None:
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._is_dirty or self._stop_flag, self.heartbeat_seconds)
+                if self._stop_flag:
+                    return
+                self._is_dirty = False
+            self.block.write(pickle.dumps(self._state(), protocol=pickle.HIGHEST_PROTOCOL))
+            self.writes += 1
+
+    @contextmanager
+    def publishing(self) -> Iterator[SnapshotPublisher]:
+        unsubscribe = self.cnc.machine.subscribe(self._on_change)
+        self.cnc.controls.add_move_listener(self._on_change)
+        thread = threading.Thread(target=self._run, name="snapshot-publisher", daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            unsubscribe()
+            with self._changed:
+                self._stop_flag = True
+                self._changed.notify()
+            thread.join()
+
+
+class SharedMachine:
+    """Reads SharedState from a SnapshotBlock, for the GUI process.
+
+    Offers the parts of SelfUpdatingValue the GUI uses. The block is only
+    unpickled when its sequence has moved, so calling this every frame
+    costs one struct read while nothing changes.
+    """
+
+    def __init__(self, block: SnapshotBlock, estimator: estimation.PositionEstimator) -> None:
+        self.block = block
+        self.estimator = estimator
+        self._sequence = 0
+        self._state = SharedState(
+            -1, machine.Machine(), -float("inf"), 0, False, 0, None, estimator.state()
+        )
+
+    def state(self) -> SharedState:
+        sequence = self.block.sequence()
+        if sequence != self._sequence:
+            read = self.block.read()
+            if read is None:
+                # Keeps the last good state, and does not wait on the block
+                # again until a later write moves the sequence.
+                self._sequence = sequence
+                return self._state
+            self._sequence, payload = read
+            if payload:
+                self._state = pickle.loads(payload)
+                self.estimator.restore(self._state.estimator)
+        return self._state
+
+    def snapshot(self) -> machine.Snapshot[machine.Machine]:
+        state = self.state()
+        return machine.Snapshot(state.version, state.machine)
+
+    def poll_age(self) -> float:
+        return time.monotonic() - self.state().polled_at
+
+    def poll_rate(self) -> float:
+        return self.state().poll_rate
+
+
+class _SharedControls:
+    def __init__(self, shared_machine: SharedMachine) -> None:
+        self._shared_machine = shared_machine
+
+    @property
+    def continuous_jog(self) -> bool:
+        return self._shared_machine.state().continuous_jog
+
+
+def _receive_commands(cnc: machine.DigitalReadout, commands: connection.Connection) -> None:
+    while True:
+        try:
+            command = commands.recv_bytes().decode()
+        except EOFError:
+            return
+        if command not in COMMANDS:
+            continue
+        try:
+            getattr(cnc, command)()
+        except Exception:
+            # The control process outlives a failed button press.
+            _logger.exception("%s failed", command)
+
+
+def _serve(args: argparse.Namespace, block_name: str, commands: connection.Connection) -> None:
+    from cnc_interface import main
+
+    block = SnapshotBlock(block_name)
+    try:
+        with ExitStack() as stack:
+            cnc = main.load_readout(args, stack)
+            stack.enter_context(SnapshotPublisher(cnc, block).publishing())
+            # Returns when the GUI process closes its end of the pipe.
+            _receive_commands(cnc, commands)
+    finally:
+        block.close()
+
+
+class RemoteReadout:
+    """Stands in for DigitalReadout in the GUI process.
+
+    The real DigitalReadout, with the input handling, command dispatch and
+    poller, runs in a child process so that Tk redraws never hold the GIL
+    those threads need. Its state comes back through a SnapshotBlock and
+    the GUI's buttons go to it as command names over a pipe.
+    """
+
+    def __init__(self, args: argparse.Namespace, startup_timeout_seconds: float = 30) -> None:
+        context = multiprocessing.get_context("spawn")
+        self._block = SnapshotBlock()
+        receive_commands, self._commands = context.Pipe(duplex=False)
+        child_args = argparse.Namespace(**{**vars(args), "split": False})
+        self._process = context.Process(
+            target=_serve, args=(child_args, self._block.name, receive_commands), name="cnc-control", daemon=True
+        )
+        self._process.start()
+        receive_commands.close()
+        self.estimator = estimation.PositionEstimator()
+        self.machine = SharedMachine(self._block, self.estimator)
+        self.controls = _SharedControls(self.machine)
+        self.toolpath: Optional[analysis.Toolpath] = None
+        try:
+            self._wait_for_first_state(startup_timeout_seconds)
+        except BaseException:
+            self.close()
+            raise
+        if args.job:
+            threading.Thread(target=self._analyze_job, args=(args.job,), name="job-analysis", daemon=True).start()
+
+    def _wait_for_first_state(self, timeout_seconds: float) -> None:
+        deadline = time.monotonic() + timeout_seconds
+        while self._block.sequence() == 0:
+            if not self._process.is_alive():
+                raise RuntimeError(f"control process exited with code {self._process.exitcode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError("control process did not start")
+            time.sleep(0.02)
+
+    def _analyze_job(self, path: str) -> None:
+        # The child parses the job for its estimate; the preview needs the
+        # toolpath here, and parsing it again is cheaper than shipping it.
+        try:
+            from cnc_interface import analysis
+
+            self.toolpath = analysis.parse_program(path)
+        except ImportError:
+            return
+
+    @property
+    def envelope(self) -> Optional[machine.Envelope]:
+        return self.machine.state().envelope
+
+    def link_latency_seconds(self) -> float:
+        return self.machine.state().link_latency_seconds
+
+    def _send(self, command: str) -> None:
+        try:
+            self._commands.send_bytes(command.encode())
+        except (BrokenPipeError, OSError):
+            pass
+
+    def reset_zero(self) -> None:
+        self._send("reset_zero")
+
+    def go_to_zero(self) -> None:
+        self._send("go_to_zero")
+
+    def toggle_job(self) -> None:
+        self._send("toggle_job")
+
+    def abort_job(self) -> None:
+        self._send("abort_job")
+
+    def close(self, timeout_seconds: float = 5) -> None:
+        self._commands.close()
+        self._process.join(timeout_seconds)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._block.close()
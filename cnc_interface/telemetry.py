@@ -0,0 +1,258 @@
+from __future__ import annotations
+from contextlib import contextmanager
+
+import dataclasses
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from cnc_interface import machine
+
+
+MAGIC = b"CNCTLM1\0"
+
+# magic, record size, capacity, records written (never wraps).
+HEADER = struct.Struct("<8sIIQ8x")
+# time, machine x/y/z, work x/y/z, spindle speed, feed speed, state, is connected.
+RECORD = struct.Struct("<d6fffBB6x")
+
+# Index in this tuple is what goes on disk, so only ever append to it.
+STATES = (
+    "UNKNOWN", "IDLE", "RUN", "HOLD", "JOG", "ALARM", "DOOR", "CHECK", "HOME", "SLEEP", "TOOL",
+)
+_STATE_CODES = {state: code for code, state in enumerate(STATES)}
+
+
+class TelemetryRecord(NamedTuple):
+    time: float
+    machine_coord: Tuple[float, float, float]
+    work_coord: Tuple[float, float, float]
+    spindle_speed: float
+    feed_speed: float
+    state: str
+    is_connected: bool
+
+
+def _encode(at: float, value: machine.Machine) -> Tuple:
+    status = value.machine_status
+    machine_coord = status.machine_coord
+    work_coord = status.work_coord
+    return (
+        at,
+        machine_coord.x, machine_coord.y, machine_coord.z,
+        work_coord.x, work_coord.y, work_coord.z,
+        status.spindle_speed,
+        status.feed_speed,
+        _STATE_CODES.get(status.state.upper(), 0),
+        value.is_connected,
+    )
+
+
+def _decode(fields: Tuple) -> TelemetryRecord:
+    at, mx, my, mz, wx, wy, wz, spindle_speed, feed_speed, state, is_connected = fields
+    return TelemetryRecord(
+        at,
+        (mx, my, mz),
+        (wx, wy, wz),
+        spindle_speed,
+        feed_speed,
+        STATES[state] if state < len(STATES) else "UNKNOWN",
+        bool(is_connected),
+    )
+
+
+class Recorder:
+    """Appends Machine snapshots to a fixed-size, memory-mapped ring file.
+
+    The file holds a header and `capacity` fixed-width records, so disk use
+    never grows; once full, the oldest records are overwritten. Recording a
+    sample is one struct.pack_into into the mapping plus a header update,
+    with no system call; the kernel writes dirty pages back on its own.
+    """
+
+    def __init__(self, path: str, capacity: int = 1 << 20) -> None:
+        self.path = path
+        size = HEADER.size + capacity * RECORD.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            existing = os.fstat(fd).st_size
+            if existing:
+                header = os.pread(fd, HEADER.size, 0)
+                magic, record_size, existing_capacity, written = HEADER.unpack(header)
+                if magic != MAGIC or record_size != RECORD.size:
+                    raise ValueError(f"{path} is not a telemetry file")
+                capacity = existing_capacity
+                size = HEADER.size + capacity * RECORD.size
+            else:
+                os.ftruncate(fd, size)
+                written = 0
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.capacity = capacity
+        self._written = written
+        self._lock = threading.Lock()
+        HEADER.pack_into(self._map, 0, MAGIC, RECORD.size, capacity, written)
+
+    @property
+    def written(self) -> int:
+        return self._written
+
+    def record(self, value: machine.Machine, at: Optional[float] = None) -> None:
+        fields = _encode(time.time() if at is None else at, value)
+        with self._lock:
+            slot = self._written % self.capacity
+            RECORD.pack_into(self._map, HEADER.size + slot * RECORD.size, *fields)
+            self._written += 1
+            # The count goes in after the record, so a reader never sees a
+            # slot counted before it is filled.
+            HEADER.pack_into(self._map, 0, MAGIC, RECORD.size, self.capacity, self._written)
+
+    def _on_snapshot(self, snapshot: machine.Snapshot[machine.Machine]) -> None:
+        self.record(snapshot.value)
+
+    @contextmanager
+    def recording(self, value: machine.SelfUpdatingValue[machine.Machine]) -> Iterator[Recorder]:
+        unsubscribe = value.subscribe(self._on_snapshot)
+        self._on_snapshot(value.snapshot())
+        try:
+            yield self
+        finally:
+            unsubscribe()
+            self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+
+
+class Recording:
+    """Read-only, chronological view of a telemetry file."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, record_size, self.capacity, written = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a telemetry file")
+        self._count = min(written, self.capacity)
+        self._first_slot = written % self.capacity if written > self.capacity else 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> TelemetryRecord:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return _decode(RECORD.unpack_from(self._map, self._offset(index)))
+
+    def _offset(self, index: int) -> int:
+        return HEADER.size + (self._first_slot + index) % self.capacity * RECORD.size
+
+    def time_at(self, index: int) -> float:
+        return struct.unpack_from("<d", self._map, self._offset(index))[0]
+
+    def index_at(self, at: float) -> int:
+        """Index of the last record at or before `at`, 0 if there is none."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self.time_at(middle) <= at:
+                low = middle + 1
+            else:
+                high = middle
+        return max(low - 1, 0)
+
+    def __iter__(self) -> Iterator[TelemetryRecord]:
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+@dataclasses.dataclass
+class ReplayClient:
+    """Plays a recording back as if it were a live controller.
+
+    Implements the MachineClient protocol, so a DigitalReadout and the GUI
+    can show recorded history at `speed` times real time. Commands are
+    ignored.
+    """
+    path: str
+    speed: float = 1
+    start_offset_seconds: float = 0
+    has_connection: bool = False
+
+    def __post_init__(self) -> None:
+        self.recording = Recording(self.path)
+        self._started_at = time.monotonic()
+        self._start = self.recording.time_at(0) + self.start_offset_seconds if len(self.recording) else 0
+        self._connection_listeners: List[Callable[[bool], None]] = []
+
+    def add_connection_listener(self, listener: Callable[[bool], None]) -> None:
+        self._connection_listeners.append(listener)
+
+    def replay_time(self) -> float:
+        return self._start + (time.monotonic() - self._started_at) * self.speed
+
+    def get_machine_status_and_settings(self) -> Tuple[machine.MachineStatus, machine.MachineSettings]:
+        if not len(self.recording):
+            return machine.MachineStatus(), machine.MachineSettings()
+        record = self.recording[self.recording.index_at(self.replay_time())]
+        self.has_connection = record.is_connected
+        status = machine.MachineStatus.construct(
+            state=record.state,
+            machine_coord=machine.MachineCoords.construct(
+                units="MM", x=record.machine_coord[0], y=record.machine_coord[1], z=record.machine_coord[2]
+            ),
+            work_coord=machine.MachineCoords.construct(
+                units="MM", x=record.work_coord[0], y=record.work_coord[1], z=record.work_coord[2]
+            ),
+            spindle_speed=record.spindle_speed,
+            feed_speed=record.feed_speed,
+        )
+        return status, machine.MachineSettings()
+
+    def post_machine_settings(self, machine_settings: machine.MachineSettings) -> None:
+        pass
+
+    def post_spindle_settings(self, spindle_settings: machine.SpindleSettings) -> None:
+        pass
+
+    def jog(self, x: int, y: int, z: int) -> None:
+        pass
+
+    def reset_zero(self) -> None:
+        pass
+
+    def go_to_zero(self) -> None:
+        pass
+
+    def jog_move(self, x: float, y: float, z: float, feed_rate: float) -> None:
+        pass
+
+    def send_gcode(self, commands: List[str]) -> None:
+        pass
+
+    def cancel_jog(self) -> None:
+        pass
+
+    def feed_hold(self) -> None:
+        pass
+
+    def resume(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def wait_until_idle(self, timeout_seconds: float) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.recording.close()
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+from cnc_interface import grbl
+
+
+def wait_for(predicate: Callable[[], bool], timeout_seconds: float = 3) -> bool:
+    deadline = time.monotonic() + timeout_seconds
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def connect(path: str, **kwargs: float) -> grbl.GrblClient:
+    client = grbl.GrblClient(path, status_interval_seconds=0.02, **kwargs)  # type: ignore
+    assert wait_for(lambda: client.has_connection), "client never saw a status report"
+    return client
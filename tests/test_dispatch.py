@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import threading
+
+from cnc_interface import dispatch
+
+
+def test_dropped_jogs_never_run_and_the_cancel_runs_first():
+    dispatcher = dispatch.CommandDispatcher()
+    executed = []
+    busy = threading.Event()
+    release = threading.Event()
+
+    def block() -> None:
+        busy.set()
+        release.wait()
+
+    with dispatcher.running():
+        dispatcher.submit(dispatch.Priority.JOG, block)
+        assert busy.wait(1)
+        jogs = [dispatcher.submit(dispatch.Priority.JOG, lambda i=i: executed.append(f"jog {i}")) for i in range(3)]
+        settings = dispatcher.submit(dispatch.Priority.SETTINGS, lambda: executed.append("settings"), key="settings")
+        assert dispatcher.drop_pending(dispatch.Priority.JOG) == 3
+        cancel = dispatcher.submit(dispatch.Priority.SAFETY, lambda: executed.append("cancel"))
+        release.set()
+        cancel.result(1)
+        settings.result(1)
+    assert all(jog.cancelled() for jog in jogs)
+    assert executed == ["cancel", "settings"]
+    assert dispatcher.stats.dropped == 3
+    assert dispatcher.stats.queue_depth == 0
+
+
+def test_dropping_keeps_keyed_commands_of_other_priorities_collapsible():
+    dispatcher = dispatch.CommandDispatcher()
+    dispatcher.submit(dispatch.Priority.JOG, lambda: None, key="jog")
+    first = dispatcher.submit(dispatch.Priority.SETTINGS, lambda: None, key="settings")
+    assert dispatcher.drop_pending(dispatch.Priority.JOG) == 1
+    assert dispatcher.drop_pending(dispatch.Priority.JOG) == 0
+    assert dispatcher.submit(dispatch.Priority.SETTINGS, lambda: None, key="settings") is first
+    # A dropped key is free again.
+    assert not dispatcher.submit(dispatch.Priority.JOG, lambda: None, key="jog").cancelled()
+
+
+def test_stopping_runs_queued_safety_commands_and_cancels_the_rest():
+    dispatcher = dispatch.CommandDispatcher()
+    executed = []
+    busy = threading.Event()
+    release = threading.Event()
+
+    def block() -> None:
+        busy.set()
+        release.wait()
+
+    with dispatcher.running():
+        dispatcher.submit(dispatch.Priority.JOG, block)
+        assert busy.wait(1)
+        jog = dispatcher.submit(dispatch.Priority.JOG, lambda: executed.append("jog"))
+        stop = dispatcher.submit(dispatch.Priority.SAFETY, lambda: executed.append("stop"))
+        # Lets the blocking command finish only once running() is exiting.
+        threading.Timer(0.05, release.set).start()
+    assert stop.done() and not stop.cancelled()
+    assert jog.cancelled()
+    assert executed == ["stop"]
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import random
+import threading
+from typing import List, Tuple
+
+import pytest
+
+from cnc_interface import encoder, machine
+
+DIAL = machine.Dial(0, 5, 6)
+DEBOUNCE_NS = 10_000_000
+
+
+def state(clk: int, dt: int) -> int:
+    return (clk << 1) | dt
+
+
+def test_quadrature_table_counts_each_single_pin_change_in_its_direction():
+    for sequence, step in ((encoder.CLOCKWISE_SEQUENCE, 1), (encoder.COUNTER_CLOCKWISE_SEQUENCE, -1)):
+        previous = sequence[-1]
+        for current in sequence:
+            assert encoder.QUADRATURE_TABLE[(state(*previous) << 2) | state(*current)] == step
+            previous = current
+
+
+@pytest.mark.parametrize("previous", range(4))
+def test_quadrature_table_ignores_no_change_and_double_changes(previous):
+    assert encoder.QUADRATURE_TABLE[(previous << 2) | previous] == 0
+    assert encoder.QUADRATURE_TABLE[(previous << 2) | (previous ^ 0b11)] == 0
+
+
+def test_decoder_counts_random_turns_exactly():
+    rng = random.Random(0)
+    decoder = encoder.QuadratureDecoder(1, 1)
+    expected = decoded = 0
+    for _ in range(1000):
+        ticks = rng.choice((-1, 1)) * rng.randint(1, 20)
+        sequence = encoder.CLOCKWISE_SEQUENCE if ticks > 0 else encoder.COUNTER_CLOCKWISE_SEQUENCE
+        for _ in range(abs(ticks)):
+            for clk, dt in sequence:
+                decoded += decoder.update(clk, dt)
+        expected += ticks
+    assert decoded == expected
+    assert decoder.invalid_transitions == 0
+
+
+def test_decoder_drops_a_click_turned_back_halfway():
+    decoder = encoder.QuadratureDecoder(1, 1)
+    half = encoder.CLOCKWISE_SEQUENCE[:2]
+    levels = [*half, *reversed(half[:-1]), (1, 1)]
+    assert sum(decoder.update(clk, dt) for clk, dt in levels) == 0
+    assert decoder.invalid_transitions == 0
+
+
+def test_decoder_counts_skipped_states_as_invalid():
+    decoder = encoder.QuadratureDecoder(1, 1)
+    assert decoder.update(0, 0) == 0
+    assert decoder.invalid_transitions == 1
+
+
+def test_debouncer_reports_one_press_and_release_through_bounce():
+    debouncer = encoder.SwitchDebouncer(1, DEBOUNCE_NS)
+    edges = [(0, 0), (1, 100_000), (0, 200_000), (1, 50_000_000), (0, 50_100_000), (1, 50_200_000)]
+    changes = [debouncer.update(level, at) for level, at in edges]
+    assert [change for change in changes if change is not None] == [0, 1]
+    assert debouncer.settles_at() is None
+
+
+def test_debouncer_keeps_a_release_inside_the_window():
+    debouncer = encoder.SwitchDebouncer(1, DEBOUNCE_NS)
+    assert debouncer.update(0, 0) == 0
+    assert debouncer.update(1, 2_000_000) is None
+    assert debouncer.settles_at() == DEBOUNCE_NS
+    assert debouncer.settle(DEBOUNCE_NS - 1) is None
+    assert debouncer.settle(DEBOUNCE_NS) == 1
+    assert debouncer.level == 1
+
+
+def test_debouncer_drops_bounce_that_ends_where_it_started():
+    debouncer = encoder.SwitchDebouncer(1, DEBOUNCE_NS)
+    assert debouncer.update(0, 0) == 0
+    assert debouncer.update(1, 100_000) is None
+    assert debouncer.update(0, 200_000) is None
+    assert debouncer.settle(DEBOUNCE_NS) is None
+    assert debouncer.level == 0
+
+
+def test_reader_reports_a_quick_tap_without_further_edges():
+    source = encoder.SimulatedEventSource([DIAL])
+    buttons: List[Tuple[bool, int]] = []
+    released = threading.Event()
+
+    def on_button(dial: machine.Dial, is_pressed: bool, timestamp_ns: int) -> None:
+        buttons.append((is_pressed, timestamp_ns))
+        if not is_pressed:
+            released.set()
+
+    reader = encoder.EncoderReader(
+        source, [DIAL], lambda batch: None, on_button, debounce_seconds=DEBOUNCE_NS / 1e9
+    )
+    with reader.running():
+        source.press(DIAL, duration_ns=2_000_000, bounces=2)
+        assert released.wait(1)
+    (pressed, pressed_at), (is_pressed, released_at) = buttons
+    assert pressed and not is_pressed
+    assert released_at - pressed_at >= DEBOUNCE_NS
+
+
+def test_reader_decodes_interleaved_dials_exactly():
+    dials = [DIAL, machine.Dial(13, 19, 26)]
+    source = encoder.SimulatedEventSource(dials)
+    decoded = {dial: 0 for dial in dials}
+    reader = encoder.EncoderReader(
+        source, dials, lambda batch: decoded.__setitem__(batch.dial, decoded[batch.dial] + batch.delta), lambda *_: None
+    )
+    rng = random.Random(1)
+    expected = {dial: 0 for dial in dials}
+    for _ in range(200):
+        dial = rng.choice(dials)
+        ticks = rng.choice((-1, 1)) * rng.randint(1, 5)
+        source.turn(dial, ticks, tick_interval_ns=100_000)
+        expected[dial] += ticks
+    reader.process(source.read_events(0))
+    assert decoded == expected
+    assert reader.invalid_transitions == 0
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import pytest
+
+from cnc_interface import estimation
+
+
+def test_a_jog_from_rest_is_extrapolated_toward_its_target():
+    estimator = estimation.PositionEstimator()
+    estimator.on_sample((0, 0, 0), False, at=0)
+    estimator.on_move(5, 0, 0, 600, at=1)
+    assert estimator.offset(1.1) == pytest.approx((1, 0, 0))
+
+
+def test_a_jog_no_sample_confirms_stops_being_shown():
+    estimator = estimation.PositionEstimator()
+    estimator.on_sample((0, 0, 0), False, at=0)
+    estimator.on_move(5, 0, 0, 1000, at=1)
+    assert estimator.offset(1.2) != estimation.ZERO
+    assert estimator.offset(1 + estimator.min_extrapolation_seconds + 0.01) == estimation.ZERO
+    assert estimator.offset(11) == estimation.ZERO
+
+
+def test_a_sample_at_rest_ends_the_estimate():
+    estimator = estimation.PositionEstimator()
+    estimator.on_sample((0, 0, 0), False, at=0)
+    estimator.on_move(5, 0, 0, 1000, at=1)
+    estimator.on_sample((0, 0, 0), False, at=1.1)
+    assert estimator.offset(1.2) == estimation.ZERO
+
+
+def test_steady_motion_is_extrapolated_between_samples_up_to_the_target():
+    estimator = estimation.PositionEstimator()
+    estimator.on_sample((0, 0, 0), False, at=0)
+    estimator.on_move(2, 0, 0, 600, at=0)
+    estimator.on_sample((0.5, 0, 0), True, at=0.05)
+    estimator.on_sample((1, 0, 0), True, at=0.1)
+    assert estimator.offset(0.15) == pytest.approx((0.5, 0, 0))
+    # Stops at the target rather than running on.
+    assert estimator.offset(0.3) == pytest.approx((1, 0, 0))
+
+
+def test_slow_polls_are_extrapolated_until_the_next_sample_is_due():
+    estimator = estimation.PositionEstimator()
+    # 0.3 s between polls plus a 20 ms fetch, at 20 mm/s.
+    estimator.set_poll_period(0.32)
+    estimator.on_sample((0, 0, 0), False, at=0)
+    estimator.on_move(100, 0, 0, 1200, at=0)
+    estimator.on_sample((0, 0, 0), True, at=0.01)
+    estimator.on_sample((6.4, 0, 0), True, at=0.33)
+    assert estimator.offset(0.33 + 0.31) == pytest.approx((6.2, 0, 0))
+    assert estimator.offset(0.33 + 0.32 * estimator.poll_slack + 0.01) == estimation.ZERO
+
+
+def test_the_cutoff_travels_with_the_state():
+    estimator = estimation.PositionEstimator()
+    estimator.set_poll_period(1)
+    copy = estimation.PositionEstimator()
+    copy.restore(estimator.state())
+    copy.on_sample((0, 0, 0), False, at=0)
+    copy.on_move(100, 0, 0, 600, at=0)
+    assert copy.offset(1) == pytest.approx((10, 0, 0))
+
+
+def test_a_stopped_sample_polled_before_the_jog_does_not_end_it():
+    estimator = estimation.PositionEstimator()
+    estimator.set_poll_period(0.12, fetch_seconds=0.02)
+    estimator.on_sample((0, 0, 0), False, at=0)
+    estimator.on_move(5, 0, 0, 600, at=1)
+    estimator.on_sample((0, 0, 0), False, at=1.01)
+    assert estimator.offset(1.1) == pytest.approx((1, 0, 0))
+    # A stopped sample later than that does end it.
+    estimator.on_sample((0, 0, 0), False, at=1.05)
+    assert estimator.offset(1.1) == estimation.ZERO
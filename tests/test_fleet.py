@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import math
+
+from cnc_interface import fleet, machine
+from cnc_interface.benchmarks import mock_ugs
+
+
+def monitored(host: str, port: int) -> fleet.MonitoredMachine:
+    config = fleet.MachineConfig(name="router", host=host, port=port)
+    return fleet.MonitoredMachine(config, machine.UGSClient(host, port))
+
+
+def test_failed_polls_do_not_make_the_data_fresh():
+    unreachable = monitored("127.0.0.1", 1)
+    try:
+        unreachable.machine.update()
+        assert unreachable.machine.poll_age() < 1
+        assert unreachable.data_age() == math.inf
+    finally:
+        unreachable.ugs_client.close()
+
+
+def test_data_age_counts_from_the_last_poll_that_reached_the_machine():
+    state = mock_ugs.MockUGSState()
+    with mock_ugs.running(state) as (host, port):
+        reachable = monitored(host, port)
+        try:
+            reachable.machine.update()
+            age = reachable.data_age()
+            assert age < 1
+            state.failure_rate = 1
+            reachable.machine.update()
+            assert reachable.data_age() >= age
+            assert not reachable.machine.snapshot().value.is_connected
+        finally:
+            reachable.ugs_client.close()
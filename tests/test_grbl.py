@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+import threading
+
+import pytest
+from conftest import connect, wait_for
+
+from cnc_interface import grbl
+from cnc_interface.benchmarks import grbl_sim
+
+
+def program(count: int):
+    # Lines of varying length, so that the in-flight byte count rarely
+    # lands exactly on the buffer size.
+    return [f"G1 X{i * 0.125:.3f} Y{-i:.1f} Z{i % 7} F{100 + i % 900}" for i in range(count)]
+
+
+def test_character_counting_never_overflows_the_receive_buffer():
+    simulator = grbl_sim.GrblSimulator(line_delay_seconds=0.002)
+    with simulator.running() as path:
+        client = connect(path)
+        try:
+            lines = program(200)
+            client.send_gcode(lines)
+            assert client.wait_until_idle(5)
+        finally:
+            client.close()
+    assert simulator.overflows == 0
+    assert simulator.lines == lines
+
+
+def test_overflow_is_detected_without_flow_control():
+    # Guards the test above: a client that believes the buffer is much
+    # larger than it is does overrun the simulator.
+    simulator = grbl_sim.GrblSimulator(line_delay_seconds=0.002)
+    with simulator.running() as path:
+        client = connect(path, rx_buffer_size=4096)
+        try:
+            client.send_gcode(program(200))
+            assert client.wait_until_idle(5)
+        finally:
+            client.close()
+    assert simulator.overflows > 0
+
+
+def test_realtime_commands_bypass_queued_lines():
+    simulator = grbl_sim.GrblSimulator(line_delay_seconds=0.2)
+    lines = program(20)
+    with simulator.running() as path:
+        client = connect(path)
+        try:
+            # Fills the receive buffer and then blocks on it, as a job does.
+            sender = threading.Thread(target=lambda: client._send_lines(*lines), daemon=True)
+            sender.start()
+            assert wait_for(lambda: client._in_flight_bytes > grbl.RX_BUFFER_SIZE // 2)
+            client.send_realtime(grbl.FEED_HOLD)
+            assert wait_for(lambda: grbl.FEED_HOLD in simulator.realtime_commands, 0.1)
+            assert len(simulator.lines) < 3
+        finally:
+            client.close()
+            sender.join()
+    assert simulator.overflows == 0
+
+
+def test_lines_longer_than_the_receive_buffer_are_refused():
+    simulator = grbl_sim.GrblSimulator()
+    with simulator.running() as path:
+        client = connect(path)
+        try:
+            with pytest.raises(ValueError):
+                client.send_line("G1 X" + "0" * grbl.RX_BUFFER_SIZE)
+        finally:
+            client.close()
+    assert simulator.lines == []
+
+
+def test_reopens_the_port_after_it_fails(tmp_path):
+    link = str(tmp_path / "grbl")
+    first = grbl_sim.GrblSimulator()
+    second = grbl_sim.GrblSimulator()
+    with second.running():
+        with first.running() as path:
+            os.symlink(path, link)
+            client = connect(link, reopen_delay_seconds=0.02, connection_timeout_seconds=0.2)
+            client.send_gcode(["G0 X1"])
+            assert client.wait_until_idle(1)
+        try:
+            # The first port is gone, as if the USB cable was pulled and
+            # the controller came back under the same name.
+            assert wait_for(lambda: not client.has_connection)
+            os.remove(link)
+            os.symlink(second.path, link)
+            assert wait_for(lambda: client.has_connection)
+            client.send_gcode(["G0 X2"])
+            assert client.wait_until_idle(1)
+        finally:
+            client.close()
+    assert first.lines == ["G0 X1"]
+    assert second.lines == ["G0 X2"]
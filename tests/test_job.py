@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import time
+from typing import List
+
+from conftest import connect, wait_for
+
+from cnc_interface import grbl, job, machine
+from cnc_interface.benchmarks import grbl_sim, mock_ugs
+
+
+def write_program(path, lines: List[str]) -> str:
+    path.write_text("%\n(test program)\n" + "\n".join(lines) + "\n%\n")
+    return str(path)
+
+
+def moves(count: int) -> List[str]:
+    return [f"G1X{i}Y{i % 10}F1000" for i in range(count)]
+
+
+def grbl_sender(path: str, client: grbl.GrblClient) -> job.JobSender:
+    return job.JobSender(
+        path,
+        client.send_gcode,
+        batch_bytes=grbl.RX_BUFFER_SIZE,
+        feed_hold=client.feed_hold,
+        cycle_start=client.resume,
+        stop=client.stop,
+        wait_until_idle=client.wait_until_idle,
+    )
+
+
+def test_job_runs_to_done(tmp_path):
+    lines = moves(100)
+    simulator = grbl_sim.GrblSimulator(line_delay_seconds=0.001)
+    with simulator.running() as serial_port:
+        client = connect(serial_port)
+        sender = grbl_sender(write_program(tmp_path / "job.nc", lines), client)
+        sender.start()
+        sender.join(5)
+        client.close()
+    assert sender.state() is job.JobState.DONE
+    assert sender.progress().fraction == 1
+    assert simulator.lines == lines
+
+
+def test_rejected_line_fails_the_job_at_its_line_and_stops_grbl(tmp_path):
+    lines = moves(60)
+    simulator = grbl_sim.GrblSimulator(line_delay_seconds=0.001)
+    simulator.errors[lines[40]] = 33
+    with simulator.running() as serial_port:
+        client = connect(serial_port)
+        sender = grbl_sender(write_program(tmp_path / "job.nc", lines), client)
+        sender.start()
+        sender.join(5)
+        client.close()
+    progress = sender.progress()
+    assert sender.state() is job.JobState.FAILED
+    # Two header lines come before the program.
+    assert progress.error_line == 43
+    assert "error:33" in progress.error
+    assert grbl.SOFT_RESET in simulator.realtime_commands
+    assert lines[-1] not in simulator.lines
+
+
+def test_rejected_repeat_of_an_earlier_line_is_reported_at_its_own_line(tmp_path):
+    lines = [line for move in moves(30) for line in (move, "G0Z5")]
+    simulator = grbl_sim.GrblSimulator(line_delay_seconds=0.001)
+    # The 20th "G0Z5"; the 19 before it were fine.
+    simulator.errors_at[39] = 20
+    with simulator.running() as serial_port:
+        client = connect(serial_port)
+        sender = grbl_sender(write_program(tmp_path / "job.nc", lines), client)
+        sender.start()
+        sender.join(5)
+        client.close()
+    assert sender.state() is job.JobState.FAILED
+    assert sender.progress().error_line == 42
+
+
+def test_line_too_long_for_grbl_fails_the_job_at_its_line(tmp_path):
+    lines = moves(10)
+    lines[5] = "G1X" + "1" * grbl.RX_BUFFER_SIZE
+    simulator = grbl_sim.GrblSimulator(line_delay_seconds=0.001)
+    with simulator.running() as serial_port:
+        client = connect(serial_port)
+        sender = grbl_sender(write_program(tmp_path / "job.nc", lines), client)
+        sender.start()
+        sender.join(5)
+        client.close()
+    assert sender.state() is job.JobState.FAILED
+    assert sender.progress().error_line == 8
+    assert lines[5] not in simulator.lines
+
+
+def test_pause_holds_grbl_and_resume_finishes_the_job(tmp_path):
+    lines = moves(200)
+    simulator = grbl_sim.GrblSimulator(line_delay_seconds=0.005)
+    with simulator.running() as serial_port:
+        client = connect(serial_port)
+        sender = grbl_sender(write_program(tmp_path / "job.nc", lines), client)
+        sender.start()
+        assert wait_for(lambda: len(simulator.lines) > 20)
+        sender.pause()
+        assert sender.state() is job.JobState.PAUSED
+        assert wait_for(lambda: simulator.state == "Hold", 1)
+        held_at = len(simulator.lines)
+        time.sleep(0.2)
+        # Longer than the old send timeout would have allowed.
+        assert len(simulator.lines) == held_at
+        sender.resume()
+        sender.join(10)
+        client.close()
+    assert sender.state() is job.JobState.DONE
+    assert simulator.realtime_commands.count(grbl.FEED_HOLD) == 1
+    assert simulator.realtime_commands.count(grbl.CYCLE_START) == 1
+    assert simulator.lines == lines
+
+
+def test_abort_resets_grbl_and_sends_nothing_after(tmp_path):
+    lines = moves(200)
+    simulator = grbl_sim.GrblSimulator(line_delay_seconds=0.005)
+    with simulator.running() as serial_port:
+        client = connect(serial_port)
+        sender = grbl_sender(write_program(tmp_path / "job.nc", lines), client)
+        sender.start()
+        assert wait_for(lambda: len(simulator.lines) > 20)
+        sender.pause()
+        sender.abort()
+        sender.join(5)
+        assert wait_for(lambda: grbl.SOFT_RESET in simulator.realtime_commands, 1)
+        stopped_at = len(simulator.lines)
+        time.sleep(0.1)
+        assert len(simulator.lines) == stopped_at
+        client.close()
+    assert sender.state() is job.JobState.ABORTED
+    assert stopped_at < len(lines)
+
+
+def test_ugs_job_waits_for_the_machine_and_uses_the_job_endpoints(tmp_path):
+    lines = moves(400)
+    state = mock_ugs.MockUGSState()
+    state.status["state"] = "RUN"
+    with mock_ugs.running(state) as (host, port):
+        client = machine.UGSClient(host, port, idle_poll_seconds=0.01)
+        sender = job.JobSender(
+            write_program(tmp_path / "job.nc", lines),
+            client.send_gcode,
+            batch_bytes=256,
+            feed_hold=client.feed_hold,
+            cycle_start=client.resume,
+            stop=client.stop,
+            wait_until_idle=client.wait_until_idle,
+            max_bytes_ahead=1024,
+            idle_wait_seconds=0.05,
+        )
+        sender.start()
+        # Held back after max_bytes_ahead while the machine is busy.
+        assert wait_for(lambda: sender.progress().lines_sent > 0)
+        time.sleep(0.2)
+        held_at = sender.progress().lines_sent
+        assert sum(len(line) + 1 for line in lines[:held_at]) < 1024 + 256
+        time.sleep(0.1)
+        assert sender.progress().lines_sent == held_at
+        sender.pause()
+        sender.resume()
+        with state.lock:
+            state.status["state"] = "IDLE"
+        sender.join(5)
+        # The job has ended, so this has nothing to stop.
+        sender.abort()
+        client.close()
+    assert sender.state() is job.JobState.DONE
+    assert "\n".join(state.gcode_log).split("\n") == lines
+    assert state.endpoint_counts["files/pause"] == 2
+    assert state.endpoint_counts["files/cancel"] == 0
+
+
+def test_ugs_abort_cancels_the_queued_commands(tmp_path):
+    state = mock_ugs.MockUGSState()
+    state.status["state"] = "RUN"
+    with mock_ugs.running(state) as (host, port):
+        client = machine.UGSClient(host, port, idle_poll_seconds=0.01)
+        sender = job.JobSender(
+            write_program(tmp_path / "job.nc", moves(400)),
+            client.send_gcode,
+            stop=client.stop,
+            wait_until_idle=client.wait_until_idle,
+            max_bytes_ahead=1024,
+            idle_wait_seconds=0.05,
+        )
+        sender.start()
+        assert wait_for(lambda: sender.progress().lines_sent > 0)
+        sender.abort()
+        sender.join(5)
+        client.close()
+    assert sender.state() is job.JobState.ABORTED
+    assert state.endpoint_counts["files/cancel"] >= 1
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from concurrent import futures
+from typing import List, Tuple
+
+import pytest
+
+from cnc_interface import encoder, jogging, machine
+
+
+def continuous_jogger(moves: List[Tuple[float, float, float, float]]) -> jogging.ContinuousJogger:
+    def send_move(x: float, y: float, z: float, feed_rate: float) -> futures.Future:
+        moves.append((x, y, z, feed_rate))
+        future: futures.Future = futures.Future()
+        future.set_result(None)
+        return future
+
+    return jogging.ContinuousJogger(send_move, lambda: None, step_size=lambda: 0.01, max_feed_rate=lambda: 10_000)
+
+
+def test_a_batch_of_ticks_is_timed_by_its_span():
+    moves: List[Tuple[float, float, float, float]] = []
+    jogger = continuous_jogger(moves)
+    # Ten ticks whose edges were 0.1 s apart end to end: 90 ticks/s.
+    jogger.tick(10, 0, 0, span_seconds=0.1)
+    jogger._step()
+    (x, _, _, feed_rate), = moves
+    assert feed_rate == pytest.approx(90 * 0.01 * 60)
+    assert x > 0
+
+
+def test_a_faster_batch_jogs_faster():
+    slow: List[Tuple[float, float, float, float]] = []
+    fast: List[Tuple[float, float, float, float]] = []
+    for moves, span_seconds in ((slow, 0.2), (fast, 0.02)):
+        jogger = continuous_jogger(moves)
+        jogger.tick(0, -5, 0, span_seconds=span_seconds)
+        jogger._step()
+    assert fast[0][3] == pytest.approx(slow[0][3] * 10)
+    assert fast[0][1] < 0
+
+
+class FakeClient:
+    has_connection = False
+
+    def add_connection_listener(self, listener: object) -> None:
+        pass
+
+
+def test_controls_hand_a_batch_to_the_jogger_once_with_its_edge_span():
+    dial = machine.Dial(1, 2, 3)
+    controls = machine.Controls(
+        FakeClient(), x_dial=machine.Dial(4, 5, 6), y_dial=dial, z_dial=machine.Dial(7, 8, 9), continuous_jog=True
+    )  # type: ignore
+    ticks = []
+    controls._continuous_jogger.tick = lambda *args: ticks.append(args)  # type: ignore
+    controls.on_ticks(encoder.TickBatch(dial, -4, 1_000_000_000, 1_030_000_000))
+    assert ticks == [(0, -4, 0, pytest.approx(0.03))]
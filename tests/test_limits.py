@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import collections
+import random
+import threading
+from concurrent import futures
+from typing import Deque, List, Tuple
+
+import pytest
+
+from cnc_interface import dispatch, limits, machine
+from cnc_interface.benchmarks import harness
+
+Vector = Tuple[float, float, float]
+
+
+class SimulatedMachine:
+    """A controller that takes jogs in the order sent, one command at a time.
+
+    A taken jog moves the target; the position follows it in steps, and a
+    cancel stops the machine wherever it is.
+    """
+
+    def __init__(self, position: Vector) -> None:
+        self.position = list(position)
+        self.target = list(position)
+        self.queue: Deque[Tuple[Vector, futures.Future]] = collections.deque()
+        self.sent: List[Vector] = []
+
+    def send(self, x: float, y: float, z: float) -> futures.Future:
+        future: futures.Future = futures.Future()
+        self.queue.append(((x, y, z), future))
+        self.sent.append((x, y, z))
+        return future
+
+    def take(self) -> None:
+        move, future = self.queue.popleft()
+        self.target = [t + d for t, d in zip(self.target, move)]
+        future.set_result(None)
+
+    def fail(self) -> None:
+        _, future = self.queue.popleft()
+        future.set_exception(machine.ConnectionError())
+
+    def drop(self) -> None:
+        _, future = self.queue.popleft()
+        assert future.cancel()
+
+    def advance(self, fraction: float) -> None:
+        self.position = [p + (t - p) * fraction for p, t in zip(self.position, self.target)]
+
+    def cancel(self) -> None:
+        self.target = list(self.position)
+        while self.queue:
+            self.drop()
+
+    @property
+    def is_moving(self) -> bool:
+        return self.position != self.target
+
+    def sample(self, soft_limits: limits.SoftLimits) -> None:
+        soft_limits.on_sample(tuple(self.position), self.is_moving)  # type: ignore
+
+
+ENVELOPE = machine.Envelope.from_travel(50, 50, 50)
+# Float error, and the slack that lets a move count as whole steps.
+TOLERANCE = 1e-6
+
+
+def within(lower: float, value: float, upper: float) -> bool:
+    return lower - TOLERANCE <= value <= upper + TOLERANCE
+
+
+def soft_limits(settle_seconds: float = 0) -> limits.SoftLimits:
+    return limits.SoftLimits(ENVELOPE, settle_seconds=settle_seconds)
+
+
+def test_a_failed_jog_does_not_move_where_later_jogs_start():
+    limiter = soft_limits(settle_seconds=60)
+    cnc = SimulatedMachine((-10, 0, 0))
+    cnc.sample(limiter)
+    limiter.limit(5, 0, 0, cnc.send)
+    cnc.fail()
+    limiter.limit(-45, 0, 0, cnc.send)
+    assert cnc.sent[-1] == (-40, 0, 0)
+    cnc.take()
+    cnc.advance(1)
+    assert cnc.position[0] == -50
+
+
+def test_a_jog_in_flight_counts_toward_both_directions():
+    limiter = soft_limits(settle_seconds=60)
+    cnc = SimulatedMachine((-10, 0, 0))
+    cnc.sample(limiter)
+    limiter.limit(5, 0, 0, cnc.send)
+    limiter.limit(10, 0, 0, cnc.send)
+    assert cnc.sent[-1] == (5, 0, 0)
+    limiter.limit(-45, 0, 0, cnc.send)
+    assert cnc.sent[-1] == (-40, 0, 0)
+
+
+def test_a_sample_at_rest_frees_the_range_a_cancelled_jog_did_not_use():
+    limiter = soft_limits()
+    cnc = SimulatedMachine((-10, 0, 0))
+    cnc.sample(limiter)
+    limiter.limit(10, 0, 0, cnc.send)
+    cnc.take()
+    cnc.advance(0.5)
+    cnc.cancel()
+    # Until a sample shows where it stopped, the jog may have run in full.
+    assert limiter.limit(10, 0, 0, cnc.send).done()
+    cnc.sample(limiter)
+    limiter.limit(10, 0, 0, cnc.send)
+    assert cnc.sent[-1] == (5, 0, 0)
+
+
+def test_a_stopped_sample_right_after_a_jog_keeps_the_jog():
+    limiter = soft_limits(settle_seconds=60)
+    cnc = SimulatedMachine((-10, 0, 0))
+    cnc.sample(limiter)
+    limiter.limit(10, 0, 0, cnc.send)
+    cnc.take()
+    # Polled before the controller started moving.
+    cnc.sample(limiter)
+    assert limiter.limit(10, 0, 0, cnc.send).done()
+    assert cnc.sent == [(10, 0, 0)]
+
+
+def test_jogs_are_rounded_down_to_whole_steps():
+    limiter = soft_limits()
+    cnc = SimulatedMachine((-0.5, 0, 0))
+    cnc.sample(limiter)
+    limiter.limit(0.9, 0, 0, cnc.send, step=0.3)
+    assert cnc.sent == [pytest.approx((0.3, 0, 0))]
+    assert limiter.stats.clamped == 1
+    cnc.take()
+    assert limiter.limit(0.3, 0, 0, cnc.send, step=0.3).done()
+    assert limiter.stats.rejected == 1
+
+
+def test_jogs_wait_for_a_position_and_pass_without_an_envelope():
+    limiter = limits.SoftLimits(settle_seconds=0)
+    cnc = SimulatedMachine((0, 0, 0))
+    limiter.limit(100, 0, 0, cnc.send)
+    limiter.envelope = ENVELOPE
+    limiter.limit(-1, 0, 0, cnc.send)
+    assert cnc.sent == [(100, 0, 0)]
+    assert limiter.stats.rejected == 1
+
+
+def jog_storm(cnc: SimulatedMachine, limiter: limits.SoftLimits, seed: int) -> List[List[float]]:
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(5000):
+        action = rng.random()
+        if action < 0.4:
+            # Mostly one way for a while, then back, as a dial is turned.
+            sign = 1 if (len(cnc.sent) // 50) % 2 == 0 else -1
+            move = [sign * rng.choice((0.1, 1, 5, 20)) if rng.random() < 0.6 else 0.0 for _ in range(3)]
+            step = rng.choice((None, 0.1, 1))
+            limiter.limit(*move, cnc.send, step=step)  # type: ignore
+        elif action < 0.6 and cnc.queue:
+            rng.choice((cnc.take, cnc.take, cnc.take, cnc.fail, cnc.drop))()
+        elif action < 0.8:
+            cnc.advance(rng.random())
+        elif action < 0.83:
+            cnc.cancel()
+        else:
+            cnc.sample(limiter)
+        positions.append(list(cnc.position))
+        positions.append(list(cnc.target))
+    return positions
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_jog_storms_never_leave_the_envelope(seed):
+    limiter = soft_limits()
+    cnc = SimulatedMachine((-25, -25, -25))
+    cnc.sample(limiter)
+    positions = jog_storm(cnc, limiter, seed)
+    lower, upper = ENVELOPE.lower, ENVELOPE.upper
+    assert all(
+        within(lower.x, x, upper.x) and within(lower.y, y, upper.y) and within(lower.z, z, upper.z)
+        for x, y, z in positions
+    )
+    assert limiter.stats.passed and limiter.stats.clamped and limiter.stats.rejected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_jog_storms_from_outside_only_move_back_in(seed):
+    limiter = soft_limits()
+    start = (5.0, -60.0, -25.0)
+    cnc = SimulatedMachine(start)
+    cnc.sample(limiter)
+    positions = jog_storm(cnc, limiter, seed)
+    lower, upper = ENVELOPE.lower, ENVELOPE.upper
+    assert all(
+        within(lower.x, x, start[0]) and within(start[1], y, upper.y) and within(lower.z, z, upper.z)
+        for x, y, z in positions
+    )
+
+
+def test_a_jog_storm_over_a_flaky_link_stops_at_the_limit():
+    scenario = harness.Scenario(
+        "jog-storm-flaky", duration_seconds=1, jitter_ms=5, failure_rate=0.3, jog_tick_rate=100, soft_limit_mm=20
+    )
+    results = harness.run_scenario(scenario)
+    assert results["overtravel_mm"] == 0
+    assert results["soft_limits"]["rejected"] > 0
+
+
+class StepController:
+    """A controller that, like UGS and GRBL, turns jog steps into millimetres
+    with the last step size it was sent."""
+
+    has_connection = True
+
+    def __init__(self) -> None:
+        self.step_size = 0.0
+        self.moves: List[Vector] = []
+
+    def add_connection_listener(self, listener: object) -> None:
+        pass
+
+    def post_machine_settings(self, machine_settings: machine.MachineSettings) -> None:
+        self.step_size = machine_settings.jog_step_size_xy
+
+    def post_spindle_settings(self, spindle_settings: machine.SpindleSettings) -> None:
+        pass
+
+    def jog(self, x: int, y: int, z: int) -> None:
+        self.moves.append((x * self.step_size, y * self.step_size, z * self.step_size))
+
+
+def test_a_step_size_change_reaches_the_controller_before_the_jog_using_it():
+    controller = StepController()
+    controls = machine.Controls(
+        controller, x_dial=machine.Dial(1, 2, 3), y_dial=machine.Dial(4, 5, 6), z_dial=machine.Dial(7, 8, 9),
+        soft_limits=soft_limits(),
+    )  # type: ignore
+    controls.soft_limits.on_sample((-25, -25, -25), is_moving=False)
+    busy = threading.Event()
+    release = threading.Event()
+
+    def block() -> None:
+        busy.set()
+        release.wait()
+
+    with controls.dispatcher.running():
+        controls.dispatcher.submit(dispatch.Priority.SETTINGS, lambda: None).result(1)
+        assert controller.step_size == 5
+        controls.dispatcher.submit(dispatch.Priority.JOG, block)
+        assert busy.wait(1)
+        # Coarse to fine while a jog is in flight; the settings post queues
+        # behind the jog that follows.
+        controls.toggle_feedrate()
+        jog = controls._send_jog(10, 0, 0)
+        release.set()
+        jog.result(1)
+    assert controller.moves == [(pytest.approx(0.1), 0, 0)]
+    assert controls.soft_limits.stats.passed == 1
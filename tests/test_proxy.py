@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import json
+import socket
+
+import pytest
+
+from cnc_interface import machine, proxy
+
+
+def status_proxy(port: int = 0) -> proxy.StatusProxy:
+    value = machine.SelfUpdatingValue(machine.Machine(), machine.Machine)
+    return proxy.StatusProxy(value, port=port)
+
+
+def read_response(sock: socket.socket) -> bytes:
+    head = b""
+    while b"\r\n\r\n" not in head:
+        chunk = sock.recv(1)
+        assert chunk, "connection closed mid-response"
+        head += chunk
+    length = 0
+    for line in head.decode("latin-1").split("\r\n")[1:]:
+        name, _, content = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(content)
+    body = b""
+    while len(body) < length:
+        body += sock.recv(length - len(body))
+    return head.split(b"\r\n", 1)[0] + b"\r\n" + body
+
+
+def test_serving_raises_when_the_port_is_taken():
+    with socket.socket() as taken:
+        taken.bind(("127.0.0.1", 0))
+        taken.listen()
+        with pytest.raises(OSError):
+            with status_proxy(taken.getsockname()[1]).serving():
+                pass
+
+
+def test_request_bodies_are_read_past_on_a_kept_alive_connection():
+    with status_proxy().serving() as port:
+        with socket.create_connection(("127.0.0.1", port), timeout=2) as sock:
+            body = b"GET /machine HTTP/1.1\r\n\r\n" * 4
+            sock.sendall(b"POST /machine HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+            assert read_response(sock).startswith(b"HTTP/1.1 405")
+            sock.sendall(b"GET /machine HTTP/1.1\r\n\r\n")
+            status, content = read_response(sock).split(b"\r\n", 1)
+            assert status.startswith(b"HTTP/1.1 200")
+            json.loads(content)
+            # Nothing of the body was taken for requests of its own.
+            sock.settimeout(0.2)
+            with pytest.raises(socket.timeout):
+                sock.recv(1)
+
+
+def test_bodies_of_unknown_length_close_the_connection():
+    with status_proxy().serving() as port:
+        with socket.create_connection(("127.0.0.1", port), timeout=2) as sock:
+            sock.sendall(b"POST /machine HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n0\r\n\r\n")
+            assert read_response(sock).startswith(b"HTTP/1.1 400")
+            assert sock.recv(1) == b""
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import pickle
+import time
+
+from cnc_interface import estimation, machine, split
+
+
+def shared_state(version: int) -> split.SharedState:
+    return split.SharedState(
+        version, machine.Machine(), time.monotonic(), 10, False, 0, None, estimation.PositionEstimator().state()
+    )
+
+
+def test_read_gives_up_on_a_write_the_writer_never_finished():
+    block = split.SnapshotBlock(size=1024)
+    try:
+        block.write(b"whole")
+        assert block.read() == (2, b"whole")
+        # A writer that died between making the sequence odd and even again.
+        split.BLOCK_HEADER.pack_into(block._memory.buf, 0, 3, 5, 0)
+        started = time.monotonic()
+        assert block.read(timeout_seconds=0.05) is None
+        assert time.monotonic() - started < 1
+    finally:
+        block.close()
+
+
+def test_shared_machine_keeps_the_last_good_state_past_a_torn_write():
+    block = split.SnapshotBlock(size=1 << 16)
+    try:
+        shared_machine = split.SharedMachine(block, estimation.PositionEstimator())
+        block.write(pickle.dumps(shared_state(7)))
+        assert shared_machine.state().version == 7
+        split.BLOCK_HEADER.pack_into(block._memory.buf, 0, 5, 5, 0)
+        assert shared_machine.state().version == 7
+        # Stuck at the same sequence, later calls do not wait on it again.
+        started = time.monotonic()
+        assert shared_machine.state().version == 7
+        assert time.monotonic() - started < 0.05
+        block._sequence = 4
+        block.write(pickle.dumps(shared_state(8)))
+        assert shared_machine.state().version == 8
+    finally:
+        block.close()
+
+
+class FailingReadout:
+    def __init__(self) -> None:
+        self.calls = []
+
+    def reset_zero(self) -> None:
+        raise ConnectionError("controller went away")
+
+    def go_to_zero(self) -> None:
+        self.calls.append("go_to_zero")
+
+
+def test_a_failing_command_is_logged_and_the_next_one_still_runs(caplog):
+    receive, send = multiprocessing.Pipe(duplex=False)
+    cnc = FailingReadout()
+    for command in ("reset_zero", "go_to_zero"):
+        send.send_bytes(command.encode())
+    send.close()
+    with caplog.at_level(logging.ERROR, logger=split.__name__):
+        split._receive_commands(cnc, receive)  # type: ignore
+    assert cnc.calls == ["go_to_zero"]
+    assert "reset_zero failed" in caplog.text